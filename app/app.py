@@ -2147,7 +2147,7 @@ class MeowFieldAutoPiano:
 
                         filt = None
 
-                    if isinstance(filt, list) and filt:
+                    if filt is not None and len(filt):
 
                         self._log_message(f"[DEBUG] 分部过滤生效于解析: 输入={len(notes)} 输出={len(filt)}", "DEBUG")
 
@@ -2541,6 +2541,10 @@ class MeowFieldAutoPiano:
 
             if bool(getattr(self, 'enable_postproc_var', tk.BooleanVar(value=False)).get()):
 
+                # 解析结果为缓存共享的只读表：后处理会原地修改音符，先展开为独立 dict
+
+                notes = [dict(n) for n in notes]
+
                 # 黑键移调
 
                 strat = (self.black_transpose_strategy_var.get() if hasattr(self, 'black_transpose_strategy_var') else "关闭")
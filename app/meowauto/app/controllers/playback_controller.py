@@ -25,6 +25,7 @@ except Exception:
     mido = None  # 解析失败时返回空分部
 
 from meowauto.midi.partitioner import TrackChannelPartitioner, PartSection
+from meowauto.midi.tempo_map import TempoMap
 
 
 class PlaybackController:
@@ -264,7 +265,16 @@ class PlaybackController:
                 return False
             return bool(ps.play_for_instrument(instrument, tempo=tempo, use_analyzed=True, controller_ref=self.app))
 
-        sid = ts.schedule_play(inst, (hh, mm, ss, ms), play_func=play_func, tempo=tempo, use_analyzed=True)
+        def arm_func(instrument: str, at_unix: float) -> bool:
+            # 提前解析/编译并预约，到点由播放线程按时钟放行
+            ps = self.playback_service
+            if not ps:
+                return False
+            return bool(ps.play_for_instrument(instrument, tempo=tempo, use_analyzed=True, controller_ref=self.app,
+                                               start_at_unix=at_unix))
+
+        sid = ts.schedule_play(inst, (hh, mm, ss, ms), play_func=play_func, tempo=tempo, use_analyzed=True,
+                               arm_func=arm_func)
         st = ts.get_status()
         if not sid:
             # 失败：多半为目标时间已过
@@ -521,60 +531,16 @@ class PlaybackController:
                 msgs.append({'msg': msg, 'tick': t, 'track': ti})
         msgs.sort(key=lambda x: x['tick'])
 
-        ticks_per_beat = int(getattr(mid, 'ticks_per_beat', 480) or 480)
-        is_smpte = bool(ticks_per_beat < 0)
-        default_tempo = 500000  # 120 BPM
-
-        # 2) 构建 tick→秒 转换
-        smpte_seconds_per_tick = 0.0
-        if not is_smpte:
-            tempo_changes: List[Dict[str, Any]] = [{'tick': 0, 'tempo': default_tempo, 'acc_seconds': 0.0}]
-            last_t = default_tempo
-            for it in msgs:
-                m = it['msg']
-                if getattr(m, 'type', None) == 'set_tempo':
-                    tk = int(it['tick'])
-                    if not tempo_changes or tk != tempo_changes[-1]['tick'] or getattr(m, 'tempo', last_t) != last_t:
-                        tempo_changes.append({'tick': tk, 'tempo': int(getattr(m, 'tempo', last_t) or last_t), 'acc_seconds': 0.0})
-                        last_t = int(getattr(m, 'tempo', last_t) or last_t)
-            for i in range(1, len(tempo_changes)):
-                prev = tempo_changes[i-1]
-                cur = tempo_changes[i]
-                dt = max(0, int(cur['tick']) - int(prev['tick']))
-                spt = (float(prev['tempo']) / 1_000_000.0) / max(1, abs(ticks_per_beat))
-                cur['acc_seconds'] = float(prev['acc_seconds']) + dt * spt
-
-            def tick_to_seconds(tp: int) -> float:
-                idx = 0
-                for j in range(len(tempo_changes)):
-                    if int(tempo_changes[j]['tick']) <= int(tp):
-                        idx = j
-                    else:
-                        break
-                base = tempo_changes[idx]
-                spt = (float(base['tempo']) / 1_000_000.0) / max(1, abs(ticks_per_beat))
-                return float(base['acc_seconds']) + (int(tp) - int(base['tick'])) * spt
-        else:
-            # SMPTE 时间基：根据分辨率计算固定“秒/每tick”
-            div = int(ticks_per_beat)
-            hi = (div >> 8) & 0xFF
-            lo = div & 0xFF
-            if hi >= 128:
-                hi -= 256
-            fps = abs(hi) if hi != 0 else 30
-            tpf = lo if lo > 0 else 80
-            smpte_seconds_per_tick = 1.0 / (float(fps) * float(tpf))
-
-            def tick_to_seconds(tp: int) -> float:
-                return float(int(tp)) * float(smpte_seconds_per_tick)
-
-        # 3) 遍历生成 note_on/note_off 事件（用全局 tick_to_seconds 换算）
+        # 2) 全局 tempo 表（PPQ/SMPTE），一次性换算所有消息的绝对秒数
+        tempo_map = TempoMap.from_mido(mid)
+        msg_seconds = tempo_map.ticks_to_seconds([it['tick'] for it in msgs])
+
+        # 3) 遍历生成 note_on/note_off 事件（秒数取自 tempo 表换算结果）
         #    同时记录 program_change 以携带 program 元信息
         last_prog_by_track_ch: Dict[tuple, int] = {}
         on_stack: Dict[tuple, List[Dict[str, Any]]] = {}
-        for it in msgs:
+        for it, sec in zip(msgs, msg_seconds):
             m = it['msg']
-            tk = int(it['tick'])
             ti = int(it['track'])
             tpe = getattr(m, 'type', None)
             if tpe == 'program_change':
@@ -585,7 +551,7 @@ class PlaybackController:
                 ch = int(getattr(m, 'channel', 0) or 0)
                 note = int(getattr(m, 'note', 0) or 0)
                 on_stack.setdefault((ti, ch, note), []).append({
-                    'tick': tk,
+                    'sec': sec,
                     'velocity': int(getattr(m, 'velocity', 0) or 0),
                     'program': last_prog_by_track_ch.get((ti, ch)),
                 })
@@ -598,8 +564,8 @@ class PlaybackController:
                 stack = on_stack.get(key)
                 if stack:
                     st_rec = stack.pop(0)
-                    st = float(tick_to_seconds(int(st_rec['tick'])))
-                    et = float(tick_to_seconds(tk))
+                    st = float(st_rec['sec'])
+                    et = float(sec)
                     prog = st_rec.get('program')
                     events.append({'type': 'note_on',  'start_time': st, 'note': note, 'channel': ch, 'track': ti, 'program': prog, 'instrument_name': '', 'velocity': st_rec.get('velocity', 0)})
                     events.append({'type': 'note_off', 'start_time': et, 'note': note, 'channel': ch, 'track': ti, 'program': prog, 'instrument_name': '', 'velocity': 0})
@@ -607,7 +573,7 @@ class PlaybackController:
         # 4) 清理未配对：给固定时值（0.2s）
         for (ti, ch, note), stack in on_stack.items():
             for st_rec in stack:
-                st = float(tick_to_seconds(int(st_rec['tick'])))
+                st = float(st_rec['sec'])
                 et = st + 0.2
                 prog = st_rec.get('program')
                 events.append({'type': 'note_on',  'start_time': st, 'note': note, 'channel': ch, 'track': ti, 'program': prog, 'instrument_name': '', 'velocity': st_rec.get('velocity', 0)})
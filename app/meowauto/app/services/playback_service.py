@@ -4,8 +4,11 @@ PlaybackService: 播放相关服务（占位）
 - 后续将把 app.py 中与 MIDI/自动演奏相关的逻辑迁移至此
 - 当前提供最小接口占位，不在应用中直接调用
 """
+from collections import Counter
 from typing import Any, Callable, Optional, List, Dict
 from meowauto.midi import analyzer
+from meowauto.midi.note_table import NoteTable
+from meowauto.playback.timeline_cache import TimelineCache, compile_options, notes_digest
 from meowauto.core import Logger
 try:
     from meowauto.net.clock import ClockProvider, LocalClock, NetworkClockProvider
@@ -42,6 +45,8 @@ class PlaybackService:
         self._parts_selected_has_nondrum: bool = False
         # TimingService 注入点（可选）
         self._timing_service = None
+        # 编译时间轴缓存（内存 LRU + 磁盘）；置为 None 可关闭
+        self.timeline_cache: Optional[TimelineCache] = TimelineCache()
 
     def init_players(self) -> None:
         """延迟初始化播放器（占位）。"""
@@ -99,22 +104,43 @@ class PlaybackService:
             min_ms = 25
         thr = max(0, min_ms) / 1000.0
 
-        # 过滤（仅非鼓）
-        out: List[Dict] = []
-        dropped = 0
-        for n in notes:
-            try:
-                is_drum = bool(n.get('is_drum')) or (int(n.get('channel', 0)) == 9)
-            except Exception:
-                is_drum = False
-            dur = float(n.get('duration', 0.0))
-            if dur <= 0:
-                st = float(n.get('start_time', 0.0)); et = float(n.get('end_time', st))
-                dur = max(0.0, et - st)
-            if not is_drum and thr > 0 and dur < thr:
-                dropped += 1
-                continue
-            out.append(dict(n))
+        # 过滤（仅非鼓）；同时收集非鼓音高用于白键率统计
+        pitches: List[int] = []
+        if isinstance(notes, NoteTable):
+            # 列式路径：短音过滤得到索引视图，不复制音符
+            start, end, pitch = notes.start, notes.end, notes.pitch
+            drum = notes.drum_flags()
+            keep_ids = []
+            dropped = 0
+            for i, is_drum in zip(notes.row_ids(), drum):
+                if not is_drum:
+                    if thr > 0 and max(0.0, end[i] - start[i]) < thr:
+                        dropped += 1
+                        continue
+                    pitches.append(pitch[i])
+                keep_ids.append(i)
+            out = notes.select_ids(keep_ids)
+        else:
+            out: List[Dict] = []
+            dropped = 0
+            for n in notes:
+                try:
+                    is_drum = bool(n.get('is_drum')) or (int(n.get('channel', 0)) == 9)
+                except Exception:
+                    is_drum = False
+                dur = float(n.get('duration', 0.0))
+                if dur <= 0:
+                    st = float(n.get('start_time', 0.0)); et = float(n.get('end_time', st))
+                    dur = max(0.0, et - st)
+                if not is_drum and thr > 0 and dur < thr:
+                    dropped += 1
+                    continue
+                out.append(dict(n))
+                if not is_drum:
+                    try:
+                        pitches.append(int(n.get('note', 0)))
+                    except Exception:
+                        pass
         if self.logger and min_ms > 0:
             self.logger.log(f"[DEBUG] 短音过滤: 丢弃 {dropped} / {len(notes)} (<{min_ms}ms)", "DEBUG")
 
@@ -128,28 +154,20 @@ class PlaybackService:
         def is_white(p: int) -> bool:
             return (p % 12) in (0, 2, 4, 5, 7, 9, 11)
 
-        # 统计函数（按事件计数；duration 权重留作后续可选）
+        # 统计函数（按事件计数；duration 权重留作后续可选）：按音高直方图计算，与候选数无关地只遍历一次音符
+        pitch_hist = Counter(pitches)
+
         def white_rate_for_k(k: int) -> float:
             cnt = 0
             tot = 0
-            for n in out:
-                try:
-                    is_drum = bool(n.get('is_drum')) or (int(n.get('channel', 0)) == 9)
-                except Exception:
-                    is_drum = False
-                if is_drum:
-                    continue
-                try:
-                    p0 = int(n.get('note', 0))
-                except Exception:
-                    continue
+            for p0, c in pitch_hist.items():
                 p = p0 + int(k)
                 # 超出音域的不纳入分母
                 if p < 0 or p > 127:
                     continue
-                tot += 1
+                tot += c
                 if is_white(p):
-                    cnt += 1
+                    cnt += c
             if tot == 0:
                 return 0.0
             return cnt / float(max(1, tot))
@@ -178,21 +196,24 @@ class PlaybackService:
 
         # 应用移调
         if k_chosen != 0:
-            for n in out:
-                try:
-                    is_drum = bool(n.get('is_drum')) or (int(n.get('channel', 0)) == 9)
-                except Exception:
-                    is_drum = False
-                if is_drum:
-                    continue
-                try:
-                    p0 = int(n.get('note', 0))
-                    n['note_orig'] = p0
-                    p1 = p0 + int(k_chosen)
-                    n['note'] = max(0, min(127, p1))
-                except Exception:
-                    pass
-        # 统计白键率（用于UI展示）
+            if isinstance(out, NoteTable):
+                out = out.transposed(k_chosen)
+            else:
+                for n in out:
+                    try:
+                        is_drum = bool(n.get('is_drum')) or (int(n.get('channel', 0)) == 9)
+                    except Exception:
+                        is_drum = False
+                    if is_drum:
+                        continue
+                    try:
+                        p0 = int(n.get('note', 0))
+                        n['note_orig'] = p0
+                        p1 = p0 + int(k_chosen)
+                        n['note'] = max(0, min(127, p1))
+                    except Exception:
+                        pass
+        # 统计白键率（用于UI展示）：移调前音高 + k，即移调后的白键率
         try:
             rate_chosen = white_rate_for_k(k_chosen)
         except Exception:
@@ -290,9 +311,13 @@ class PlaybackService:
                 return notes
             # 统计可用字段占比（诊断用）
             try:
-                has_track = sum(1 for n in notes if n.get('track') is not None)
-                has_channel = sum(1 for n in notes if n.get('channel') is not None)
-                has_program = sum(1 for n in notes if n.get('program') is not None)
+                if isinstance(notes, NoteTable):
+                    has_track, has_channel, has_program = (sum(1 for v in notes.column(c) if v >= 0)
+                                                           for c in ('track', 'channel', 'program'))
+                else:
+                    has_track = sum(1 for n in notes if n.get('track') is not None)
+                    has_channel = sum(1 for n in notes if n.get('channel') is not None)
+                    has_program = sum(1 for n in notes if n.get('program') is not None)
                 total = len(notes)
                 if self.logger:
                     self.logger.log(f"[DEBUG] 分部过滤前字段统计: total={total}, track={has_track}, channel={has_channel}, program={has_program}", "DEBUG")
@@ -301,18 +326,24 @@ class PlaybackService:
             prog_set_diag = set(v for v in (list(prog.values()) + list(ch_prog.values())) if v is not None)
             tier0 = tier1 = tier2 = tier3 = 0
             def keep(n: Dict) -> bool:
+                try:
+                    c_val = n.get('channel')
+                    t_val = n.get('track')
+                    return keep_fields(n.get('is_drum'),
+                                       int(c_val) if c_val is not None else None,
+                                       int(t_val) if t_val is not None else None,
+                                       n.get('program'))
+                except Exception:
+                    return False
+
+            def keep_fields(is_drum: Any, c: Optional[int], t: Optional[int], p_has: Any) -> bool:
                 try:
                     # 若选择明确包含非鼓，则丢弃鼓事件
                     try:
-                        if self._parts_selected_has_nondrum and bool(n.get('is_drum')):
+                        if self._parts_selected_has_nondrum and bool(is_drum):
                             return False
                     except Exception:
                         pass
-                    c_val = n.get('channel')
-                    c = int(c_val) if c_val is not None else None
-                    t_val = n.get('track')
-                    t = int(t_val) if t_val is not None else None
-                    p_has = n.get('program')
                     # 0) track-only 匹配（用于不同“通道语义”时的宽松对齐）
                     if t is not None and tracks:
                         if t in tracks:
@@ -354,7 +385,14 @@ class PlaybackService:
                     return False
                 except Exception:
                     return False
-            filtered = [n for n in notes if keep(n)]
+            if isinstance(notes, NoteTable):
+                # 列式路径：直接读列判定，结果为索引视图（-1 表示缺省字段）
+                dr, chc, trc, prc = notes.is_drum, notes.channel, notes.track, notes.program
+                filtered = notes.where_ids(lambda i: keep_fields(
+                    dr[i], chc[i] if chc[i] >= 0 else None, trc[i] if trc[i] >= 0 else None,
+                    prc[i] if prc[i] >= 0 else None))
+            else:
+                filtered = [n for n in notes if keep(n)]
             if filtered:
                 if self.logger:
                     self.logger.log(f"[DEBUG] 分部过滤生效: 输入={len(notes)} 输出={len(filtered)} (tier0={tier0}, tier1={tier1}, tier2={tier2}, tier3={tier3}, prog_set={sorted(list(prog_set_diag))})", "DEBUG")
@@ -635,11 +673,13 @@ class PlaybackService:
     # ===== 新增：按乐器播放（供定时触发调用） =====
     def play_for_instrument(self, instrument: str, *, tempo: float = 1.0,
                              use_analyzed: Optional[bool] = True,
-                             controller_ref: Optional[Any] = None) -> bool:
+                             controller_ref: Optional[Any] = None,
+                             start_at_unix: Optional[float] = None) -> bool:
         """基于当前控制器上下文，按指定乐器触发播放。
         - 架子鼓走专用链路：start_auto_play_midi_drums
         - 其他乐器走通用链路：start_auto_play_from_path
         - 乐器影响"分部选择/角色过滤"由外部在 controller 层已设置，服务层按默认行为处理
+        - start_at_unix 给定时只做解析/编译并预约（AutoPlayer.arm），到点由播放线程放行
         """
         try:
             self.init_players()
@@ -671,11 +711,21 @@ class PlaybackService:
             if instrument == "架子鼓":
                 if not midi_path:
                     return False
-                # 使用架子鼓专用的播放方法
-                if hasattr(ap, 'start_auto_play_midi_drums'):
-                    return bool(ap.start_auto_play_midi_drums(midi_path, tempo=tempo))
-                else:
+                # 使用架子鼓专用的编译链路（结果同样进入时间轴缓存）
+                if not hasattr(ap, 'build_timeline_midi_drums'):
+                    return False
+                cache_key = None
+                if self.timeline_cache is not None:
+                    cache_key = self._timeline_cache_key(ap, self.timeline_cache.file_digest(midi_path), kind='drums')
+                cached = self._start_cached(ap, cache_key, tempo=tempo, start_at_unix=start_at_unix)
+                if cached is not None:
+                    return cached
+                timeline = ap.build_timeline_midi_drums(midi_path)
+                if timeline is None:
                     return False
+                if cache_key:
+                    self.timeline_cache.put(cache_key, timeline, source=midi_path)
+                return self._start_timeline(ap, timeline, tempo=tempo, start_at_unix=start_at_unix)
             
             # 其他乐器走通用播放链路
             analyzed_notes = None
@@ -691,11 +741,13 @@ class PlaybackService:
                     analyzed_notes = None
 
             if use_an and analyzed_notes:
-                return bool(self.start_auto_play_from_path(midi_path or '', tempo=tempo, use_analyzed=True, analyzed_notes=analyzed_notes))
+                return bool(self.start_auto_play_from_path(midi_path or '', tempo=tempo, use_analyzed=True,
+                                                           analyzed_notes=analyzed_notes, start_at_unix=start_at_unix))
             # 回退到从路径启动
             if not midi_path:
                 return False
-            return bool(self.start_auto_play_from_path(midi_path, tempo=tempo, use_analyzed=False))
+            return bool(self.start_auto_play_from_path(midi_path, tempo=tempo, use_analyzed=False,
+                                                       start_at_unix=start_at_unix))
         except Exception:
             return False
 
@@ -724,6 +776,24 @@ class PlaybackService:
         except Exception:
             pass
 
+    def set_auto_tempo_live(self, factor: float, auto_player: Optional[Any] = None) -> bool:
+        try:
+            ap = auto_player or self.auto_player
+            if ap and hasattr(ap, 'set_tempo_live'):
+                return bool(ap.set_tempo_live(factor))
+        except Exception:
+            pass
+        return False
+
+    def seek_auto_only(self, seconds: float, auto_player: Optional[Any] = None) -> bool:
+        try:
+            ap = auto_player or self.auto_player
+            if ap and hasattr(ap, 'seek'):
+                return bool(ap.seek(seconds))
+        except Exception:
+            pass
+        return False
+
     # ===== 自动演奏：启动与配置封装 =====
     def configure_auto_player(self, *, debug: Optional[bool] = None, options: Optional[dict] = None) -> None:
         """配置 AutoPlayer 的调试与高级选项（若存在相应接口）。"""
@@ -769,6 +839,83 @@ class PlaybackService:
         except Exception:
             pass
 
+    def _start_or_arm(self, ap: Any, notes: List[Dict], *, tempo: float, key_mapping: Any,
+                      strategy_name: str, start_at_unix: Optional[float],
+                      cache_key: Optional[str] = None, source: Optional[str] = None) -> bool:
+        """编译时间轴（给定 cache_key 时写入缓存），然后立即开始或预约在 start_at_unix 开始。"""
+        timeline = ap.build_timeline_midi_events(notes, key_mapping, strategy_name)
+        if timeline is None:
+            return False
+        if cache_key and self.timeline_cache is not None:
+            self.timeline_cache.put(cache_key, timeline, {'analysis_stats': self.last_analysis_stats}, source=source)
+        return self._start_timeline(ap, timeline, tempo=tempo, start_at_unix=start_at_unix)
+
+    @staticmethod
+    def _start_timeline(ap: Any, timeline: Any, *, tempo: float, start_at_unix: Optional[float]) -> bool:
+        if start_at_unix is not None and hasattr(ap, 'arm'):
+            return bool(ap.arm(timeline, start_at_unix, tempo=tempo))
+        return bool(ap.start_auto_play_timeline(timeline, tempo=tempo))
+
+    # —— 编译时间轴缓存 ——
+    def _parts_filter_signature(self) -> Dict[str, Any]:
+        return {
+            'keys': sorted(self._parts_filter_keys or []),
+            'prog': sorted((self._parts_filter_prog or {}).items()),
+            'channels': sorted(self._parts_filter_channels or []),
+            'ch_prog': sorted((self._parts_filter_ch_prog or {}).items()),
+            'tracks': sorted(self._parts_filter_tracks or []),
+            'non_drum': self._parts_selected_has_nondrum,
+        }
+
+    def _timeline_cache_key(self, ap: Any, source_digest: Optional[str], *, kind: str,
+                            key_mapping: Any = None, strategy_name: Optional[str] = None) -> Optional[str]:
+        """由全部编译输入生成缓存键；缓存关闭或来源摘要不可用时返回 None。"""
+        cache = self.timeline_cache
+        if cache is None or not source_digest:
+            return None
+        try:
+            if kind == 'drums':
+                return cache.make_key(source_digest, kind=kind, options=compile_options(getattr(ap, 'options', {})),
+                                      key_mapping=key_mapping)
+            return cache.make_key(
+                source_digest,
+                kind=kind,
+                engine=analyzer.DEFAULT_ENGINE,
+                parser=analyzer.parser_signature(),
+                parts=self._parts_filter_signature(),
+                analysis_settings=self.analysis_settings,
+                options=compile_options(getattr(ap, 'options', {})),
+                strategy=strategy_name,
+                key_mapping=key_mapping or ap._get_default_key_mapping(),
+            )
+        except Exception:
+            return None
+
+    def _start_cached(self, ap: Any, cache_key: Optional[str], *, tempo: float,
+                      start_at_unix: Optional[float]) -> Optional[bool]:
+        """缓存命中则直接播放（或预约）并返回结果；未命中返回 None。"""
+        if not cache_key or self.timeline_cache is None:
+            return None
+        entry = self.timeline_cache.get(cache_key)
+        if entry is None:
+            return None
+        timeline, meta = entry
+        stats = meta.get('analysis_stats')
+        if isinstance(stats, dict):
+            self.last_analysis_stats = dict(stats)
+        if self.logger:
+            self.logger.log(f"[DEBUG] 命中编译时间轴缓存: 动作数={len(timeline)}, {self.timeline_cache.stats()}", "DEBUG")
+        return self._start_timeline(ap, timeline, tempo=tempo, start_at_unix=start_at_unix)
+
+    def clear_timeline_cache(self, file_path: Optional[str] = None) -> None:
+        """显式失效：给定文件只丢弃该文件的条目，否则清空内存与磁盘缓存。"""
+        if self.timeline_cache is None:
+            return
+        if file_path:
+            self.timeline_cache.invalidate_source(file_path)
+        else:
+            self.timeline_cache.clear()
+
     def start_auto_play_from_path(self,
                                   file_path: str,
                                   *,
@@ -776,8 +923,11 @@ class PlaybackService:
                                   key_mapping: Any | None = None,
                                   strategy_name: str = 'strategy_21key',
                                   use_analyzed: bool = False,
-                                  analyzed_notes: Any | None = None) -> bool:
-        """从路径或已分析事件启动自动演奏。"""
+                                  analyzed_notes: Any | None = None,
+                                  start_at_unix: Optional[float] = None) -> bool:
+        """从路径或已分析事件启动自动演奏。
+        start_at_unix 给定时不立即开始：编译时间轴后交给 AutoPlayer.arm 在该绝对时刻开始。
+        """
         self.init_players()
         ap = self.auto_player
         if not ap:
@@ -797,7 +947,12 @@ class PlaybackService:
             # 统一管线：优先使用传入的已解析事件，否则自行解析（pretty_midi）
             if use_analyzed and analyzed_notes is not None and hasattr(ap, 'start_auto_play_midi_events'):
                 # 即便传入已解析事件，也必须走统一的“过滤+自动移调”前置处理
-                notes_in = list(analyzed_notes or [])
+                notes_in = analyzed_notes if isinstance(analyzed_notes, NoteTable) else list(analyzed_notes or [])
+                cache_key = self._timeline_cache_key(ap, notes_digest(notes_in), kind='analyzed',
+                                                     key_mapping=key_mapping, strategy_name=strategy_name)
+                cached = self._start_cached(ap, cache_key, tempo=tempo, start_at_unix=start_at_unix)
+                if cached is not None:
+                    return cached and bool(getattr(ap, 'is_playing', False))
                 # 分部过滤（若有）
                 notes_in = self._apply_parts_filter(notes_in)
                 notes2 = self._apply_pre_filters_and_transpose(notes_in)
@@ -809,7 +964,9 @@ class PlaybackService:
                     )
                 if not notes2:
                     return False
-                ok = bool(ap.start_auto_play_midi_events(notes2, tempo=tempo, key_mapping=key_mapping, strategy_name=strategy_name))
+                ok = self._start_or_arm(ap, notes2, tempo=tempo, key_mapping=key_mapping,
+                                        strategy_name=strategy_name, start_at_unix=start_at_unix,
+                                        cache_key=cache_key, source=file_path or None)
                 try:
                     ok = ok and bool(getattr(ap, 'is_playing', False))
                 except Exception:
@@ -818,6 +975,15 @@ class PlaybackService:
                     self.logger.log("[DEBUG] AutoPlayer 启动失败（已解析事件路径）", "ERROR")
                 return ok
 
+            # 同一文件与相同设置已编译过：直接播放缓存的时间轴
+            cache_key = None
+            if self.timeline_cache is not None:
+                cache_key = self._timeline_cache_key(ap, self.timeline_cache.file_digest(file_path), kind='file',
+                                                     key_mapping=key_mapping, strategy_name=strategy_name)
+            cached = self._start_cached(ap, cache_key, tempo=tempo, start_at_unix=start_at_unix)
+            if cached is not None:
+                return cached and bool(getattr(ap, 'is_playing', False))
+
             # 自行解析（pretty_midi）并走事件入口（避免任何 mido 直通路径）
             res = analyzer.parse_midi(file_path)
             if not isinstance(res, dict) or not res.get('ok'):
@@ -854,7 +1020,9 @@ class PlaybackService:
                 if self.logger:
                     self.logger.log("预处理后事件为空，终止播放", "ERROR")
                 return False
-            ok = bool(ap.start_auto_play_midi_events(notes2, tempo=tempo, key_mapping=key_mapping, strategy_name=strategy_name))
+            ok = self._start_or_arm(ap, notes2, tempo=tempo, key_mapping=key_mapping,
+                                    strategy_name=strategy_name, start_at_unix=start_at_unix,
+                                    cache_key=cache_key, source=file_path)
             try:
                 ok = ok and bool(getattr(ap, 'is_playing', False))
             except Exception:
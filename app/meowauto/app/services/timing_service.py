@@ -274,10 +274,14 @@ class TimingService:
                       play_func: Callable[[str], bool],
                       tempo: float = 1.0,
                       use_analyzed: Optional[bool] = True,
+                      arm_func: Optional[Callable[[str, float], bool]] = None,
+                      arm_lead_sec: float = 3.0,
                       ) -> str:
         """创建单次计划：到点后调用 play_func(instrument)。
         - 目标时间 = 今天 HH:MM:SS.mmm 的网络时间 unix
         - 实际触发 = 目标时间 + auto_rtt + manual_compensation
+        - 给定 arm_func 时改为预约模式：提前 arm_lead_sec 调用 arm_func(instrument, 触发时刻)，
+          解析/编译在到点前完成，由播放线程按时钟在触发时刻放行（见 AutoPlayer.arm）
         若目标时间已过（距离 now_net < 50ms），直接返回失败应由上层控制，此处仍允许创建，但会很快触发。
         """
         hh, mm, ss, ms = [int(x) for x in when_hms_ms]
@@ -305,16 +309,30 @@ class TimingService:
             "INFO",
         )
 
+        arm_lead = max(0.0, float(arm_lead_sec)) if arm_func is not None else 0.0
+
         def _on_fire():
             t_now = time.time()
-            err_ms = (t_now - schedule_unix) * 1000.0
-            self.logger.log(
-                f"[TIMING] 触发 id={sid} inst={instrument} at={schedule_unix:.3f} now={t_now:.3f} err={err_ms:.2f}ms tempo={tempo}",
-                "INFO",
-            )
             try:
-                ok = bool(play_func(instrument))
-                self.logger.log(f"[TIMING] 播放触发 {'成功' if ok else '失败'} inst={instrument}")
+                target = float(self.schedules[sid]['schedule_unix'])
+            except Exception:
+                target = schedule_unix
+            try:
+                if arm_func is not None:
+                    self.logger.log(
+                        f"[TIMING] 预约 id={sid} inst={instrument} at={target:.3f} now={t_now:.3f} lead={(target - t_now) * 1000.0:.1f}ms tempo={tempo}",
+                        "INFO",
+                    )
+                    ok = bool(arm_func(instrument, target))
+                    self.logger.log(f"[TIMING] 播放预约 {'成功' if ok else '失败'} inst={instrument}")
+                else:
+                    err_ms = (t_now - target) * 1000.0
+                    self.logger.log(
+                        f"[TIMING] 触发 id={sid} inst={instrument} at={target:.3f} now={t_now:.3f} err={err_ms:.2f}ms tempo={tempo}",
+                        "INFO",
+                    )
+                    ok = bool(play_func(instrument))
+                    self.logger.log(f"[TIMING] 播放触发 {'成功' if ok else '失败'} inst={instrument}")
             finally:
                 # 单次计划：触发后移除
                 try:
@@ -329,10 +347,10 @@ class TimingService:
         handle = None
         try:
             if self.clock and hasattr(self.clock, 'schedule_at'):
-                handle = self.clock.schedule_at(schedule_unix, _on_fire, tk_root=self.tk_root)  # type: ignore[attr-defined]
+                handle = self.clock.schedule_at(schedule_unix - arm_lead, _on_fire, tk_root=self.tk_root)  # type: ignore[attr-defined]
             else:
                 # 退回本地：粗略调度
-                delay = max(0.0, schedule_unix - time.time())
+                delay = max(0.0, schedule_unix - arm_lead - time.time())
                 th = threading.Timer(delay, _on_fire)
                 th.daemon = True
                 th.start()
@@ -349,6 +367,7 @@ class TimingService:
             'handle': handle,
             'tempo': float(tempo),
             'use_analyzed': bool(use_analyzed),
+            'armed': arm_func is not None,
             'cancelled': False,
             'fired': False,
         }
@@ -446,7 +465,7 @@ class TimingService:
                         new_schedule_unix = sc['base_unix'] + (auto_ms_new + manual_ms_new + delta_ms_new) / 1000.0
                         now_s = time.time()
                         # 若新目标已过，则不再调整（很快就会触发/或已错过）
-                        if new_schedule_unix <= now_s:
+                        if new_schedule_unix - arm_lead <= now_s:
                             continue
                         old_schedule_unix = sc.get('schedule_unix', new_schedule_unix)
                         diff_ms = abs(new_schedule_unix - old_schedule_unix) * 1000.0
@@ -464,9 +483,9 @@ class TimingService:
                             # 重建
                             try:
                                 if self.clock and hasattr(self.clock, 'schedule_at'):
-                                    new_handle = self.clock.schedule_at(new_schedule_unix, _on_fire, tk_root=self.tk_root)  # type: ignore[attr-defined]
+                                    new_handle = self.clock.schedule_at(new_schedule_unix - arm_lead, _on_fire, tk_root=self.tk_root)  # type: ignore[attr-defined]
                                 else:
-                                    delay = max(0.0, new_schedule_unix - time.time())
+                                    delay = max(0.0, new_schedule_unix - arm_lead - time.time())
                                     th2 = threading.Timer(delay, _on_fire)
                                     th2.daemon = True
                                     th2.start()
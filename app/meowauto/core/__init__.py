@@ -5,7 +5,11 @@ and logging system that form the foundation of the application.
 """
 
 from .models import Event, KeySender
+from .key_backend import KeyBackend, KeyboardBackend, NullBackend, RecordingBackend, create_key_backend
 from .config import ConfigManager
 from .logger import Logger
 
-__all__ = ['Event', 'KeySender', 'ConfigManager', 'Logger'] 
\ No newline at end of file
+__all__ = [
+    'Event', 'KeySender', 'ConfigManager', 'Logger',
+    'KeyBackend', 'KeyboardBackend', 'NullBackend', 'RecordingBackend', 'create_key_backend',
+] 
\ No newline at end of file
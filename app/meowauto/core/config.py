@@ -44,7 +44,8 @@ class ConfigManager:
                         cfg["ui"].setdefault(k, v)
                 # 兼容注入 playback 默认项
                 playback_default = {
-                    "keymap_profile": "piano"
+                    "keymap_profile": "piano",
+                    "key_backend": "keyboard",
                 }
                 if "playback" not in cfg or not isinstance(cfg.get("playback"), dict):
                     cfg["playback"] = playback_default
@@ -97,7 +98,8 @@ class ConfigManager:
                 "default_volume": 0.7
             },
             "playback": {
-                "keymap_profile": "piano"
+                "keymap_profile": "piano",
+                "key_backend": "keyboard",
             },
             "ntp": {
                 "servers": [
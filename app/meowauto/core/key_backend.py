@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Key output backends for MeowField AutoPiano.
+
+KeySender delegates the actual key I/O to a backend so the playback stack
+can run headless (CI, profiling) without a real input device.
+"""
+
+import time
+from array import array
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
+
+ACTION_RELEASE = 0
+ACTION_PRESS = 1
+
+
+class KeyBackend:
+    """按键输出后端接口：prepare/press/release/batch"""
+    name: str = "base"
+
+    def prepare(self, keys: Iterable[str]) -> List[str]:
+        """播放前预解析按键，返回无法输出的键名（默认全部可用）"""
+        return []
+
+    def press(self, key: str) -> None:
+        raise NotImplementedError
+
+    def release(self, key: str) -> None:
+        raise NotImplementedError
+
+    def batch(self, releases: Sequence[str], presses: Sequence[str]) -> None:
+        """一次发送一个时间片：先释放再按下"""
+        for k in releases:
+            self.release(k)
+        for k in presses:
+            self.press(k)
+
+
+class KeyboardBackend(KeyBackend):
+    """基于 keyboard 库的真实按键输出（需要输入设备与管理员权限）
+    prepare() 将键名一次性解析为扫描码并缓存，热路径只发送整数扫描码，
+    不再逐次解析键名；无法解析的键在播放前报告，播放中直接跳过。
+    """
+    name = "keyboard"
+
+    def __init__(self):
+        import keyboard  # 延迟导入：无头环境只在选择此后端时才需要
+        self._kb = keyboard
+        self._codes: Dict[str, int] = {}
+        self.unmapped: Set[str] = set()
+        self.failures = 0  # 播放中发送失败次数（预解析后应为 0）
+
+    def prepare(self, keys: Iterable[str]) -> List[str]:
+        self.failures = 0
+        for key in keys:
+            if not key or key in self._codes or key in self.unmapped:
+                continue
+            try:
+                codes = self._kb.key_to_scan_codes(key)
+            except Exception:
+                codes = ()
+            if codes:
+                self._codes[key] = codes[0]
+            else:
+                self.unmapped.add(key)
+        return sorted(self.unmapped)
+
+    def _code(self, key: str):
+        code = self._codes.get(key)
+        if code is None:
+            # 未预解析的键退回按名称发送；已确认无法解析的键跳过
+            return None if key in self.unmapped else key
+        return code
+
+    def press(self, key: str) -> None:
+        code = self._code(key)
+        if code is None:
+            return
+        try:
+            self._kb.press(code)
+        except Exception:
+            self.failures += 1
+
+    def release(self, key: str) -> None:
+        code = self._code(key)
+        if code is None:
+            return
+        try:
+            self._kb.release(code)
+        except Exception:
+            self.failures += 1
+
+
+class NullBackend(KeyBackend):
+    """零开销后端：丢弃所有按键"""
+    name = "null"
+
+    def press(self, key: str) -> None:
+        pass
+
+    def release(self, key: str) -> None:
+        pass
+
+    def batch(self, releases: Sequence[str], presses: Sequence[str]) -> None:
+        pass
+
+
+class RecordingBackend(KeyBackend):
+    """录制后端：将 (perf_counter_ns, action, key) 写入预分配缓冲区，不做真实输出。
+    缓冲区写满后丢弃后续记录并计数（dropped），不会在播放中扩容。
+    """
+    name = "recording"
+
+    def __init__(self, capacity: int = 65536):
+        self.capacity = max(1, int(capacity))
+        self._ts = array('q', bytes(8 * self.capacity))
+        self._actions = array('b', bytes(self.capacity))
+        self._key_ids = array('H', bytes(2 * self.capacity))
+        self._key_index: Dict[str, int] = {}
+        self.key_names: List[str] = []
+        self.count = 0
+        self.dropped = 0
+
+    def _key_id(self, key: str) -> int:
+        kid = self._key_index.get(key)
+        if kid is None:
+            kid = len(self.key_names)
+            self._key_index[key] = kid
+            self.key_names.append(key)
+        return kid
+
+    def _record(self, ts: int, action: int, key: str) -> None:
+        i = self.count
+        if i >= self.capacity:
+            self.dropped += 1
+            return
+        self._ts[i] = ts
+        self._actions[i] = action
+        self._key_ids[i] = self._key_id(key)
+        self.count = i + 1
+
+    def press(self, key: str) -> None:
+        self._record(time.perf_counter_ns(), ACTION_PRESS, key)
+
+    def release(self, key: str) -> None:
+        self._record(time.perf_counter_ns(), ACTION_RELEASE, key)
+
+    def batch(self, releases: Sequence[str], presses: Sequence[str]) -> None:
+        ts = time.perf_counter_ns()
+        for k in releases:
+            self._record(ts, ACTION_RELEASE, k)
+        for k in presses:
+            self._record(ts, ACTION_PRESS, k)
+
+    def records(self) -> List[Tuple[int, str, str]]:
+        """返回已录制的 (perf_counter_ns, 'press'|'release', key) 列表"""
+        names = self.key_names
+        return [
+            (self._ts[i], 'press' if self._actions[i] == ACTION_PRESS else 'release', names[self._key_ids[i]])
+            for i in range(self.count)
+        ]
+
+    def clear(self) -> None:
+        self.count = 0
+        self.dropped = 0
+
+
+KEY_BACKENDS = {
+    KeyboardBackend.name: KeyboardBackend,
+    NullBackend.name: NullBackend,
+    RecordingBackend.name: RecordingBackend,
+}
+
+
+def _warn(log: Optional[Callable[[str, str], None]], msg: str) -> None:
+    if log is not None:
+        try:
+            log(msg, "WARNING")
+            return
+        except Exception:
+            pass
+    print(f"[WARNING] {msg}")
+
+
+def create_key_backend(name: Optional[str] = None,
+                       log: Optional[Callable[[str, str], None]] = None) -> KeyBackend:
+    """按名称创建后端；未指定时读取配置 playback.key_backend（默认 keyboard）。
+    未知名称按 keyboard 处理；keyboard 库不可用时回退到 null 后端，避免无头环境下直接崩溃。
+    两种回退都会通过 log(msg, level)（缺省为 print）给出警告，不会静默丢弃按键输出。
+    """
+    if not name:
+        try:
+            from .config import ConfigManager
+            name = str(ConfigManager().get('playback.key_backend', 'keyboard'))
+        except Exception:
+            name = 'keyboard'
+    key = str(name).strip().lower()
+    cls = KEY_BACKENDS.get(key)
+    if cls is None:
+        _warn(log, f"未知的按键后端 '{name}'，使用 keyboard（可选: {', '.join(KEY_BACKENDS)}）")
+        cls = KeyboardBackend
+    try:
+        return cls()
+    except Exception as e:
+        _warn(log, f"按键后端 '{cls.name}' 初始化失败（{e}），回退到 null 后端：播放将不会发送任何按键")
+        return NullBackend()
+
+
+def resolve_key_backend(backend: Union[KeyBackend, str, None],
+                        log: Optional[Callable[[str, str], None]] = None) -> KeyBackend:
+    """接受后端实例或名称，统一返回后端实例"""
+    if isinstance(backend, KeyBackend):
+        return backend
+    return create_key_backend(backend, log)
+
+__all__ = [
+    'KeyBackend',
+    'KeyboardBackend',
+    'NullBackend',
+    'RecordingBackend',
+    'KEY_BACKENDS',
+    'create_key_backend',
+    'resolve_key_backend',
+]
@@ -6,9 +6,10 @@ Core data models for MeowField AutoPiano.
 This module contains the fundamental data structures used throughout the application.
 """
 
-import keyboard
 from dataclasses import dataclass
-from typing import List, Dict
+from typing import List, Dict, Union
+
+from .key_backend import KeyBackend, resolve_key_backend
 
 
 @dataclass
@@ -20,27 +21,32 @@ class Event:
 
 
 class KeySender:
-    """按键发送器，管理按键状态"""
+    """按键发送器，管理按键状态；实际输出交给 KeyBackend（默认按配置选择）"""
     
-    def __init__(self):
+    def __init__(self, backend: Union[KeyBackend, str, None] = None):
         self.active_count: Dict[str, int] = {}
+        self.backend: KeyBackend = resolve_key_backend(backend)
+    
+    def prepare(self, keys) -> List[str]:
+        """播放前让后端预解析按键，返回无法输出的键名"""
+        try:
+            return list(self.backend.prepare(keys))
+        except Exception:
+            return []
     
     def press(self, keys: List[str]):
         """按下按键"""
-        for k in keys:
-            if not k:  # 跳过空键
-                continue
-            cnt = self.active_count.get(k, 0) + 1
-            self.active_count[k] = cnt
-            if cnt == 1:  # 首次按下
-                try:
-                    keyboard.press(k)
-                except Exception:
-                    pass
+        self.send([], keys)
     
     def release(self, keys: List[str]):
         """释放按键"""
-        for k in keys:
+        self.send(keys, [])
+    
+    def send(self, release_keys: List[str], press_keys: List[str]):
+        """先释放再按下，结算引用计数后整批交给后端发送"""
+        releases: List[str] = []
+        presses: List[str] = []
+        for k in release_keys:
             if not k:  # 跳过空键
                 continue
             cnt = self.active_count.get(k, 0)
@@ -49,10 +55,16 @@ class KeySender:
             cnt -= 1
             self.active_count[k] = cnt
             if cnt == 0:
-                try:
-                    keyboard.release(k)
-                except Exception:
-                    pass
+                releases.append(k)
+        for k in press_keys:
+            if not k:  # 跳过空键
+                continue
+            cnt = self.active_count.get(k, 0) + 1
+            self.active_count[k] = cnt
+            if cnt == 1:  # 首次按下
+                presses.append(k)
+        if releases or presses:
+            self.backend.batch(releases, presses)
     
     def release_all(self):
         """释放所有按键"""
@@ -1,3 +1,5 @@
-from . import analyzer, groups
+from . import analyzer, groups, note_table, parse_cache, smf_reader, tempo_map
+from .note_table import NoteTable
+from .tempo_map import TempoMap
 
-__all__ = ["analyzer", "groups"]
+__all__ = ["analyzer", "groups", "note_table", "parse_cache", "smf_reader", "tempo_map", "NoteTable", "TempoMap"]
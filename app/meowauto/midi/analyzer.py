@@ -1,6 +1,7 @@
 """
 MIDI analyzer: parse notes using pretty_midi library for accurate timing.
 """
+import io
 from typing import List, Dict, Any, Optional
 
 try:
@@ -13,108 +14,223 @@ except Exception:
     miditoolkit = None
 
 from .groups import filter_notes_by_groups, group_for_note
+from .note_table import NoteTable
+from .parse_cache import ParseCache, file_key
+from .smf_reader import SmfData, read_smf, read_smf_bytes
 
 # ===== 解析引擎选择（默认：miditoolkit，更稳健处理不规范MIDI） =====
-DEFAULT_ENGINE = 'miditoolkit'  # 'auto' | 'pretty_midi' | 'miditoolkit'
+DEFAULT_ENGINE = 'miditoolkit'  # 'auto' | 'pretty_midi' | 'miditoolkit' | 'native'（内置 SMF 读取器）
+
+# 诊断模式：开启时输出逐乐器/前几个音符等调试信息，并在 pretty_midi 路径上与内置读取器逐音符比对时序（差异过大时采用内置结果）。
+# 默认关闭：正常加载只解析一次文件。
+DIAGNOSTICS = False
+
+# 解析规则版本：解析/缩放/统计逻辑变化导致结果不同时递增（磁盘缓存随之失效）
+PARSER_VERSION = 2
+
+
+def parser_signature() -> str:
+    """解析器版本签名：规则版本 + 依赖库版本（库升级后旧的磁盘缓存不再命中；编译时间轴缓存键同样使用）。"""
+    libs = []
+    for mod in (pretty_midi, miditoolkit):
+        libs.append(str(getattr(mod, '__version__', None) if mod is not None else None))
+    return f"{PARSER_VERSION}:" + ":".join(libs)
+
+
+# 进程级解析结果缓存（内存 LRU + temp/parse_cache 磁盘层；键含引擎，切换引擎不会命中旧结果）
+_PARSE_CACHE = ParseCache(version=parser_signature())
+
+def set_diagnostics(enabled: bool) -> None:
+    global DIAGNOSTICS
+    DIAGNOSTICS = bool(enabled)
+
+
+def _debug(diagnostics: bool, msg: str) -> None:
+    if diagnostics:
+        try:
+            print(f"[DEBUG] {msg}")
+        except Exception:
+            pass
+
 
 def set_default_engine(engine: str) -> None:
     global DEFAULT_ENGINE
     e = (engine or '').strip().lower()
-    if e in ('auto', 'pretty_midi', 'miditoolkit'):
+    if e in ('auto', 'pretty_midi', 'miditoolkit', 'native'):
         DEFAULT_ENGINE = e
     else:
         DEFAULT_ENGINE = 'miditoolkit'
 
 
-def _gather_notes(pm_data) -> List[Dict[str, Any]]:
+def _table_from_miditoolkit(midi_obj) -> NoteTable:
+    """将 miditoolkit 的各乐器音符收集为 NoteTable（按起始时间稳定排序）"""
+    table = NoteTable()
+    append = table.append
+    for ti, inst in enumerate(midi_obj.instruments):
+        is_drum = bool(getattr(inst, 'is_drum', False))
+        program = int(getattr(inst, 'program', 0) or 0)
+        name = str(getattr(inst, 'name', '') or f"Instrument_{ti}")
+        channel = 9 if is_drum else ti
+        for note in inst.notes:
+            try:
+                append(float(note.start), float(note.end), int(note.pitch), int(note.velocity),
+                       channel, ti, program, is_drum, name)
+            except Exception:
+                continue
+    return table.sort_by_start()
+
+
+def _pitch_stats(table: NoteTable) -> Dict[str, Any]:
+    """最高音/最低音及超限统计"""
+    stats: Dict[str, Any] = {
+        'max_note': 0, 'min_note': 127, 'max_group': "未知", 'min_group': "未知",
+        'max_status': "未超限", 'min_status': "未超限", 'above_83_count': 0, 'below_48_count': 0,
+    }
+    if len(table):
+        note_values = table.column('pitch')
+        max_note = max(note_values)
+        min_note = min(note_values)
+        stats.update({
+            'max_note': max_note,
+            'min_note': min_note,
+            'max_group': group_for_note(max_note),
+            'min_group': group_for_note(min_note),
+            'max_status': "已超限" if max_note > 83 else "未超限",
+            'min_status': "已超限" if min_note < 48 else "未超限",
+            'above_83_count': sum(1 for p in note_values if p > 83),
+            'below_48_count': sum(1 for p in note_values if p < 48),
+        })
+    return stats
+
+
+def _gather_notes(pm_data, diagnostics: bool = False) -> NoteTable:
     """使用pretty_midi收集音符事件，直接获得准确的秒级时间"""
-    events: List[Dict[str, Any]] = []
-    
-    # 调试信息
-    print(f"[DEBUG] 解析到 {len(pm_data.instruments)} 个乐器")
-    
+    table = NoteTable()
+    append = table.append
+
+    # 调试信息（仅诊断模式）
+    _debug(diagnostics, f"解析到 {len(pm_data.instruments)} 个乐器")
+
     # 遍历所有乐器
     for instrument_idx, instrument in enumerate(pm_data.instruments):
-        print(f"[DEBUG] 乐器 {instrument_idx}: {len(instrument.notes)} 个音符, is_drum={instrument.is_drum}, program={instrument.program}")
-        
-        # 遍历乐器中的所有音符
-        for note_idx, note in enumerate(instrument.notes):
-            # 保持原始通道信息，不强制修改
-            channel = 9 if instrument.is_drum else instrument_idx
-            duration = note.end - note.start
-            
+        _debug(diagnostics, f"乐器 {instrument_idx}: {len(instrument.notes)} 个音符, is_drum={instrument.is_drum}, program={instrument.program}")
+        # 保持原始通道信息，不强制修改
+        channel = 9 if instrument.is_drum else instrument_idx
+        name = instrument.name or f"Instrument_{instrument_idx}"
+        # 遍历乐器中的所有音符（时间直接以秒为单位）
+        for note in instrument.notes:
+            append(note.start, note.end, note.pitch, note.velocity, channel, instrument_idx,
+                   instrument.program, instrument.is_drum, name)
+        if diagnostics:
             # 调试前几个音符的时长
-            if note_idx < 3:
-                print(f"[DEBUG] 音符 {note_idx}: start={note.start:.4f}s, end={note.end:.4f}s, duration={duration:.4f}s, pitch={note.pitch}")
-            
-            events.append({
-                'start_time': note.start,  # 直接以秒为单位
-                'end_time': note.end,      # 直接以秒为单位
-                'duration': duration,      # 准确的时长（秒）
-                'note': note.pitch,        # MIDI音符号
-                'velocity': note.velocity, # 力度
-                'channel': channel,        # 使用乐器索引作为通道
-                'track': instrument_idx,   # 轨道索引
-                'program': instrument.program,  # 乐器程序号
-                'instrument_name': instrument.name or f"Instrument_{instrument_idx}",
-                'is_drum': instrument.is_drum  # 添加鼓标识
-            })
-    
-    print(f"[DEBUG] 总共收集到 {len(events)} 个音符事件")
-    
-    # 打印最高音和最低音符，并添加超限判定
-    max_note = 0
-    min_note = 127
-    max_group = "未知"
-    min_group = "未知"
-    max_status = "未超限"
-    min_status = "未超限"
-    above_83_count = 0
-    below_48_count = 0
-    
-    if events:
-        notes = [e['note'] for e in events]
-        max_note = max(notes)
-        min_note = min(notes)
-        max_group = group_for_note(max_note)
-        min_group = group_for_note(min_note)
-        
-        # 统计超限数量
-        above_83_count = len([note for note in notes if note > 83])
-        below_48_count = len([note for note in notes if note < 48])
-        
-        # 最高音超限判定
-        max_over_limit = max_note > 83
-        max_status = "已超限" if max_over_limit else "未超限"
-        
-        # 最低音超限判定
-        min_over_limit = min_note < 48
-        min_status = "已超限" if min_over_limit else "未超限"
-        
-        # 按照要求格式打印
-        print(f"[DEBUG] 最高音：{max_note}  {max_group}  {max_status} 超限数量 {above_83_count}")
-        print(f"[DEBUG] 最低音：{min_note} {min_group}  {min_status} 超限数量 {below_48_count}")
-    
-    # 添加音符分组信息
-    for e in events:
-        e['group'] = group_for_note(e['note'])
-    
-    # 按时间排序
-    events.sort(key=lambda x: x['start_time'])
-    
-    return events
-
-
-def parse_midi(file_path: str) -> Dict[str, Any]:
+            for note_idx, note in enumerate(instrument.notes[:3]):
+                _debug(True, f"音符 {note_idx}: start={note.start:.4f}s, end={note.end:.4f}s, duration={note.end - note.start:.4f}s, pitch={note.pitch}")
+
+    if diagnostics:
+        _debug(True, f"总共收集到 {len(table)} 个音符事件")
+        # 最高音和最低音符及超限判定
+        if len(table):
+            st = _pitch_stats(table)
+            _debug(True, f"最高音：{st['max_note']}  {st['max_group']}  {st['max_status']} 超限数量 {st['above_83_count']}")
+            _debug(True, f"最低音：{st['min_note']} {st['min_group']}  {st['min_status']} 超限数量 {st['below_48_count']}")
+
+    # 按时间排序（分组 group 由行视图按音高派生）
+    return table.sort_by_start()
+
+
+def _parse_native(file_path: str) -> Dict[str, Any]:
+    """内置 SMF 读取器：一次扫描直接得到音符列与 tempo 表（不经 mido/pretty_midi/miditoolkit）。"""
+    return _result_from_smf(read_smf(file_path))
+
+
+def _result_from_smf(smf: SmfData) -> Dict[str, Any]:
+    notes = smf.notes
+    initial_tempo = smf.initial_bpm
+    end_time = smf.end_time
+    # 与其他引擎一致：tick 0 处存在多条不同 tempo 时，采用更慢的起始 BPM 并整体缩放
+    zero_tempos = smf.tempos_at_zero() if not smf.tempo_map.is_smpte else []
+    if zero_tempos:
+        desired_bpm = min(60_000_000.0 / max(1, t) for t in zero_tempos)
+        if desired_bpm > 0 and desired_bpm < (initial_tempo - 1e-6):
+            scale = initial_tempo / desired_bpm
+            notes.scale_times(scale)
+            initial_tempo = desired_bpm
+            end_time = end_time * scale
+    out = {
+        'ok': True,
+        'notes': notes,
+        'channels': notes.channels(),
+        'resolution': int(smf.division),
+        'initial_tempo': initial_tempo,
+        'end_time': end_time if end_time > 0 else notes.end_time(),
+        'total_notes': len(notes),
+        'source': 'native',
+    }
+    out.update(_pitch_stats(notes))
+    return out
+
+
+def _diagnose_timing(notes: NoteTable, data: bytes, limit: int = 200) -> Optional[Dict[str, Any]]:
+    """诊断：比对 pretty_midi 结果与内置读取器的前 limit 个音符（按 起点/音高 对齐）；
+    起止时间差超过 50ms 时返回内置读取器的结果，否则返回 None。"""
+    smf = read_smf_bytes(data)
+    ref = smf.notes
+
+    def head(t: NoteTable):
+        rows = sorted(zip(t.column('start'), t.column('pitch'), t.column('end')))
+        return rows[:limit]
+
+    max_ds = 0.0
+    max_de = 0.0
+    for (s0, _, e0), (s1, _, e1) in zip(head(notes), head(ref)):
+        max_ds = max(max_ds, abs(s0 - s1))
+        max_de = max(max_de, abs(e0 - e1))
+    _debug(True, f"时序比对(pretty_midi vs 内置): notes={len(notes)}/{len(ref)}, max_ds={max_ds:.4f}s, max_de={max_de:.4f}s")
+    # 阈值：>50ms 认为不一致，采用内置读取器结果
+    if max_ds > 0.05 or max_de > 0.05:
+        _debug(True, f"pretty_midi 时序与内置读取器差异过大(max_ds={max_ds:.3f}, max_de={max_de:.3f})，回退到内置解析结果")
+        return _result_from_smf(smf)
+    return None
+
+
+def parse_midi(file_path: str, use_cache: bool = True, diagnostics: Optional[bool] = None) -> Dict[str, Any]:
     """解析MIDI文件，优先使用 pretty_midi；失败或结果异常时回退 miditoolkit。
-    返回统一结构：{'ok': bool, 'notes': list, 'channels': list, 'resolution': int|None, 'initial_tempo': float, 'end_time': float, 'total_notes': int, 'source': 'pretty_midi'|'miditoolkit', 'max_note': int, 'min_note': int, 'max_group': str, 'min_group': str, 'max_status': str, 'min_status': str, 'above_83_count': int, 'below_48_count': int}
+    返回统一结构：{'ok': bool, 'notes': NoteTable（可按 dict 列表使用）, 'channels': list, 'resolution': int|None, 'initial_tempo': float, 'end_time': float, 'total_notes': int, 'source': 'pretty_midi'|'miditoolkit'|'native', 'max_note': int, 'min_note': int, 'max_group': str, 'min_group': str, 'max_status': str, 'min_status': str, 'above_83_count': int, 'below_48_count': int}
+    成功结果按 (路径, 大小, mtime_ns, 引擎) 进程级缓存并共享（另按文件内容摘要持久化到 temp/parse_cache）：返回的字典与音符表均只读，需要修改时先复制
+    （dict(res) / notes.compact() / notes.to_dicts()）。use_cache=False 时强制重新解析（不入缓存）。
+    diagnostics 为 None 时取 DIAGNOSTICS（见 set_diagnostics）；诊断结果与普通结果分开缓存。
     """
-    # 根据 DEFAULT_ENGINE 决定优先顺序
     engine = DEFAULT_ENGINE
-    try:
-        print(f"[DEBUG] 解析引擎请求: engine={engine}, file={file_path}")
-    except Exception:
-        pass
+    diag = DIAGNOSTICS if diagnostics is None else bool(diagnostics)
+    key = file_key(file_path, f"{engine}+diag" if diag else engine) if use_cache else None
+    if key is None:
+        return _parse_midi_uncached(file_path, engine, diag)
+    return _PARSE_CACHE.get_or_parse(key, lambda: _parse_midi_uncached(file_path, engine, diag))
+
+
+def clear_parse_cache(file_path: Optional[str] = None, disk: bool = False) -> None:
+    """丢弃某个文件（或全部）的内存解析缓存；disk=True 时同时清空磁盘缓存。"""
+    _PARSE_CACHE.invalidate(file_path)
+    if disk:
+        _PARSE_CACHE.clear_disk()
+
+
+def parse_cache_stats() -> Dict[str, Any]:
+    return _PARSE_CACHE.stats()
+
+
+def _parse_midi_uncached(file_path: str, engine: str, diagnostics: bool = False) -> Dict[str, Any]:
+    """parse_midi 的实际解析（不经缓存）。"""
+    # 根据 engine（DEFAULT_ENGINE）决定优先顺序
+    _debug(diagnostics, f"解析引擎请求: engine={engine}, file={file_path}")
+    if engine == 'native':
+        try:
+            out = _parse_native(file_path)
+            _debug(diagnostics, f"解析完成: source=native, total_notes={out['total_notes']}, end_time={out['end_time']:.3f}s")
+            return out
+        except Exception as e:
+            # 失败则走 auto 路径
+            _debug(diagnostics, f"内置解析失败，尝试回退: {e}")
     if engine == 'miditoolkit':
         # 先走 miditoolkit
         try:
@@ -123,7 +239,6 @@ def parse_midi(file_path: str) -> Dict[str, Any]:
                 pass
             else:
                 midi_obj = miditoolkit.midi.parser.MidiFile(file_path)
-                notes: List[Dict[str, Any]] = []
                 try:
                     if midi_obj.tempo_changes:
                         initial_tempo = float(midi_obj.tempo_changes[0].tempo)
@@ -135,26 +250,7 @@ def parse_midi(file_path: str) -> Dict[str, Any]:
                     end_time = float(midi_obj.max_tick) * (60.0 / (initial_tempo * float(midi_obj.ticks_per_beat))) if midi_obj.ticks_per_beat else 0.0
                 except Exception:
                     end_time = 0.0
-                for ti, inst in enumerate(midi_obj.instruments):
-                    is_drum = bool(getattr(inst, 'is_drum', False))
-                    program = int(getattr(inst, 'program', 0) or 0)
-                    name = str(getattr(inst, 'name', '') or f"Instrument_{ti}")
-                    for note in inst.notes:
-                        rec = {
-                            'start_time': float(note.start),
-                            'end_time': float(note.end),
-                            'duration': max(0.0, float(note.end) - float(note.start)),
-                            'note': int(note.pitch),
-                            'velocity': int(note.velocity),
-                            'channel': 9 if is_drum else ti,
-                            'track': ti,
-                            'program': program,
-                            'instrument_name': name,
-                            'is_drum': is_drum,
-                        }
-                        rec['group'] = group_for_note(rec['note'])
-                        notes.append(rec)
-                notes.sort(key=lambda x: x['start_time'])
+                notes = _table_from_miditoolkit(midi_obj)
 
                 # 对齐旧版：若 t≈0 存在多条 tempo 且 BPM 不同，选慢速BPM并整体缩放
                 try:
@@ -174,46 +270,12 @@ def parse_midi(file_path: str) -> Dict[str, Any]:
                         cur_bpm_mt = float(initial_tempo)
                         if desired_bpm_mt > 0 and cur_bpm_mt > 0 and desired_bpm_mt < (cur_bpm_mt - 1e-6):
                             scale_mt = cur_bpm_mt / desired_bpm_mt
-                            for e in notes:
-                                st = float(e.get('start_time', 0.0)) * scale_mt
-                                et = float(e.get('end_time', st)) * scale_mt
-                                e['start_time'] = st
-                                e['end_time'] = et
-                                e['duration'] = max(0.0, et - st)
+                            notes.scale_times(scale_mt)
                             initial_tempo = desired_bpm_mt
                             end_time = float(end_time) * scale_mt if end_time else (notes[-1]['end_time'] if notes else 0.0)
                 except Exception:
                     pass
-                channels = sorted({n['channel'] for n in notes}) if notes else []
-                # 计算最高音和最低音信息
-                max_note = 0
-                min_note = 127
-                max_group = "未知"
-                min_group = "未知"
-                max_status = "未超限"
-                min_status = "未超限"
-                above_83_count = 0
-                below_48_count = 0
-                
-                if notes:
-                    note_values = [n['note'] for n in notes]
-                    max_note = max(note_values)
-                    min_note = min(note_values)
-                    max_group = group_for_note(max_note)
-                    min_group = group_for_note(min_note)
-                    
-                    # 统计超限数量
-                    above_83_count = len([note for note in note_values if note > 83])
-                    below_48_count = len([note for note in note_values if note < 48])
-                    
-                    # 最高音超限判定
-                    max_over_limit = max_note > 83
-                    max_status = "已超限" if max_over_limit else "未超限"
-                    
-                    # 最低音超限判定
-                    min_over_limit = min_note < 48
-                    min_status = "已超限" if min_over_limit else "未超限"
-                
+                channels = notes.channels()
                 out = {
                     'ok': True,
                     'notes': notes,
@@ -223,31 +285,24 @@ def parse_midi(file_path: str) -> Dict[str, Any]:
                     'end_time': end_time if end_time > 0 else (notes[-1]['end_time'] if notes else 0.0),
                     'total_notes': len(notes),
                     'source': 'miditoolkit',
-                    'max_note': max_note,
-                    'min_note': min_note,
-                    'max_group': max_group,
-                    'min_group': min_group,
-                    'max_status': max_status,
-                    'min_status': min_status,
-                    'above_83_count': above_83_count,
-                    'below_48_count': below_48_count,
                 }
-                try:
-                    print(f"[DEBUG] 解析完成: source=miditoolkit, total_notes={out['total_notes']}, end_time={out['end_time']:.3f}s")
-                except Exception:
-                    pass
+                # 最高音/最低音及超限统计
+                out.update(_pitch_stats(notes))
+                _debug(diagnostics, f"解析完成: source=miditoolkit, total_notes={out['total_notes']}, end_time={out['end_time']:.3f}s")
                 return out
         except Exception:
             # 失败则继续走 auto 路径
             pass
 
     # 其余情况统一走 auto（pretty_midi 优先，失败/异常回退 miditoolkit，并内置一致性校验）
-    pm_ok = False
     try:
         if pretty_midi is not None:
-            pm_data = pretty_midi.PrettyMIDI(file_path)
-            notes = _gather_notes(pm_data)
-            channels = sorted({n['channel'] for n in notes}) if notes else []
+            # 文件只读一次：pretty_midi 从内存解析，tick 0 tempo 冲突探测与诊断比对复用同一份字节
+            with open(file_path, 'rb') as f:
+                data = f.read()
+            pm_data = pretty_midi.PrettyMIDI(io.BytesIO(data))
+            notes = _gather_notes(pm_data, diagnostics)
+            channels = notes.channels()
             # pretty_midi.get_tempo_changes() -> (times, tempi[BPM])
             tempo_changes = pm_data.get_tempo_changes()
             times_arr = tempo_changes[0] if len(tempo_changes) > 0 else []
@@ -257,21 +312,28 @@ def parse_midi(file_path: str) -> Dict[str, Any]:
 
             # 当同一时刻（t≈0）存在多个 set_tempo 时，优先采用更慢的起始BPM（对齐旧版感知），
             # 并将事件的绝对秒时间进行全局缩放，使整体时长贴近旧版。
-            applied_initial_tempo_scale = False
+            # pretty_midi 会合并 tick 0 处的多条 tempo，故 tick 0 的原始 set_tempo 直接从文件字节中扫描
+            # （各轨只解码到 tick 0，不再用 mido 重新打开整个文件）。
+            zero_bpms: List[float] = []
             try:
                 zero_bpms = [float(tempi_arr[i]) for i, t in enumerate(times_arr) if float(t) <= 1e-9]
+            except Exception:
+                pass
+            try:
+                head = read_smf_bytes(data, until_tick=0)
+                if not head.tempo_map.is_smpte:
+                    zero_bpms.extend(60_000_000.0 / max(1, t) for t in head.tempos_at_zero())
+            except Exception:
+                pass
+            applied_initial_tempo_scale = False
+            try:
                 if zero_bpms:
                     desired_bpm = min(zero_bpms)  # 更慢的BPM
                     current_bpm = float(initial_tempo)
                     if desired_bpm > 0 and current_bpm > 0 and desired_bpm < (current_bpm - 1e-6):
                         scale = current_bpm / desired_bpm  # >1 放慢
                         # 缩放所有音符时间与时长
-                        for e in notes:
-                            st = float(e.get('start_time', 0.0)) * scale
-                            et = float(e.get('end_time', st)) * scale
-                            e['start_time'] = st
-                            e['end_time'] = et
-                            e['duration'] = max(0.0, et - st)
+                        notes.scale_times(scale)
                         # 更新初始BPM与总时长
                         initial_tempo = desired_bpm
                         end_time = float(end_time) * scale if end_time else (notes[-1]['end_time'] if notes else 0.0)
@@ -280,100 +342,16 @@ def parse_midi(file_path: str) -> Dict[str, Any]:
                 # 任何异常下维持原pretty_midi时序
                 pass
 
-            # 若 pretty_midi 未暴露同刻多tempo（zero_bpms仅1个或为空），尝试用 mido 探测 tick=0 的多 tempo 冲突
-            if not applied_initial_tempo_scale:
-                try:
-                    import mido  # type: ignore
-                    mf = mido.MidiFile(file_path)
-                    # 收集所有轨道的绝对tick，并抓取 tick==0 的 set_tempo（微秒/拍）
-                    tempos_at_zero: list[int] = []
-                    for track in mf.tracks:
-                        tick = 0
-                        for msg in track:
-                            tick += msg.time
-                            if getattr(msg, 'type', None) == 'set_tempo':
-                                if tick == 0:
-                                    try:
-                                        tempos_at_zero.append(int(msg.tempo))
-                                    except Exception:
-                                        pass
-                            # 避免遍历整首，超过少量事件后可跳出（性能优化）
-                            if tick > 0 and len(tempos_at_zero) >= 2:
-                                break
-                        if len(tempos_at_zero) >= 2:
-                            break
-                    if tempos_at_zero:
-                        # 将微秒/拍转换为 BPM：60_000_000 / tempo
-                        bpms = [60_000_000.0 / max(1, t) for t in tempos_at_zero]
-                        desired_bpm2 = min(bpms)
-                        current_bpm2 = float(initial_tempo)
-                        if desired_bpm2 > 0 and current_bpm2 > 0 and desired_bpm2 < (current_bpm2 - 1e-6):
-                            scale2 = current_bpm2 / desired_bpm2
-                            for e in notes:
-                                st = float(e.get('start_time', 0.0)) * scale2
-                                et = float(e.get('end_time', st)) * scale2
-                                e['start_time'] = st
-                                e['end_time'] = et
-                                e['duration'] = max(0.0, et - st)
-                            initial_tempo = desired_bpm2
-                            end_time = float(end_time) * scale2 if end_time else (notes[-1]['end_time'] if notes else 0.0)
-                            applied_initial_tempo_scale = True
-                except Exception:
-                    pass
             if notes and end_time > 0:
-                # 可选一致性校验：与 miditoolkit 对比若差异过大则回退
-                try:
-                    if miditoolkit is not None and not applied_initial_tempo_scale:
-                        midi_obj = miditoolkit.midi.parser.MidiFile(file_path)
-                        mk_notes: List[Dict[str, Any]] = []
-                        for ti, inst in enumerate(midi_obj.instruments):
-                            is_drum = bool(getattr(inst, 'is_drum', False))
-                            program = int(getattr(inst, 'program', 0) or 0)
-                            name = str(getattr(inst, 'name', '') or f"Instrument_{ti}")
-                            for note in inst.notes:
-                                mk_notes.append({
-                                    'start_time': float(note.start),
-                                    'end_time': float(note.end),
-                                    'duration': max(0.0, float(note.end) - float(note.start)),
-                                    'note': int(note.pitch),
-                                    'velocity': int(note.velocity),
-                                    'channel': 9 if is_drum else ti,
-                                    'track': ti,
-                                    'program': program,
-                                    'instrument_name': name,
-                                    'is_drum': is_drum,
-                                    'group': group_for_note(int(note.pitch)),
-                                })
-                        mk_notes.sort(key=lambda x: x['start_time'])
-                        # 取前N条比对时间差
-                        N = min(200, len(notes), len(mk_notes))
-                        max_ds = 0.0
-                        max_de = 0.0
-                        for i in range(N):
-                            ds = abs(float(notes[i]['start_time']) - float(mk_notes[i]['start_time']))
-                            de = abs(float(notes[i]['end_time']) - float(mk_notes[i]['end_time']))
-                            if ds > max_ds:
-                                max_ds = ds
-                            if de > max_de:
-                                max_de = de
-                        # 阈值：>50ms 认为不一致，优先采用 miditoolkit
-                        if max_ds > 0.05 or max_de > 0.05:
-                            print(f"[DEBUG] pretty_midi 时序与 miditoolkit 差异过大(max_ds={max_ds:.3f}, max_de={max_de:.3f})，回退到 miditoolkit 结果")
-                            channels_mk = sorted({n['channel'] for n in mk_notes}) if mk_notes else []
-                            return {
-                                'ok': True,
-                                'notes': mk_notes,
-                                'channels': channels_mk,
-                                'resolution': int(getattr(midi_obj, 'ticks_per_beat', 480) or 480),
-                                'initial_tempo': float(midi_obj.tempo_changes[0].tempo) if getattr(midi_obj, 'tempo_changes', None) else 120.0,
-                                'end_time': mk_notes[-1]['end_time'] if mk_notes else 0.0,
-                                'total_notes': len(mk_notes),
-                                'source': 'miditoolkit',
-                            }
-                except Exception:
-                    # 校验失败不影响正常返回
-                    pass
-                pm_ok = True
+                # 诊断模式：与内置读取器（同一份字节）逐音符比对时序，差异过大则采用内置结果
+                if diagnostics and not applied_initial_tempo_scale:
+                    try:
+                        fallback = _diagnose_timing(notes, data)
+                        if fallback is not None:
+                            return fallback
+                    except Exception:
+                        # 校验失败不影响正常返回
+                        pass
                 out = {
                     'ok': True,
                     'notes': notes,
@@ -384,10 +362,7 @@ def parse_midi(file_path: str) -> Dict[str, Any]:
                     'total_notes': len(notes),
                     'source': 'pretty_midi',
                 }
-                try:
-                    print(f"[DEBUG] 解析完成: source=pretty_midi, total_notes={out['total_notes']}, end_time={out['end_time']:.3f}s")
-                except Exception:
-                    pass
+                _debug(diagnostics, f"解析完成: source=pretty_midi, total_notes={out['total_notes']}, end_time={out['end_time']:.3f}s")
                 return out
     except Exception as e:
         # 打印调试信息但继续尝试回退
@@ -398,7 +373,6 @@ def parse_midi(file_path: str) -> Dict[str, Any]:
         if miditoolkit is None:
             return {'ok': False, 'error': '解析失败：pretty_midi异常且未安装miditoolkit（pip install miditoolkit）'}
         midi_obj = miditoolkit.midi.parser.MidiFile(file_path)
-        notes: List[Dict[str, Any]] = []
         # 采集 tempo（BPM）与 end_time
         try:
             if midi_obj.tempo_changes:
@@ -412,38 +386,9 @@ def parse_midi(file_path: str) -> Dict[str, Any]:
         except Exception:
             end_time = 0.0
 
-        # 遍历乐器/轨道
-        for ti, inst in enumerate(midi_obj.instruments):
-            is_drum = bool(getattr(inst, 'is_drum', False))
-            program = int(getattr(inst, 'program', 0) or 0)
-            name = str(getattr(inst, 'name', '') or f"Instrument_{ti}")
-            for note in inst.notes:
-                try:
-                    # miditoolkit 的时间是 tick 基于 tempo_map 归一到秒，可直接用 start/end（秒）
-                    st = float(note.start)
-                    et = float(note.end)
-                    dur = max(0.0, et - st)
-                    pitch = int(note.pitch)
-                    velocity = int(note.velocity)
-                    channel = 9 if is_drum else ti
-                    rec = {
-                        'start_time': st,
-                        'end_time': et,
-                        'duration': dur,
-                        'note': pitch,
-                        'velocity': velocity,
-                        'channel': channel,
-                        'track': ti,
-                        'program': program,
-                        'instrument_name': name,
-                        'is_drum': is_drum,
-                    }
-                    rec['group'] = group_for_note(rec['note'])
-                    notes.append(rec)
-                except Exception:
-                    continue
-        notes.sort(key=lambda x: x['start_time'])
-        channels = sorted({n['channel'] for n in notes}) if notes else []
+        # 遍历乐器/轨道（miditoolkit 的时间已按 tempo_map 归一到秒）
+        notes = _table_from_miditoolkit(midi_obj)
+        channels = notes.channels()
         return {
             'ok': True,
             'notes': notes,
@@ -10,6 +10,8 @@ DrumsMidiParser: 专用架子鼓 MIDI 解析器
 from __future__ import annotations
 from typing import Dict, List, Any
 
+from meowauto.midi.tempo_map import TempoMap
+
 # GM 打击乐音色 -> drum_id 映射（常见）
 GM_PERC_TO_DRUM: Dict[int, str] = {
     35: "KICK", 36: "KICK",
@@ -36,7 +38,6 @@ class DrumsMidiParser:
         except Exception:
             return []
 
-        default_tempo = 500000  # 120 BPM
         ticks_per_beat = mid.ticks_per_beat
         # 收集所有消息（绝对tick）
         msgs = []
@@ -47,47 +48,11 @@ class DrumsMidiParser:
                 msgs.append({"msg": msg, "tick": t, "track": ti})
         msgs.sort(key=lambda x: x["tick"])  # 绝对时间排序
 
-        # tempo map（仅PPQ下生效；SMPTE时直接用常量换算）
-        is_smpte = bool(ticks_per_beat < 0)
-        tempo_changes: List[Dict[str, Any]] = []
-        smpte_seconds_per_tick = 0.0
-        if not is_smpte:
-            tempo_changes.append({"tick": 0, "tempo": default_tempo, "acc_seconds": 0.0})
-            last_tempo = default_tempo
-            for it in msgs:
-                m = it["msg"]
-                if m.type == "set_tempo":
-                    tk = it["tick"]
-                    if not tempo_changes or tk != tempo_changes[-1]["tick"] or m.tempo != last_tempo:
-                        tempo_changes.append({"tick": tk, "tempo": m.tempo, "acc_seconds": 0.0})
-                        last_tempo = m.tempo
-            for i in range(1, len(tempo_changes)):
-                prv = tempo_changes[i-1]
-                cur = tempo_changes[i]
-                dt = max(0, cur["tick"] - prv["tick"])
-                spt = (prv["tempo"] / 1_000_000.0) / max(1, ticks_per_beat)
-                cur["acc_seconds"] = prv["acc_seconds"] + dt * spt
-            def tick_to_seconds(tp: int) -> float:
-                idx = 0
-                for j in range(len(tempo_changes)):
-                    if tempo_changes[j]["tick"] <= tp:
-                        idx = j
-                    else:
-                        break
-                base = tempo_changes[idx]
-                spt = (base["tempo"] / 1_000_000.0) / max(1, ticks_per_beat)
-                return base["acc_seconds"] + (tp - base["tick"]) * spt
-        else:
-            div = int(ticks_per_beat)
-            hi = (div >> 8) & 0xFF
-            lo = div & 0xFF
-            if hi >= 128:
-                hi -= 256
-            fps = abs(hi) if hi != 0 else 30
-            ticks_per_frame = lo if lo > 0 else 80
-            smpte_seconds_per_tick = 1.0 / (float(fps) * float(ticks_per_frame))
-            def tick_to_seconds(tp: int) -> float:
-                return float(tp) * smpte_seconds_per_tick
+        # tempo map（PPQ 分段换算 / SMPTE 常量换算），一次性换算所有消息的绝对秒数
+        tempo_map = TempoMap(ticks_per_beat, ((it["tick"], it["msg"].tempo)
+                                              for it in msgs if it["msg"].type == "set_tempo"))
+        for it, sec in zip(msgs, tempo_map.ticks_to_seconds([it["tick"] for it in msgs])):
+            it["sec"] = sec
 
         # 提取鼓音符
         active: Dict[tuple, List[Dict[str, Any]]] = {}
@@ -113,15 +78,15 @@ class DrumsMidiParser:
                 continue
             if msg.type == "note_on" and msg.velocity > 0:
                 stack = active.setdefault((ch, n), [])
-                stack.append({"tick": it["tick"]})
+                stack.append({"tick": it["tick"], "sec": it["sec"]})
             else:
                 key = (ch, n)
                 if key in active and active[key]:
                     st = active[key].pop()
                     if not active[key]:
                         del active[key]
-                    st_s = tick_to_seconds(int(st["tick"]))
-                    ed_s = tick_to_seconds(int(it["tick"]))
+                    st_s = st["sec"]
+                    ed_s = it["sec"]
                     drum_id = GM_PERC_TO_DRUM.get(int(n))
                     # 未映射的鼓音映射到就近的合理鼓位（简单兜底）
                     if drum_id is None:
@@ -148,7 +113,7 @@ class DrumsMidiParser:
         for (ch, n), stack in list(active.items()):
             while stack:
                 st = stack.pop()
-                st_s = tick_to_seconds(int(st["tick"]))
+                st_s = st["sec"]
                 notes.append({
                     "start_time": float(st_s),
                     "end_time": float(st_s) + 0.12,
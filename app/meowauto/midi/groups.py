@@ -34,6 +34,12 @@ def filter_notes_by_groups(notes: List[dict], selected_groups: List[str]) -> Lis
     ranges = [GROUPS[name] for name in selected_groups if name in GROUPS]
     if not ranges:
         return notes
+    where_ids = getattr(notes, 'where_ids', None)
+    if where_ids is not None:
+        # NoteTable：按音高列查表过滤，返回索引视图
+        keep = [any(lo <= p <= hi for lo, hi in ranges) for p in range(128)]
+        pitch = notes.pitch
+        return where_ids(lambda i: 0 <= pitch[i] < 128 and keep[pitch[i]])
     out = []
     for ev in notes:
         n = ev.get('note')
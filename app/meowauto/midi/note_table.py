@@ -0,0 +1,429 @@
+"""
+音符列式表（struct-of-arrays）
+解析结果原为每个音符一个 dict（约 11 个键）；大曲目下逐条 dict 的内存与访问开销，
+在 解析 → 分部过滤 → 短音过滤/移调 → 编译 链路上会被重复支付多次。
+NoteTable 将音符存为并行的 array 列：start/end/pitch/velocity/channel/track/program/is_drum/instrument，
+乐器名做字符串驻留（instrument 列保存驻留表下标）。
+- 过滤得到“索引视图”：与原表共享列，只保存行号数组，不复制数据；
+- 迁移期间表可直接当作 dict 列表使用：迭代/下标得到 NoteRow（dict 兼容的行视图，键与旧结构一致，
+  duration/group 为派生值）；写入核心键会写回列，写入其他键（如 is_chord）保存在表级附加字典中；
+- 热路径（服务层过滤/移调、AutoPlayer 编译）直接读列，需要独立 dict 的代码可用 to_dicts()；
+- freeze() 后表只读（解析缓存共享的结果），原地修改会抛 TypeError，需要修改时先 compact() 得到可写副本。
+"""
+from __future__ import annotations
+
+from array import array
+from collections.abc import MutableMapping
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .groups import group_for_note
+
+# (列属性, typecode, 对应的行键)；channel/track/program/velocity 以 -1 表示缺省（行视图中视为无此键）
+_COLUMNS: Tuple[Tuple[str, str, str], ...] = (
+    ('start', 'd', 'start_time'),
+    ('end', 'd', 'end_time'),
+    ('pitch', 'h', 'note'),
+    ('velocity', 'h', 'velocity'),
+    ('channel', 'h', 'channel'),
+    ('track', 'i', 'track'),
+    ('program', 'h', 'program'),
+    ('is_drum', 'b', 'is_drum'),
+    ('instrument', 'I', 'instrument_name'),
+)
+_NULLABLE = ('velocity', 'channel', 'track', 'program')
+# (列属性, typecode)：供序列化（如解析结果磁盘缓存）按固定顺序读写列
+COLUMN_TYPES: Tuple[Tuple[str, str], ...] = tuple((attr, code) for attr, code, _ in _COLUMNS)
+
+_GROUP_BY_PITCH = tuple(group_for_note(p) for p in range(128))
+
+
+def _group(pitch: int) -> str:
+    return _GROUP_BY_PITCH[pitch] if 0 <= pitch < 128 else group_for_note(pitch)
+
+
+def _nullable(v: int) -> Optional[int]:
+    return None if v < 0 else v
+
+
+# 行键 -> 读取函数 (table, 行号)；返回 None 表示该行无此键
+_GETTERS: Dict[str, Callable[['NoteTable', int], Any]] = {
+    'start_time': lambda t, i: t.start[i],
+    'end_time': lambda t, i: t.end[i],
+    'duration': lambda t, i: max(0.0, t.end[i] - t.start[i]),
+    'note': lambda t, i: t.pitch[i],
+    'velocity': lambda t, i: _nullable(t.velocity[i]),
+    'channel': lambda t, i: _nullable(t.channel[i]),
+    'track': lambda t, i: _nullable(t.track[i]),
+    'program': lambda t, i: _nullable(t.program[i]),
+    'instrument_name': lambda t, i: t.names[t.instrument[i]],
+    'is_drum': lambda t, i: bool(t.is_drum[i]),
+    'group': lambda t, i: _group(t.pitch[i]),
+    'note_orig': lambda t, i: None if t.pitch_orig is None else _nullable(t.pitch_orig[i]),
+}
+_ROW_KEYS: Tuple[str, ...] = tuple(_GETTERS)
+
+
+def _set_int(col: str, nullable: bool):
+    def setter(t: 'NoteTable', i: int, v: Any) -> None:
+        getattr(t, col)[i] = -1 if (v is None and nullable) else int(v)
+    return setter
+
+
+# 行键 -> 写入函数；不在此表中的键写入附加字典（duration/group 写入后覆盖派生值）
+_SETTERS: Dict[str, Callable[['NoteTable', int, Any], None]] = {
+    'start_time': lambda t, i, v: t.start.__setitem__(i, float(v)),
+    'end_time': lambda t, i, v: t.end.__setitem__(i, float(v)),
+    'note': _set_int('pitch', False),
+    'velocity': _set_int('velocity', True),
+    'channel': _set_int('channel', True),
+    'track': _set_int('track', True),
+    'program': _set_int('program', True),
+    'is_drum': lambda t, i, v: t.is_drum.__setitem__(i, 1 if v else 0),
+    'instrument_name': lambda t, i, v: t.instrument.__setitem__(i, t.intern(v)),
+}
+
+
+class NoteRow(MutableMapping):
+    """dict 兼容的单行视图（迁移期使用）；base_index 为所属基础表中的行号。"""
+
+    __slots__ = ('table', 'base_index')
+
+    def __init__(self, table: 'NoteTable', base_index: int):
+        self.table = table
+        self.base_index = base_index
+
+    def __getitem__(self, key: str) -> Any:
+        t = self.table
+        ex = t.extras.get(self.base_index)
+        if ex is not None and key in ex:
+            return ex[key]
+        getter = _GETTERS.get(key)
+        v = getter(t, self.base_index) if getter is not None else None
+        if v is None:
+            raise KeyError(key)
+        return v
+
+    def get(self, key: str, default: Any = None) -> Any:
+        t = self.table
+        ex = t.extras.get(self.base_index)
+        if ex is not None and key in ex:
+            return ex[key]
+        getter = _GETTERS.get(key)
+        if getter is None:
+            return default
+        v = getter(t, self.base_index)
+        return default if v is None else v
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        t = self.table
+        t._check_writable()
+        setter = _SETTERS.get(key)
+        if setter is not None:
+            try:
+                setter(t, self.base_index, value)
+                ex = t.extras.get(self.base_index)
+                if ex is not None:
+                    ex.pop(key, None)
+                return
+            except (TypeError, ValueError, OverflowError):
+                pass  # 无法放入列的值（如非数字）退回附加字典，读取时优先
+        t.extras.setdefault(self.base_index, {})[key] = value
+
+    def __delitem__(self, key: str) -> None:
+        self.table._check_writable()
+        ex = self.table.extras.get(self.base_index)
+        if ex is not None and key in ex:
+            del ex[key]
+            return
+        if key in _NULLABLE_KEYS and self.get(key) is not None:
+            _SETTERS[key](self.table, self.base_index, None)
+            return
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        t = self.table
+        i = self.base_index
+        ex = t.extras.get(i)
+        for key in _ROW_KEYS:
+            if (ex is not None and key in ex) or _GETTERS[key](t, i) is not None:
+                yield key
+        if ex:
+            for key in ex:
+                if key not in _GETTERS:
+                    yield key
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __contains__(self, key: object) -> bool:
+        return self.get(key) is not None or key in (self.table.extras.get(self.base_index) or ())  # type: ignore[arg-type]
+
+    def copy(self) -> Dict[str, Any]:
+        return dict(self)
+
+    def __repr__(self) -> str:
+        return f"NoteRow({dict(self)!r})"
+
+
+_NULLABLE_KEYS = tuple(key for attr, _, key in _COLUMNS if attr in _NULLABLE)
+
+
+class NoteTable:
+    """音符列式表；_ids 为 None 时是基础表，否则是共享列的索引视图。"""
+
+    __slots__ = tuple(attr for attr, _, _ in _COLUMNS) + ('pitch_orig', 'names', '_name_ids', 'extras', '_ids', '_frozen')
+
+    def __init__(self):
+        for attr, code, _ in _COLUMNS:
+            setattr(self, attr, array(code))
+        self.pitch_orig: Optional[array] = None  # 移调后保留原音高（-1 表示该行未移调）
+        self.names: List[Optional[str]] = [None]  # 乐器名驻留表，下标 0 表示缺省
+        self._name_ids: Dict[str, int] = {}
+        self.extras: Dict[int, Dict[str, Any]] = {}  # 基础行号 -> 附加字段
+        self._ids: Optional[array] = None
+        self._frozen = False
+
+    # ---- 构建 ----
+    def intern(self, name: Optional[str]) -> int:
+        if name is None:
+            return 0
+        name = str(name)
+        idx = self._name_ids.get(name)
+        if idx is None:
+            idx = len(self.names)
+            self.names.append(name)
+            self._name_ids[name] = idx
+        return idx
+
+    def append(self, start: float, end: float, pitch: int, velocity: Optional[int] = None,
+               channel: Optional[int] = None, track: Optional[int] = None, program: Optional[int] = None,
+               is_drum: bool = False, instrument_name: Optional[str] = None) -> int:
+        """追加一行并返回其行号（仅基础表可追加）。"""
+        if self._ids is not None:
+            raise TypeError("索引视图不可追加")
+        self._check_writable()
+        self.start.append(float(start))
+        self.end.append(float(end))
+        self.pitch.append(int(pitch))
+        self.velocity.append(-1 if velocity is None else int(velocity))
+        self.channel.append(-1 if channel is None else int(channel))
+        self.track.append(-1 if track is None else int(track))
+        self.program.append(-1 if program is None else int(program))
+        self.is_drum.append(1 if is_drum else 0)
+        self.instrument.append(self.intern(instrument_name))
+        if self.pitch_orig is not None:
+            self.pitch_orig.append(-1)
+        return len(self.start) - 1
+
+    @classmethod
+    def from_dicts(cls, notes: Iterable[Dict[str, Any]]) -> 'NoteTable':
+        """由旧的 dict 列表构建；核心键以外的字段（如 role、is_chord）保存在附加字典中。"""
+        if isinstance(notes, NoteTable):
+            return notes
+        table = cls()
+        for n in notes:
+            try:
+                st = float(n.get('start_time', 0.0))
+                et = float(n.get('end_time', st))
+                i = table.append(st, et, int(n.get('note', 0)), n.get('velocity'), n.get('channel'),
+                                 n.get('track'), n.get('program'), bool(n.get('is_drum', False)),
+                                 n.get('instrument_name'))
+            except Exception:
+                continue
+            extra = {k: v for k, v in n.items() if k not in _GETTERS}
+            if 'note_orig' in n:
+                extra['note_orig'] = n['note_orig']
+            if extra:
+                table.extras[i] = extra
+        return table
+
+    @classmethod
+    def from_columns(cls, columns: Dict[str, array], names: Optional[List[Optional[str]]] = None,
+                     pitch_orig: Optional[array] = None) -> 'NoteTable':
+        """由等长的列数组直接构建基础表（不逐行追加，列对象被直接采用）；缺失的列按缺省值补齐。"""
+        n = len(columns['start'])
+        table = cls()
+        for attr, code in COLUMN_TYPES:
+            col = columns.get(attr)
+            if col is None:
+                col = array(code, [-1 if attr in _NULLABLE else 0]) * n
+            elif not isinstance(col, array) or col.typecode != code:
+                col = array(code, col)
+            if len(col) != n:
+                raise ValueError(f"列长度不一致: {attr}")
+            setattr(table, attr, col)
+        if pitch_orig is not None:
+            if len(pitch_orig) != n:
+                raise ValueError("列长度不一致: pitch_orig")
+            table.pitch_orig = pitch_orig if isinstance(pitch_orig, array) else array('h', pitch_orig)
+        if names:
+            table.names = [None] + [None if x is None else str(x) for x in names[1:]]
+            table._name_ids = {x: i for i, x in enumerate(table.names) if x is not None}
+        return table
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """展开为独立的 dict 列表（供需要自由修改的旧代码使用）。"""
+        return [dict(row) for row in self]
+
+    # ---- 视图 ----
+    def _view(self, base_ids: array) -> 'NoteTable':
+        v = NoteTable.__new__(NoteTable)
+        for attr in NoteTable.__slots__:
+            if attr != '_ids':
+                setattr(v, attr, getattr(self, attr))
+        v._ids = base_ids
+        return v
+
+    def row_ids(self) -> Sequence[int]:
+        """本表各行在基础表中的行号。"""
+        return range(len(self.start)) if self._ids is None else self._ids
+
+    def select_ids(self, base_ids: Iterable[int]) -> 'NoteTable':
+        """按基础行号（row_ids() 中的值）构造索引视图。"""
+        return self._view(array('I', base_ids))
+
+    def view(self, positions: Iterable[int]) -> 'NoteTable':
+        """按本表内的位置选取行，返回共享列的索引视图。"""
+        ids = self.row_ids()
+        return self._view(array('I', (ids[p] for p in positions)))
+
+    def where(self, predicate: Callable[[NoteRow], bool]) -> 'NoteTable':
+        """按行谓词过滤，返回索引视图。"""
+        return self._view(array('I', (i for i in self.row_ids() if predicate(NoteRow(self, i)))))
+
+    def where_ids(self, predicate: Callable[[int], bool]) -> 'NoteTable':
+        """按基础行号谓词过滤（谓词直接读列，避免构造行视图），返回索引视图。"""
+        return self._view(array('I', filter(predicate, self.row_ids())))
+
+    def column(self, attr: str) -> Sequence[Any]:
+        """按本表行序返回一列：基础表直接返回底层 array（只读约定），视图返回列表。"""
+        col = getattr(self, attr)
+        if self._ids is None:
+            return col
+        return [col[i] for i in self._ids]
+
+    def columns(self, *attrs: str) -> Tuple[Sequence[Any], ...]:
+        return tuple(self.column(a) for a in attrs)
+
+    def compact(self) -> 'NoteTable':
+        """复制为紧凑的基础表（视图物化）；附加字段逐行浅拷贝。"""
+        out = NoteTable()
+        ids = self.row_ids()
+        for attr, code, _ in _COLUMNS:
+            col = getattr(self, attr)
+            setattr(out, attr, array(code, col) if self._ids is None else array(code, (col[i] for i in ids)))
+        if self.pitch_orig is not None:
+            out.pitch_orig = array('h', (self.pitch_orig[i] for i in ids))
+        out.names = list(self.names)
+        out._name_ids = dict(self._name_ids)
+        for new_i, i in enumerate(ids):
+            ex = self.extras.get(i)
+            if ex:
+                out.extras[new_i] = dict(ex)
+        return out
+
+    # ---- 变换 ----
+    def sort_by_start(self) -> 'NoteTable':
+        """按起始时间稳定排序（基础表原地重排，视图重排行号），返回自身。"""
+        ids = self.row_ids()
+        start = self.start
+        order = sorted(range(len(ids)), key=lambda p: start[ids[p]])
+        if self._ids is not None:
+            self._ids = array('I', (ids[p] for p in order))
+            return self
+        if all(order[p] == p for p in range(len(order))):
+            return self
+        self._check_writable()
+        for attr, code, _ in _COLUMNS:
+            col = getattr(self, attr)
+            setattr(self, attr, array(code, (col[p] for p in order)))
+        if self.pitch_orig is not None:
+            self.pitch_orig = array('h', (self.pitch_orig[p] for p in order))
+        if self.extras:
+            new_pos = {old: new for new, old in enumerate(order)}
+            self.extras = {new_pos[i]: ex for i, ex in self.extras.items()}
+        return self
+
+    def scale_times(self, factor: float) -> None:
+        """将本表各行的起止时间原地乘以 factor。"""
+        self._check_writable()
+        f = float(factor)
+        start, end = self.start, self.end
+        for i in self.row_ids():
+            start[i] = start[i] * f
+            end[i] = end[i] * f
+
+    def drum_flags(self) -> List[bool]:
+        """按本表行序返回是否为鼓（is_drum 或 channel==9）。"""
+        is_drum, channel = self.is_drum, self.channel
+        return [bool(is_drum[i]) or channel[i] == 9 for i in self.row_ids()]
+
+    def transposed(self, semitones: int) -> 'NoteTable':
+        """返回移调后的紧凑副本：非鼓行音高平移并夹到 0..127，原音高记入 note_orig。"""
+        out = self.compact()
+        k = int(semitones)
+        if k == 0:
+            return out
+        pitch, is_drum, channel = out.pitch, out.is_drum, out.channel
+        orig = array('h', [-1]) * len(pitch)
+        for i in range(len(pitch)):
+            if is_drum[i] or channel[i] == 9:
+                continue
+            p0 = pitch[i]
+            orig[i] = p0
+            pitch[i] = max(0, min(127, p0 + k))
+        out.pitch_orig = orig
+        return out
+
+    # ---- 只读 ----
+    def freeze(self) -> 'NoteTable':
+        """标记为只读（视图随之只读）；返回自身。"""
+        self._frozen = True
+        return self
+
+    @property
+    def frozen(self) -> bool:
+        return self._frozen
+
+    def _check_writable(self) -> None:
+        if self._frozen:
+            raise TypeError("只读音符表（解析缓存共享）不可原地修改，请先 compact() 复制")
+
+    # ---- 汇总 ----
+    def nbytes(self) -> int:
+        """底层列与附加数据的近似内存占用（字节），用于缓存记账；视图只计行号数组。"""
+        if self._ids is not None:
+            return self._ids.itemsize * len(self._ids)
+        total = sum(getattr(self, attr).itemsize * len(getattr(self, attr)) for attr, _, _ in _COLUMNS)
+        if self.pitch_orig is not None:
+            total += self.pitch_orig.itemsize * len(self.pitch_orig)
+        total += sum(len(n) for n in self.names if n) + 64 * len(self.names)
+        total += sum(240 + 100 * len(ex) for ex in self.extras.values())
+        return total
+
+    def channels(self) -> List[int]:
+        return sorted({c for c in self.column('channel') if c >= 0})
+
+    def end_time(self) -> float:
+        col = self.column('end')
+        return max(col) if len(col) else 0.0
+
+    # ---- 序列协议（迁移期与 dict 列表兼容） ----
+    def __len__(self) -> int:
+        return len(self.start) if self._ids is None else len(self._ids)
+
+    def __iter__(self) -> Iterator[NoteRow]:
+        for i in self.row_ids():
+            yield NoteRow(self, i)
+
+    def __getitem__(self, pos):
+        if isinstance(pos, slice):
+            return self._view(array('I', self.row_ids()[pos]))
+        return NoteRow(self, self.row_ids()[pos])
+
+    def __repr__(self) -> str:
+        kind = 'view' if self._ids is not None else 'table'
+        return f"NoteTable({kind}, rows={len(self)})"
+
+
+__all__ = ['NoteTable', 'NoteRow', 'COLUMN_TYPES']
@@ -0,0 +1,290 @@
+"""
+parse_midi 结果缓存（进程级内存 + 磁盘）
+选中一首歌会多次调用 analyzer.parse_midi（解析面板、分部自动选择、白键率防抖、播放入口），
+每次都重新读盘并走一遍 pretty_midi/miditoolkit；每次启动后打开常用曲目也要重新付出完整解析。
+- 内存层：按 (绝对路径, 大小, mtime_ns, 引擎) 缓存；文件被修改或切换解析引擎即得到新的键；
+  LRU 同时受条目数与近似字节数（NoteTable.nbytes）约束，超出时淘汰最久未用；
+- 磁盘层（temp/parse_cache）：按 文件内容摘要 + 解析器版本签名 + 引擎 命名，每首一个紧凑二进制文件：
+  头部 + 汇总字段 JSON + 各音符列的原始字节；读取只需一次读文件与每列一次 frombytes，
+  不再触发 pretty_midi/miditoolkit/mido；总字节超过上限时按最近使用淘汰；
+- 结果不可变：音符表 freeze()，结果字典为只读 dict，所有调用方共享同一份对象；
+- 同一键的并发未命中只解析一次（其余线程等待首个解析完成）。
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import struct
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .note_table import COLUMN_TYPES, NoteTable
+
+Key = Tuple[str, int, int, str]
+
+DEFAULT_CACHE_DIR = os.path.join('temp', 'parse_cache')
+FORMAT_VERSION = 1
+
+_MAGIC = b'MAPC'
+# magic, 格式版本, 音符数, 汇总 JSON 字节数, 是否含 pitch_orig 列
+_HEADER = struct.Struct('<4sHIIB')
+
+
+class ParseResult(dict):
+    """只读的解析结果字典（仍是 dict，兼容 isinstance/get/下标读取）；需要修改时用 copy()。"""
+
+    __slots__ = ()
+
+    def _readonly(self, *args: Any, **kwargs: Any) -> None:
+        raise TypeError("解析结果为缓存共享的只读字典，请先 copy()")
+
+    __setitem__ = __delitem__ = _readonly  # type: ignore[assignment]
+    clear = pop = popitem = setdefault = update = _readonly  # type: ignore[assignment]
+
+    def __ior__(self, other: Any) -> 'ParseResult':
+        self._readonly()
+        return self
+
+    def copy(self) -> Dict[str, Any]:  # type: ignore[override]
+        return dict(self)
+
+
+def freeze_result(result: Dict[str, Any]) -> ParseResult:
+    """冻结音符表并包装为只读结果。"""
+    notes = result.get('notes')
+    if hasattr(notes, 'freeze'):
+        notes.freeze()
+    frozen = dict(result)
+    if isinstance(frozen.get('channels'), list):
+        frozen['channels'] = tuple(frozen['channels'])
+    return ParseResult(frozen)
+
+
+def result_nbytes(result: Dict[str, Any]) -> int:
+    notes = result.get('notes')
+    size = 512
+    if hasattr(notes, 'nbytes'):
+        size += int(notes.nbytes())
+    elif notes:
+        size += 600 * len(notes)
+    return size
+
+
+def file_key(path: str, engine: str) -> Optional[Key]:
+    """(绝对路径, 大小, mtime_ns, 引擎)；文件不存在时返回 None。"""
+    try:
+        ap = os.path.abspath(path)
+        st = os.stat(ap)
+    except Exception:
+        return None
+    return (ap, int(st.st_size), int(st.st_mtime_ns), str(engine))
+
+
+class ParseCache:
+    """线程安全的解析结果缓存。version 为解析器版本签名（规则或依赖库版本变化时不同）；cache_dir=None 时只用内存层。"""
+
+    def __init__(self, max_entries: int = 8, max_bytes: int = 64 * 1024 * 1024, version: str = '',
+                 cache_dir: Optional[str] = DEFAULT_CACHE_DIR, max_disk_bytes: int = 128 * 1024 * 1024):
+        self.max_entries = max(1, int(max_entries))
+        self.max_bytes = max(0, int(max_bytes))
+        self.version = str(version)
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max(0, int(max_disk_bytes))
+        self._mem: 'OrderedDict[Key, Tuple[ParseResult, int]]' = OrderedDict()
+        self._inflight: Dict[Key, threading.Event] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get_or_parse(self, key: Key, loader: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        """命中直接返回共享结果；未命中先查磁盘，再调用 loader()，成功（ok=True）的结果冻结后入缓存。"""
+        while True:
+            with self._lock:
+                entry = self._mem.get(key)
+                if entry is not None:
+                    self._mem.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                waiter = self._inflight.get(key)
+                if waiter is None:
+                    self._inflight[key] = threading.Event()
+                    break
+            waiter.wait()
+        try:
+            path = self._disk_path(key)
+            result = self._load(path) if path else None
+            if result is not None:
+                with self._lock:
+                    self.hits += 1
+                    self.disk_hits += 1
+            else:
+                with self._lock:
+                    self.misses += 1
+                result = loader()
+                if not (isinstance(result, dict) and result.get('ok')):
+                    return result
+                result = freeze_result(result)
+                if path:
+                    self._store(path, result)
+            self._put(key, result)
+            return result
+        finally:
+            with self._lock:
+                ev = self._inflight.pop(key, None)
+            if ev is not None:
+                ev.set()
+
+    def _put(self, key: Key, result: ParseResult) -> None:
+        size = result_nbytes(result)
+        with self._lock:
+            old = self._mem.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            # 同一文件的旧版本（大小/mtime/引擎不同）不会再被命中，直接移除
+            for k in [k for k in self._mem if k[0] == key[0] and k[3] == key[3]]:
+                self._bytes -= self._mem.pop(k)[1]
+            self._mem[key] = (result, size)
+            self._bytes += size
+            while len(self._mem) > 1 and (len(self._mem) > self.max_entries
+                                          or (self.max_bytes and self._bytes > self.max_bytes)):
+                _, (_, sz) = self._mem.popitem(last=False)
+                self._bytes -= sz
+
+    def invalidate(self, path: Optional[str] = None) -> None:
+        """丢弃某个文件（全部引擎）的内存缓存；path=None 时清空内存层（磁盘层按内容摘要命名，文件变化后自然不再命中）。"""
+        with self._lock:
+            if path is None:
+                self._mem.clear()
+                self._bytes = 0
+                return
+            ap = os.path.abspath(path)
+            for k in [k for k in self._mem if k[0] == ap]:
+                self._bytes -= self._mem.pop(k)[1]
+
+    def clear_disk(self) -> None:
+        if self.cache_dir and os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.pnc'):
+                    try:
+                        os.remove(os.path.join(self.cache_dir, name))
+                    except Exception:
+                        pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'entries': len(self._mem), 'bytes': self._bytes, 'hits': self.hits,
+                    'disk_hits': self.disk_hits, 'misses': self.misses}
+
+    # ---- 磁盘层 ----
+    def _disk_path(self, key: Key) -> Optional[str]:
+        """内容摘要 + 版本签名 + 引擎 → 缓存文件路径；读文件失败时返回 None（不走磁盘层）。"""
+        if not self.cache_dir:
+            return None
+        h = hashlib.blake2b(digest_size=20)
+        try:
+            with open(key[0], 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    h.update(chunk)
+        except Exception:
+            return None
+        h.update(f"\0{FORMAT_VERSION}\0{self.version}\0{key[3]}".encode('utf-8'))
+        return os.path.join(self.cache_dir, f"{h.hexdigest()}.pnc")
+
+    def _store(self, path: str, result: ParseResult) -> None:
+        notes = result.get('notes')
+        if not isinstance(notes, NoteTable):
+            return
+        tmp = None
+        try:
+            if not isinstance(notes.row_ids(), range):
+                notes = notes.compact()  # 视图先物化
+            summary = {k: v for k, v in result.items() if k != 'notes'}
+            summary['channels'] = list(summary.get('channels') or [])
+            summary['_names'] = list(notes.names)
+            summary['_extras'] = {str(i): ex for i, ex in notes.extras.items()}
+            meta_b = json.dumps(summary, ensure_ascii=False).encode('utf-8')
+            has_orig = notes.pitch_orig is not None
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, 'wb') as f:
+                f.write(_HEADER.pack(_MAGIC, FORMAT_VERSION, len(notes), len(meta_b), 1 if has_orig else 0))
+                f.write(meta_b)
+                for attr, _ in COLUMN_TYPES:
+                    f.write(getattr(notes, attr).tobytes())
+                if has_orig:
+                    f.write(notes.pitch_orig.tobytes())
+            os.replace(tmp, path)
+            self._prune_disk()
+        except Exception:
+            if tmp:
+                try:
+                    os.remove(tmp)
+                except Exception:
+                    pass
+
+    def _load(self, path: str) -> Optional[ParseResult]:
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            magic, version, n, meta_len, has_orig = _HEADER.unpack_from(data, 0)
+            if magic != _MAGIC or version != FORMAT_VERSION:
+                raise ValueError("cache format mismatch")
+            off = _HEADER.size
+            summary = json.loads(data[off:off + meta_len].decode('utf-8'))
+            off += meta_len
+            view = memoryview(data)
+            cols: Dict[str, array] = {}
+            for attr, code in COLUMN_TYPES + ((('pitch_orig', 'h'),) if has_orig else ()):
+                col = array(code)
+                size = n * col.itemsize
+                col.frombytes(view[off:off + size])
+                if len(col) != n:
+                    raise ValueError("truncated cache file")
+                cols[attr] = col
+                off += size
+            notes = NoteTable.from_columns(cols, summary.pop('_names', None), cols.pop('pitch_orig', None))
+            notes.extras = {int(i): ex for i, ex in (summary.pop('_extras', None) or {}).items()}
+            try:
+                os.utime(path)  # 磁盘层按最近使用淘汰
+            except Exception:
+                pass
+            summary['notes'] = notes
+            return freeze_result(summary)
+        except Exception:
+            try:
+                os.remove(path)
+            except Exception:
+                pass
+            return None
+
+    def _prune_disk(self) -> None:
+        if not self.cache_dir or self.max_disk_bytes <= 0:
+            return
+        try:
+            files = []
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.pnc'):
+                    p = os.path.join(self.cache_dir, name)
+                    st = os.stat(p)
+                    files.append((st.st_mtime, st.st_size, p))
+            total = sum(size for _, size, _ in files)
+            for _, size, p in sorted(files):
+                if total <= self.max_disk_bytes:
+                    break
+                try:
+                    os.remove(p)
+                    total -= size
+                except Exception:
+                    pass
+        except Exception:
+            pass
+
+
+__all__ = ['ParseCache', 'ParseResult', 'freeze_result', 'file_key', 'DEFAULT_CACHE_DIR', 'FORMAT_VERSION']
@@ -0,0 +1,264 @@
+"""
+内置标准 MIDI 文件（SMF）读取器（解析引擎 'native'）
+mido/pretty_midi/miditoolkit 每条消息、每个音符都要构造若干 Python 对象，之后才转成我们的音符表；
+本模块直接内存映射文件，在紧凑循环中解码 变长数（VLQ）/ running status / meta / sysex，
+按 (轨道, 通道, 音高) 配对 note_on/off，一遍扫描产出列数组（NoteTable），同时收集 tempo 表与 program change。
+- 配对规则与 pretty_midi 一致：note_off（或力度 0 的 note_on）关闭该键所有“起点不在当前 tick”的音符；
+  同 tick 的 note_on 仅在本次确有音符被关闭时保留（否则作为零时长音符丢弃）；文件结束仍未关闭的音符丢弃；
+- channel/track 为真实的 MIDI 通道与轨道序号（mido 口径，与分部识别一致），通道 10（channel=9）视为鼓；
+  program 取该轨该通道在音符结束时刻最近一次 program change（缺省 0，同 pretty_midi）；
+- tick→秒 使用 TempoMap（PPQ/SMPTE）。
+"""
+from __future__ import annotations
+
+import mmap
+import struct
+from array import array
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from .note_table import NoteTable
+from .tempo_map import TempoMap
+
+_CHUNK = struct.Struct('>4sI')
+_MTHD = struct.Struct('>HHh')
+# 系统公共消息（0xF1-0xFE，文件中极少出现）的数据字节数
+_SYSTEM_DATA_LEN = {0xF1: 1, 0xF2: 2, 0xF3: 1}
+
+
+@dataclass
+class SmfData:
+    """一次读取的结果。notes 的时间单位为秒，并按起始时间稳定排序。"""
+    format: int
+    division: int
+    notes: NoteTable
+    tempo_map: TempoMap
+    tempo_events: List[Tuple[int, int]] = field(default_factory=list)  # (tick, 微秒/拍)，按 tick 稳定排序
+    program_changes: List[Tuple[int, int, int, int]] = field(default_factory=list)  # (tick, 轨道, 通道, program)
+    track_names: List[Optional[str]] = field(default_factory=list)
+    max_tick: int = 0
+
+    @property
+    def end_time(self) -> float:
+        """文件结束（所有轨道最后事件）对应的秒数。"""
+        return self.tempo_map.length(self.max_tick)
+
+    @property
+    def initial_bpm(self) -> float:
+        """tick 0 处生效的 BPM（同 tick 多条 set_tempo 时取最后一条，与换算一致）。"""
+        return 60_000_000.0 / max(1.0, self.tempo_map.tempo_at(0))
+
+    def tempos_at_zero(self) -> List[int]:
+        """tick 0 处出现的全部 set_tempo（微秒/拍，按文件顺序）。"""
+        return [t for tk, t in self.tempo_events if tk == 0]
+
+
+def read_smf(path: str) -> SmfData:
+    """读取 SMF 文件；文件头无效时抛出 ValueError。单个轨道数据截断或损坏时保留已解码部分。"""
+    with open(path, 'rb') as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise ValueError("空文件")
+        try:
+            return _read(mm)
+        finally:
+            mm.close()
+
+
+def read_smf_bytes(data: bytes, until_tick: Optional[int] = None) -> SmfData:
+    """从内存中的文件内容读取（供已读入字节的调用方复用，避免再次读盘）。
+    until_tick 不为 None 时各轨只解码到该 tick 为止（如只需 tick 0 处的 tempo 时，几乎不产生开销）。
+    """
+    return _read(data, until_tick)
+
+
+def _read(mm, until_tick: Optional[int] = None) -> SmfData:
+    size = len(mm)
+    if size < 14:
+        raise ValueError("不是有效的 MIDI 文件")
+    # RIFF 包装的 RMID：跳到内部的 MThd
+    pos = 0
+    if mm[0:4] == b'RIFF':
+        pos = mm.find(b'MThd')
+        if pos < 0:
+            raise ValueError("RMID 中未找到 MThd")
+    cid, hlen = _CHUNK.unpack_from(mm, pos)
+    if cid != b'MThd' or hlen < 6:
+        raise ValueError("不是有效的 MIDI 文件（缺少 MThd）")
+    fmt, _ntracks, division = _MTHD.unpack_from(mm, pos + 8)
+    pos += 8 + hlen
+
+    starts = array('q')
+    ends = array('q')
+    pitch = array('h')
+    velocity = array('h')
+    channel = array('h')
+    track = array('i')
+    program = array('h')
+    tempo_events: List[Tuple[int, int]] = []
+    program_changes: List[Tuple[int, int, int, int]] = []
+    track_names: List[Optional[str]] = []
+    max_tick = 0
+    ti = 0
+    while pos + 8 <= size:
+        cid, clen = _CHUNK.unpack_from(mm, pos)
+        pos += 8
+        if cid != b'MTrk':
+            pos += clen  # 未知块：跳过
+            continue
+        data = mm[pos:min(size, pos + clen)]
+        pos += clen
+        name, end_tick = _decode_track(data, ti, starts, ends, pitch, velocity, channel, track, program,
+                                       tempo_events, program_changes, until_tick)
+        track_names.append(name)
+        if end_tick > max_tick:
+            max_tick = end_tick
+        ti += 1
+
+    tempo_events.sort(key=lambda e: e[0])
+    tempo_map = TempoMap(division, tempo_events)
+    n = len(starts)
+    order = sorted(range(n), key=starts.__getitem__)
+    if any(order[i] != i for i in range(n)):
+        starts = array('q', (starts[i] for i in order))
+        ends, pitch, velocity, channel, track, program = (
+            array(col.typecode, (col[i] for i in order)) for col in (ends, pitch, velocity, channel, track, program))
+    names: List[Optional[str]] = [None]
+    inst_of_track = []
+    for i, name in enumerate(track_names):
+        inst_of_track.append(len(names))
+        names.append(name or f"Instrument_{i}")
+    notes = NoteTable.from_columns({
+        'start': array('d', tempo_map.ticks_to_seconds(starts)),
+        'end': array('d', tempo_map.ticks_to_seconds(ends)),
+        'pitch': pitch,
+        'velocity': velocity,
+        'channel': channel,
+        'track': track,
+        'program': program,
+        'is_drum': array('b', (1 if c == 9 else 0 for c in channel)),
+        'instrument': array('I', (inst_of_track[t] for t in track)),
+    }, names)
+    return SmfData(fmt, division, notes, tempo_map, tempo_events, program_changes, track_names, max_tick)
+
+
+def _decode_track(data: bytes, ti: int, starts: array, ends: array, pitch: array, velocity: array,
+                  channel: array, track: array, program: array,
+                  tempo_events: List[Tuple[int, int]],
+                  program_changes: List[Tuple[int, int, int, int]],
+                  until_tick: Optional[int] = None) -> Tuple[Optional[str], int]:
+    """解码一条 MTrk，音符直接追加到各列；返回 (轨道名, 结束 tick)。"""
+    n = len(data)
+    limit = until_tick if until_tick is not None else float('inf')
+    pos = 0
+    tick = 0
+    status = 0
+    name: Optional[str] = None
+    programs = [0] * 16
+    open_notes: Dict[int, List[Tuple[int, int]]] = {}  # (通道<<7 | 音高) -> [(起点 tick, 力度)]
+    add_start, add_end, add_pitch, add_vel = starts.append, ends.append, pitch.append, velocity.append
+    add_ch, add_track, add_prog = channel.append, track.append, program.append
+    try:
+        while pos < n:
+            b = data[pos]
+            pos += 1
+            delta = b & 0x7F
+            while b & 0x80:
+                b = data[pos]
+                pos += 1
+                delta = (delta << 7) | (b & 0x7F)
+            tick += delta
+            if tick > limit:
+                break
+            b = data[pos]
+            if b & 0x80:
+                pos += 1
+                if b == 0xFF:
+                    # meta：不改变 running status
+                    mtype = data[pos]
+                    pos += 1
+                    b = data[pos]
+                    pos += 1
+                    length = b & 0x7F
+                    while b & 0x80:
+                        b = data[pos]
+                        pos += 1
+                        length = (length << 7) | (b & 0x7F)
+                    if mtype == 0x51 and length >= 3:
+                        tempo_events.append((tick, (data[pos] << 16) | (data[pos + 1] << 8) | data[pos + 2]))
+                    elif mtype == 0x03 and name is None:
+                        name = data[pos:pos + length].decode('latin-1').strip() or None
+                    elif mtype == 0x2F:
+                        break
+                    pos += length
+                    continue
+                if b == 0xF0 or b == 0xF7:
+                    status = b
+                    b = data[pos]
+                    pos += 1
+                    length = b & 0x7F
+                    while b & 0x80:
+                        b = data[pos]
+                        pos += 1
+                        length = (length << 7) | (b & 0x7F)
+                    pos += length
+                    continue
+                if b >= 0xF0:
+                    pos += _SYSTEM_DATA_LEN.get(b, 0)
+                    continue
+                status = b
+            elif status < 0x80 or status >= 0xF0:
+                break  # running status 无前导状态字节：该轨后续数据无法解码
+            kind = status & 0xF0
+            if kind == 0x90 or kind == 0x80:
+                note = data[pos]
+                vel = data[pos + 1]
+                pos += 2
+                ch = status & 0x0F
+                key = (ch << 7) | note
+                if kind == 0x90 and vel > 0:
+                    lst = open_notes.get(key)
+                    if lst is None:
+                        open_notes[key] = [(tick, vel)]
+                    else:
+                        lst.append((tick, vel))
+                else:
+                    lst = open_notes.get(key)
+                    if lst:
+                        keep = None
+                        closed = False
+                        prog = programs[ch]
+                        for st, v in lst:
+                            if st == tick:
+                                if keep is None:
+                                    keep = []
+                                keep.append((st, v))
+                                continue
+                            closed = True
+                            add_start(st)
+                            add_end(tick)
+                            add_pitch(note)
+                            add_vel(v)
+                            add_ch(ch)
+                            add_track(ti)
+                            add_prog(prog)
+                        if keep and closed:
+                            open_notes[key] = keep
+                        else:
+                            del open_notes[key]
+            elif kind == 0xC0:
+                ch = status & 0x0F
+                programs[ch] = data[pos]
+                program_changes.append((tick, ti, ch, data[pos]))
+                pos += 1
+            elif kind == 0xD0:
+                pos += 1
+            else:  # 0xA0 / 0xB0 / 0xE0
+                pos += 2
+    except IndexError:
+        pass  # 轨道数据截断：保留已解码部分
+    return name, tick
+
+
+__all__ = ['SmfData', 'read_smf', 'read_smf_bytes']
@@ -0,0 +1,138 @@
+"""
+Tempo map：MIDI tick → 秒 的统一换算
+原先 AutoPlayer._parse_midi_file、DrumsMidiParser.parse 与 PlaybackController._build_note_events_with_track
+各有一份 tick_to_seconds，每次换算线性扫描 tempo 表，代价 O(音符数 × tempo 变化数)；
+rubato 转写（如 PianoTrans 输出）常有上千个 set_tempo，解析明显变慢。
+- PPQ：按 tempo 变化点预先累计秒数，标量换算二分定位（O(log n)）；
+- SMPTE（division 最高位为 1）：固定“秒/每tick”；
+- 批量换算 ticks_to_seconds：numpy 可用且输入为 ndarray 时用 searchsorted 向量化，
+  否则对有序输入做一次线性归并（无序输入逐个二分）。
+同一 tick 上有多条不同 tempo 时以最后一条为准（与旧实现一致）。
+"""
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_right
+from typing import Any, Iterable, List, Sequence, Tuple
+
+try:
+    import numpy as np  # 可选：批量换算向量化
+except Exception:
+    np = None
+
+DEFAULT_TEMPO = 500000  # 微秒/拍（120 BPM）
+
+
+def _smpte_seconds_per_tick(division: int) -> float:
+    """SMPTE division：高字节为负的帧率，低字节为每帧 tick 数（缺省按 30fps/80tpf）。"""
+    div = int(division)
+    hi = (div >> 8) & 0xFF
+    lo = div & 0xFF
+    if hi >= 128:
+        hi -= 256
+    fps = abs(hi) if hi != 0 else 30
+    ticks_per_frame = lo if lo > 0 else 80
+    return 1.0 / (float(fps) * float(ticks_per_frame))
+
+
+class TempoMap:
+    """不可变的 tempo 表；ticks_per_beat < 0 表示 SMPTE 时间基。"""
+
+    __slots__ = ('ticks_per_beat', 'is_smpte', 'smpte_seconds_per_tick', 'ticks', 'tempos', 'acc_seconds', '_spt')
+
+    def __init__(self, ticks_per_beat: int, tempo_events: Iterable[Tuple[int, int]] = ()):
+        """tempo_events 为按 tick 排序的 (tick, 微秒/拍)；SMPTE 时间基下忽略。"""
+        self.ticks_per_beat = int(ticks_per_beat)
+        self.is_smpte = self.ticks_per_beat < 0
+        self.smpte_seconds_per_tick = _smpte_seconds_per_tick(self.ticks_per_beat) if self.is_smpte else 0.0
+        ticks = array('q', [0])
+        tempos = array('d', [float(DEFAULT_TEMPO)])
+        if not self.is_smpte:
+            last_tempo = DEFAULT_TEMPO
+            for tick, tempo in tempo_events:
+                tick = int(tick)
+                tempo = int(tempo or last_tempo)
+                # 与上一条不同才记录，避免重复
+                if tick != ticks[-1] or tempo != last_tempo:
+                    ticks.append(tick)
+                    tempos.append(float(tempo))
+                    last_tempo = tempo
+        ppq = max(1, self.ticks_per_beat)
+        spt = [t / 1_000_000.0 / ppq for t in tempos]
+        acc = array('d', [0.0])
+        for i in range(1, len(ticks)):
+            acc.append(acc[i - 1] + max(0, ticks[i] - ticks[i - 1]) * spt[i - 1])
+        self.ticks = ticks
+        self.tempos = tempos
+        self.acc_seconds = acc
+        self._spt = spt
+
+    @classmethod
+    def from_mido(cls, mid: Any) -> 'TempoMap':
+        """由 mido.MidiFile 构建（合并所有轨道的 set_tempo，按绝对 tick 稳定排序）。"""
+        events: List[Tuple[int, int]] = []
+        for track in mid.tracks:
+            tick = 0
+            for msg in track:
+                tick += int(getattr(msg, 'time', 0) or 0)
+                if getattr(msg, 'type', None) == 'set_tempo':
+                    events.append((tick, int(getattr(msg, 'tempo', DEFAULT_TEMPO) or DEFAULT_TEMPO)))
+        events.sort(key=lambda e: e[0])
+        return cls(int(getattr(mid, 'ticks_per_beat', 480) or 480), events)
+
+    def __len__(self) -> int:
+        return len(self.ticks)
+
+    @property
+    def changes(self) -> List[Tuple[int, float]]:
+        """(tick, 微秒/拍) 变化点列表（含起始的默认 tempo）。"""
+        return list(zip(self.ticks, self.tempos))
+
+    def tempo_at(self, tick: int) -> float:
+        """tick 处生效的 tempo（微秒/拍）；SMPTE 时间基下返回默认值。"""
+        if self.is_smpte:
+            return float(DEFAULT_TEMPO)
+        return self.tempos[max(0, bisect_right(self.ticks, tick) - 1)]
+
+    def tick_to_seconds(self, tick: int) -> float:
+        if self.is_smpte:
+            return float(tick) * self.smpte_seconds_per_tick
+        i = bisect_right(self.ticks, tick) - 1
+        if i < 0:
+            i = 0
+        return self.acc_seconds[i] + (tick - self.ticks[i]) * self._spt[i]
+
+    def ticks_to_seconds(self, ticks: Sequence[int]) -> Any:
+        """批量换算：ndarray 输入返回 ndarray（numpy 向量化），其他输入返回 list[float]。"""
+        if np is not None and isinstance(ticks, np.ndarray):
+            t = ticks.astype(np.float64)
+            if self.is_smpte:
+                return t * self.smpte_seconds_per_tick
+            bounds = np.frombuffer(self.ticks, dtype=np.int64)
+            idx = np.clip(np.searchsorted(bounds, ticks, side='right') - 1, 0, None)
+            return (np.frombuffer(self.acc_seconds, dtype=np.float64)[idx]
+                    + (t - bounds[idx]) * np.asarray(self._spt, dtype=np.float64)[idx])
+        if self.is_smpte:
+            spt_s = self.smpte_seconds_per_tick
+            return [float(tp) * spt_s for tp in ticks]
+        bounds, acc, spt = self.ticks, self.acc_seconds, self._spt
+        n = len(bounds)
+        out: List[float] = []
+        i = 0
+        prev = None
+        for tp in ticks:
+            if prev is not None and tp < prev:
+                i = max(0, bisect_right(bounds, tp) - 1)  # 无序输入：回退二分
+            else:
+                while i + 1 < n and bounds[i + 1] <= tp:
+                    i += 1
+            prev = tp
+            out.append(acc[i] + (tp - bounds[i]) * spt[i])
+        return out
+
+    def length(self, max_tick: int) -> float:
+        """0 到 max_tick 的总秒数。"""
+        return self.tick_to_seconds(max(0, int(max_tick)))
+
+
+__all__ = ['TempoMap', 'DEFAULT_TEMPO']
@@ -5,15 +5,27 @@
 
 import time
 import threading
+from collections import deque
 from typing import Any, Dict, List, Optional, Tuple, Callable
 from meowauto.utils import midi_tools
 from meowauto.core import Event, KeySender, Logger
-from meowauto.playback.strategies import get_strategy
-from meowauto.playback.keymaps import get_default_mapping
+from meowauto.core.key_backend import KeyBackend, resolve_key_backend
+from meowauto.playback.strategies import get_strategy, note_index
+from meowauto.playback.timeline import PlaybackTimeline, ACTION_RELEASE
+from meowauto.playback.event_pipeline import KeyEventPipeline, union_and_tap
+from meowauto.playback.scheduler import AdaptiveScheduler
+from meowauto.playback.telemetry import LatenessRecorder
+from meowauto.playback.transport import PlaybackTransport
+from meowauto.playback.progress import ProgressPublisher
+from meowauto.playback.drift import DriftCorrector
+from meowauto.playback.isolated import IsolatedPlayback
+from meowauto.playback.keymaps import get_default_mapping, all_mapping_keys
 from meowauto.core.config import ConfigManager
 from meowauto.music.chord_engine import ChordEngine
 from meowauto.playback.keymaps_ext.drums import DRUMS_KEYMAP
 from meowauto.midi.drums_parser import DrumsMidiParser
+from meowauto.midi.note_table import NoteTable
+from meowauto.midi.tempo_map import TempoMap
 
 import os
 
@@ -27,6 +39,8 @@ class AutoPlayer:
         self.play_thread = None
         self.current_tempo = 1.0
         self.current_events = []
+        # 最近一次编译的按键时间轴（mapped-events 播放路径）
+        self.current_timeline: Optional[PlaybackTimeline] = None
         self.debug = False  # 调试模式：输出详细调度与事件日志
         # 可选时钟提供者（由服务层注入，仅用于日志与未来扩展）
         self._clock_provider = None
@@ -36,7 +50,8 @@ class AutoPlayer:
             'retrigger_min_gap_ms': 40,        # 重触发的最小时间间隔
             'epsilon_ms': 6,                   # 批处理窗口大小（毫秒）
             'send_ahead_ms': 0,                # 提前量（0 = 不提前，严格与事件时间对齐）
-            'spin_threshold_ms': 1,            # 忙等切换阈值
+            'spin_threshold_ms': 1,            # 忙等切换阈值（仅 adaptive_wait=False 时使用）
+            'adaptive_wait': True,             # 按实测 sleep 超时自适应划分睡眠/忙等
             'post_action_sleep_ms': 0,         # 每次发按键后追加微睡眠
             'enable_chord_accomp': True,       # 启用和弦伴奏
             'chord_min_sustain_ms': 1500,      # 和弦最短/默认持续时长（ms）
@@ -54,7 +69,33 @@ class AutoPlayer:
             # 多轨/多分部短时间内多键处理策略：'arpeggio' | 'merge' | 'original'
             'multi_key_cluster_mode': 'merge',
             'multi_key_cluster_window_ms': 240,
+            # 按键输出后端：None=读取配置 playback.key_backend；'keyboard' | 'null' | 'recording' 或 KeyBackend 实例
+            'key_backend': None,
+            'late_threshold_ms': 5,            # 时序报告中“迟到”判定阈值
+            'progress_rate_hz': 20,            # on_progress 发布频率（独立定时线程采样，0=不发布）
+            'isolated_playback': False,        # 在独立子进程中调度按键（与 UI/解析的 GIL 争用隔离）
+            # 合奏漂移校正（仅 arm 预约开始时生效）：按网络时钟周期比较曲目位置并施加有界速率微调
+            'drift_correction': False,
+            'drift_check_interval_ms': 250,
+            'drift_max_slew': 0.005,           # 最大速率偏移（0.005 = ±0.5%）
+            'drift_deadband_ms': 1,
         }
+        self._key_backend: Optional[KeyBackend] = None
+        self._key_backend_for: Any = None  # _key_backend 对应的 key_backend 选项值
+        # 自适应等待调度器：首次播放时校准，之后跨曲目持续学习
+        self.scheduler = AdaptiveScheduler()
+        # 逐片迟到量遥测（预分配环形缓冲）与最近一次曲终报告
+        self.telemetry = LatenessRecorder()
+        self.last_timing_report: Optional[Dict[str, Any]] = None
+        # 最近一次时间轴编译的各阶段耗时（毫秒）：map/chord/dedup/sort/cluster/union_tap/compile
+        self.last_pipeline_stats: Dict[str, float] = {}
+        # 传输控制：暂停/恢复/停止通过 Condition 通知播放线程，并维护曲目时间锚点
+        # 进度发布：定时采样传输位置，避免播放线程逐片跨线程回调 UI
+        # 两者每次播放新建一份；旧播放线程只操作自己那一份，不会波及新一次播放
+        self._transport = PlaybackTransport()
+        self._progress = ProgressPublisher()
+        # 隔离播放子进程句柄（仅 isolated_playback=True 时存在）
+        self._isolated: Optional[IsolatedPlayback] = None
         self.playback_callbacks = {
             'on_start': None,
             'on_stop': None,
@@ -77,8 +118,8 @@ class AutoPlayer:
         self.logger.log(f"AutoPlayer 调试模式: {'开启' if self.debug else '关闭'}", "INFO")
 
     def set_clock_provider(self, provider):
-        """注入时钟提供者（可为网络时钟/本地时钟）。当前播放循环仍使用本地高精度计时，
-        此方法主要用于统一接口与日志展示。"""
+        """注入时钟提供者（可为网络时钟/本地时钟）。播放循环使用本地高精度计时，
+        arm() 预约开始时用它把绝对开始时刻换算为本地 perf_counter 时刻。"""
         self._clock_provider = provider
         try:
             src = 'NTP' if getattr(provider, 'last_sync_ok', False) else 'Local'
@@ -94,8 +135,24 @@ class AutoPlayer:
         if self.debug:
             self.logger.log(f"[DEBUG] 选项: {self.options}", "DEBUG")
     
-    def start_auto_play(self, events: List[Event], tempo: float = 1.0) -> bool:
-        """开始自动演奏（LRCp模式）"""
+    def set_key_backend(self, backend):
+        """设置按键输出后端（名称或 KeyBackend 实例），下一次播放生效"""
+        self.options['key_backend'] = backend
+        self._key_backend = None
+
+    def get_key_backend(self) -> KeyBackend:
+        """获取当前按键输出后端（按选项惰性创建并复用，便于读取录制结果）"""
+        want = self.options.get('key_backend')
+        if isinstance(want, KeyBackend):
+            self._key_backend = want
+        elif self._key_backend is None or want != self._key_backend_for:
+            # 按“请求的选项值”缓存：回退（未知名称/keyboard 不可用→null）后名称不一致也不会每次重建
+            self._key_backend = resolve_key_backend(want, self.logger.log)
+        self._key_backend_for = want
+        return self._key_backend
+
+    def start_auto_play(self, events: List[Event], tempo: float = 1.0, start_at: float = 0.0) -> bool:
+        """开始自动演奏（LRCp模式）：乐谱事件编译为与 MIDI 路径相同的按键时间轴"""
         if self.is_playing:
             self.logger.log("自动演奏已在进行中", "WARNING")
             return False
@@ -109,10 +166,9 @@ class AutoPlayer:
         self.is_playing = True
         self.is_paused = False
         
-        # 启动演奏线程
-        self.play_thread = threading.Thread(target=self._auto_play_thread)
-        self.play_thread.daemon = True
-        self.play_thread.start()
+        # 编译时间轴并启动演奏
+        self.current_timeline = PlaybackTimeline.from_score_events(events)
+        self._launch_timeline(start_at)
         
         # 调用开始回调
         if self.playback_callbacks['on_start']:
@@ -132,7 +188,8 @@ class AutoPlayer:
         return False
 
     def start_auto_play_midi_drums(self, midi_file: str, tempo: float = 1.0,
-                                   key_mapping: Optional[Dict[str, str]] = None) -> bool:
+                                   key_mapping: Optional[Dict[str, str]] = None,
+                                   start_at: float = 0.0) -> bool:
         """开始自动演奏（鼓专用MIDI）
         - 使用 DrumsMidiParser 读取 tempo map，输出鼓位事件
         - 直接按鼓键位映射（不走21键策略），忽略力度
@@ -141,9 +198,29 @@ class AutoPlayer:
         if self.is_playing:
             self.logger.log("自动演奏已在进行中", "WARNING")
             return False
+        timeline = self.build_timeline_midi_drums(midi_file, key_mapping)
+        if timeline is None:
+            return False
+
+        self.current_tempo = tempo
+        self.is_playing = True
+        self.is_paused = False
+        self.current_timeline = timeline
+        self._launch_timeline(start_at)
+
+        if self.playback_callbacks['on_start']:
+            self.playback_callbacks['on_start']()
+        self.logger.log("开始自动演奏（鼓MIDI专用）", "INFO")
+        if self.debug:
+            self.logger.log(f"[DEBUG] 文件: {midi_file}, 鼓动作数: {len(timeline)}, 速度: {self.current_tempo}", "DEBUG")
+        return True
+
+    def build_timeline_midi_drums(self, midi_file: str,
+                                  key_mapping: Optional[Dict[str, str]] = None) -> Optional[PlaybackTimeline]:
+        """解析鼓专用MIDI并编译为按键时间轴（不启动播放），失败返回 None"""
         if not midi_file:
             self.logger.log("MIDI文件路径为空", "ERROR")
-            return False
+            return None
 
         # 键位映射：允许外部覆盖，默认使用 DRUMS_KEYMAP
         km = key_mapping or DRUMS_KEYMAP
@@ -151,7 +228,7 @@ class AutoPlayer:
         notes = parser.parse(midi_file)
         if not notes:
             self.logger.log("鼓MIDI解析为空或失败", "ERROR")
-            return False
+            return None
 
         # 将鼓事件转换为按键事件
         events: List[Dict[str, Any]] = []
@@ -184,74 +261,131 @@ class AutoPlayer:
 
         if not events:
             self.logger.log("鼓MIDI映射为空", "ERROR")
-            return False
-
-        # 去重 + 多键窗口规范化 + 对同一时间戳，保证 note_off 先于 note_on
-        try:
-            events = self._dedup_same_time_same_key(events)
-        except Exception:
-            pass
-        try:
-            events = self._normalize_multi_key_clusters(events)
-        except Exception:
-            pass
-        try:
-            events.sort(key=lambda x: (x['start_time'], 0 if x.get('type') == 'note_off' else 1))
-        except Exception:
-            pass
-
-        self.current_tempo = tempo
-        self.is_playing = True
-        self.is_paused = False
-        self.play_thread = threading.Thread(target=self._auto_play_mapped_events_thread, args=(events,))
-        self.play_thread.daemon = True
-        self.play_thread.start()
+            return None
 
-        if self.playback_callbacks['on_start']:
-            self.playback_callbacks['on_start']()
-        self.logger.log("开始自动演奏（鼓MIDI专用）", "INFO")
-        if self.debug:
-            self.logger.log(f"[DEBUG] 文件: {midi_file}, 鼓事件数: {len(events)}, 速度: {self.current_tempo}", "DEBUG")
-        return True
+        # 去重 + 多键窗口规范化 + 对同一时间戳，保证 note_off 先于 note_on（鼓不做延长音并集）
+        pipeline = KeyEventPipeline(self.options)
+        timeline = pipeline.run(events, union=False)
+        self.last_pipeline_stats = dict(pipeline.stage_ms)
+        if timeline is None:
+            self.logger.log("鼓MIDI映射为空", "ERROR")
+        return timeline
     
     def start_auto_play_midi_events(self, notes: List[Dict[str, Any]], tempo: float = 1.0,
                                     key_mapping: Dict[str, str] = None,
-                                    strategy_name: Optional[str] = None) -> bool:
+                                    strategy_name: Optional[str] = None,
+                                    start_at: float = 0.0) -> bool:
         """开始自动演奏（使用外部解析后的MIDI音符事件）
         期望 notes 为带有 start_time/end_time/note/channel 的列表。
+        start_at: 从曲目第几秒开始（该时刻应保持按下的键会先补按）。
         注意：pretty_midi解析的start_time已经是考虑了原始MIDI tempo的准确秒数，
         这里的tempo参数仅用于用户倍速调整，不应对时间进行二次tempo处理。
         """
         if self.is_playing:
             self.logger.log("自动演奏已在进行中", "WARNING")
             return False
+        timeline = self.build_timeline_midi_events(notes, key_mapping, strategy_name)
+        if timeline is None:
+            return False
+
+        # 设置状态并启动线程
+        self.current_tempo = tempo
+        self.is_playing = True
+        self.is_paused = False
+        # 标记使用pretty_midi事件，用于正确的tempo处理
+        self._using_pretty_midi_events = True
+        self.current_timeline = timeline
+        self._launch_timeline(start_at)
+        
+        # 启动回调（需可调用）
+        cb = self.playback_callbacks.get('on_start')
+        if callable(cb):
+            cb()
+        try:
+            src = 'NTP' if getattr(self._clock_provider, 'last_sync_ok', False) else 'Local'
+            self.logger.log(f"开始自动演奏（外部解析事件） clock={src}", "INFO")
+        except Exception:
+            self.logger.log("开始自动演奏（外部解析事件）", "INFO")
+        if self.debug:
+            self.logger.log(f"[DEBUG] 时间轴动作数: {len(timeline)}, 速度: {self.current_tempo}, pretty_midi模式", "DEBUG")
+        return True
+
+    def build_timeline_midi_events(self, notes: List[Dict[str, Any]],
+                                   key_mapping: Dict[str, str] = None,
+                                   strategy_name: Optional[str] = None) -> Optional[PlaybackTimeline]:
+        """将外部解析的音符按策略映射并预处理，编译为按键时间轴（不启动播放），失败返回 None
+        notes 可为 dict 列表或 NoteTable（按列读取）。
+        """
         if not notes:
             self.logger.log("外部解析的MIDI事件为空", "ERROR")
-            return False
+            return None
         # 若未提供键位映射，使用默认
         if not key_mapping:
             key_mapping = self._get_default_key_mapping()
 
+        pipeline = KeyEventPipeline(self.options)
         # 展开为按键事件
         events: List[Dict[str, Any]] = []
         # 解析策略
         strategy = get_strategy(strategy_name or "strategy_21key")
-        for n in notes:
+        with pipeline.stage('map'):
+            lut = strategy.lut(key_mapping, self.options)
+            if isinstance(notes, NoteTable):
+                # 列式输入：直接读列（-1 表示缺省的通道/力度）
+                for st, et, note, ch, vel in zip(*notes.columns('start', 'end', 'pitch', 'channel', 'velocity')):
+                    key = lut[note_index(note)]
+                    if not key:
+                        continue
+                    ch = ch if ch >= 0 else 0
+                    events.append({'start_time': st, 'type': 'note_on', 'key': key, 'velocity': vel if vel >= 0 else 64, 'channel': ch, 'note': note})
+                    events.append({'start_time': max(et, st), 'type': 'note_off', 'key': key, 'velocity': 0, 'channel': ch, 'note': note})
+            else:
+                for n in notes:
+                    try:
+                        st = float(n.get('start_time', 0.0))
+                        et = float(n.get('end_time', st))
+                        note = int(n.get('note', 0))
+                        ch = int(n.get('channel', 0))
+                        key = lut[note_index(note)]
+                        if not key:
+                            continue
+                        events.append({'start_time': st, 'type': 'note_on', 'key': key, 'velocity': int(n.get('velocity', 64)), 'channel': ch, 'note': note})
+                        events.append({'start_time': max(et, st), 'type': 'note_off', 'key': key, 'velocity': 0, 'channel': ch, 'note': note})
+                    except Exception:
+                        continue
+
+        # DEBUG: 打印前若干条映射结果（note -> key），用于快速核对映射/移调是否生效
+        if self.debug:
             try:
-                st = float(n.get('start_time', 0.0))
-                et = float(n.get('end_time', st))
-                note = int(n.get('note', 0))
-                ch = int(n.get('channel', 0))
-                key = strategy.map_note(note, key_mapping or self._get_default_key_mapping(), self.options)
-                if not key:
-                    continue
-                events.append({'start_time': st, 'type': 'note_on', 'key': key, 'velocity': int(n.get('velocity', 64)), 'channel': ch, 'note': note})
-                events.append({'start_time': max(et, st), 'type': 'note_off', 'key': key, 'velocity': 0, 'channel': ch, 'note': note})
+                previews = []
+                for ev in events:
+                    if ev.get('type') != 'note_on':
+                        continue
+                    previews.append(f"note={ev.get('note')} -> key={ev.get('key')}")
+                    if len(previews) >= 10:
+                        break
+                if previews:
+                    self.logger.log("[DEBUG] 映射预览: " + ", ".join(previews), "DEBUG")
             except Exception:
-                continue
+                pass
 
         # 可选：和弦伴奏（不更改原事件，仅附加映射后的伴奏键位事件）
         # 当启用“用和弦键替代主音键”时，不再追加伴奏事件，而是对主音事件进行替换
+        with pipeline.stage('chord'):
+            events = self._apply_chord_stage(events, key_mapping, strategy_name)
+
+        # 去重 → 多键窗口规范化 → 同键延长音并集 + tap → 再去重/规范化，一次排序完成并直接编译
+        timeline = pipeline.run(events)
+        self.last_pipeline_stats = dict(pipeline.stage_ms)
+        if self.debug:
+            self.logger.log(f"[DEBUG] 后处理阶段耗时: {pipeline.summary()}", "DEBUG")
+        if timeline is None:
+            self.logger.log("展开后的回放事件为空", "ERROR")
+        return timeline
+
+    def _apply_chord_stage(self, events: List[Dict[str, Any]], key_mapping: Dict[str, str],
+                           strategy_name: Optional[str]) -> List[Dict[str, Any]]:
+        """和弦处理：chord_replace_melody 时替换主音键，否则按 enable_chord_accomp 追加伴奏事件"""
         if events and bool(self.options.get('chord_replace_melody', False)):
             try:
                 events = self._apply_chord_key_replacement(events, key_mapping or self._get_default_key_mapping(), strategy_name)
@@ -269,98 +403,53 @@ class AutoPlayer:
             except Exception:
                 pass
 
-        # 去重：同刻同键仅保留一个
-        try:
-            events = self._dedup_same_time_same_key(events)
-        except Exception:
-            pass
-        # 多键窗口规范化（琶音/合并/原样）
-        try:
-            events = self._normalize_multi_key_clusters(events)
-        except Exception:
-            pass
-        # 预处理：同键延长音并集 + tap（release->press，gap 可为 0ms）
-        try:
-            events = self._apply_union_and_tap(events)
-        except Exception:
-            pass
-        # 对同一时间戳，保证 note_off 先于 note_on
-        try:
-            events.sort(key=lambda x: (x['start_time'], 0 if x.get('type') == 'note_off' else 1))
-        except Exception:
-            pass
+        return events
 
-        if not events:
-            self.logger.log("展开后的回放事件为空", "ERROR")
+    def start_auto_play_midi_events_mixed(self, notes: List[Dict[str, Any]], tempo: float = 1.0,
+                                          role_keymaps: Dict[str, Dict[str, str]] | None = None,
+                                          strategy_name: Optional[str] = None,
+                                          start_at: float = 0.0) -> bool:
+        """开始自动演奏（按事件角色选择不同键位映射）。
+        期望 notes: 包含 start_time/end_time/note/channel，可选字段 role（如 drums/bass/melody），也可已有 instrument_name/program 等。
+        role_keymaps: 形如 { 'drums': DRUMS_KEYMAP, 'bass': BASS_KEYMAP, 'melody': DEFAULT }。
+        若某事件缺少 role，则使用 'melody' 的映射，若仍缺失则使用默认映射。
+        """
+        if self.is_playing:
+            self.logger.log("自动演奏已在进行中", "WARNING")
+            return False
+        timeline = self.build_timeline_midi_events_mixed(notes, role_keymaps, strategy_name)
+        if timeline is None:
             return False
-
-        # DEBUG: 打印前若干条映射结果（note -> key），用于快速核对映射/移调是否生效
-        if self.debug:
-            try:
-                previews = []
-                seen = 0
-                for ev in events:
-                    if ev.get('type') != 'note_on':
-                        continue
-                    previews.append(f"note={ev.get('note')} -> key={ev.get('key')}")
-                    seen += 1
-                    if seen >= 10:
-                        break
-                if previews:
-                    self.logger.log("[DEBUG] 映射预览: " + ", ".join(previews), "DEBUG")
-            except Exception:
-                pass
-
-        # 去重 + 多键窗口规范化 + 对同一时间戳，保证 note_off 先于 note_on
-        try:
-            events = self._dedup_same_time_same_key(events)
-        except Exception:
-            pass
-        try:
-            events = self._normalize_multi_key_clusters(events)
-        except Exception:
-            pass
-        try:
-            events.sort(key=lambda x: (x['start_time'], 0 if x.get('type') == 'note_off' else 1))
-        except Exception:
-            pass
 
         # 设置状态并启动线程
         self.current_tempo = tempo
         self.is_playing = True
         self.is_paused = False
-        # 标记使用pretty_midi事件，用于正确的tempo处理
+        # 标记使用 pretty_midi 事件，避免二次 tempo 处理
         self._using_pretty_midi_events = True
-        self.play_thread = threading.Thread(target=self._auto_play_mapped_events_thread, args=(events,))
-        self.play_thread.start()
-        
-        # 启动回调（需可调用）
+        self.current_timeline = timeline
+        self._launch_timeline(start_at)
+
+        # 启动回调与日志
         cb = self.playback_callbacks.get('on_start')
         if callable(cb):
             cb()
         try:
             src = 'NTP' if getattr(self._clock_provider, 'last_sync_ok', False) else 'Local'
-            self.logger.log(f"开始自动演奏（外部解析事件） clock={src}", "INFO")
+            self.logger.log(f"开始自动演奏（外部解析事件-角色混合映射） clock={src}", "INFO")
         except Exception:
-            self.logger.log("开始自动演奏（外部解析事件）", "INFO")
+            self.logger.log("开始自动演奏（外部解析事件-角色混合映射）", "INFO")
         if self.debug:
-            self.logger.log(f"[DEBUG] 外部事件数: {len(events)}, 速度: {self.current_tempo}, pretty_midi模式", "DEBUG")
+            self.logger.log(f"[DEBUG] 时间轴动作数: {len(timeline)}, 速度: {self.current_tempo}, pretty_midi模式(mixed)", "DEBUG")
         return True
 
-    def start_auto_play_midi_events_mixed(self, notes: List[Dict[str, Any]], tempo: float = 1.0,
-                                          role_keymaps: Dict[str, Dict[str, str]] | None = None,
-                                          strategy_name: Optional[str] = None) -> bool:
-        """开始自动演奏（按事件角色选择不同键位映射）。
-        期望 notes: 包含 start_time/end_time/note/channel，可选字段 role（如 drums/bass/melody），也可已有 instrument_name/program 等。
-        role_keymaps: 形如 { 'drums': DRUMS_KEYMAP, 'bass': BASS_KEYMAP, 'melody': DEFAULT }。
-        若某事件缺少 role，则使用 'melody' 的映射，若仍缺失则使用默认映射。
-        """
-        if self.is_playing:
-            self.logger.log("自动演奏已在进行中", "WARNING")
-            return False
+    def build_timeline_midi_events_mixed(self, notes: List[Dict[str, Any]],
+                                         role_keymaps: Dict[str, Dict[str, str]] | None = None,
+                                         strategy_name: Optional[str] = None) -> Optional[PlaybackTimeline]:
+        """按事件角色选择键位映射并预处理，编译为按键时间轴（不启动播放），失败返回 None"""
         if not notes:
             self.logger.log("外部解析的MIDI事件为空", "ERROR")
-            return False
+            return None
 
         # 默认映射兜底
         default_map = None
@@ -370,94 +459,156 @@ class AutoPlayer:
             default_map = None
         role_keymaps = role_keymaps or {}
 
+        pipeline = KeyEventPipeline(self.options)
         # 展开为按键事件
         events: List[Dict[str, Any]] = []
         strategy = get_strategy(strategy_name or "strategy_21key")
-        for n in notes:
-            try:
-                st = float(n.get('start_time', 0.0))
-                et = float(n.get('end_time', st))
-                note = int(n.get('note', 0))
-                ch = int(n.get('channel', 0))
-                role = str(n.get('role', 'melody') or 'melody')
-                km = role_keymaps.get(role) or role_keymaps.get('melody') or default_map
-                if not km:
-                    km = self._get_default_key_mapping()
-                key = strategy.map_note(note, km, self.options)
-                if not key:
+        role_luts: Dict[str, Tuple[Optional[str], ...]] = {}  # 每个角色一张查找表
+        with pipeline.stage('map'):
+            for n in notes:
+                try:
+                    st = float(n.get('start_time', 0.0))
+                    et = float(n.get('end_time', st))
+                    note = int(n.get('note', 0))
+                    ch = int(n.get('channel', 0))
+                    role = str(n.get('role', 'melody') or 'melody')
+                    lut = role_luts.get(role)
+                    if lut is None:
+                        km = role_keymaps.get(role) or role_keymaps.get('melody') or default_map
+                        if not km:
+                            km = self._get_default_key_mapping()
+                        lut = role_luts[role] = strategy.lut(km, self.options)
+                    key = lut[note_index(note)]
+                    if not key:
+                        continue
+                    events.append({'start_time': st, 'type': 'note_on', 'key': key, 'velocity': int(n.get('velocity', 64)), 'channel': ch, 'note': note})
+                    events.append({'start_time': max(et, st), 'type': 'note_off', 'key': key, 'velocity': 0, 'channel': ch, 'note': note})
+                except Exception:
                     continue
-                events.append({'start_time': st, 'type': 'note_on', 'key': key, 'velocity': int(n.get('velocity', 64)), 'channel': ch, 'note': note})
-                events.append({'start_time': max(et, st), 'type': 'note_off', 'key': key, 'velocity': 0, 'channel': ch, 'note': note})
-            except Exception:
-                continue
 
         # 可选：和弦伴奏（对合并后的事件）
-        if events and bool(self.options.get('chord_replace_melody', False)):
-            try:
-                km = role_keymaps.get('melody') or default_map or self._get_default_key_mapping()
-                events = self._apply_chord_key_replacement(events, km, strategy_name)
-                if self.debug:
-                    self.logger.log(f"[DEBUG] 已替换为和弦键事件（数量 {len(events)}）", "DEBUG")
-            except Exception:
-                pass
-        elif events and bool(self.options.get('enable_chord_accomp', False)):
-            try:
-                km = role_keymaps.get('melody') or default_map or self._get_default_key_mapping()
-                acc = self._generate_chord_accompaniment(events, km, strategy_name)
-                if acc:
-                    events.extend(acc)
-                    if self.debug:
-                        self.logger.log(f"[DEBUG] 伴奏追加事件: {len(acc)}", "DEBUG")
-            except Exception:
-                pass
+        with pipeline.stage('chord'):
+            km = role_keymaps.get('melody') or default_map or self._get_default_key_mapping()
+            events = self._apply_chord_stage(events, km, strategy_name)
 
-        # 去重：同刻同键仅保留一个
-        try:
-            events = self._dedup_same_time_same_key(events)
-        except Exception:
-            pass
-        # 多键窗口规范化（琶音/合并/原样）
-        try:
-            events = self._normalize_multi_key_clusters(events)
-        except Exception:
-            pass
-        # 预处理：同键延长音并集 + tap
-        try:
-            events = self._apply_union_and_tap(events)
-        except Exception:
-            pass
-        try:
-            events.sort(key=lambda x: (x['start_time'], 0 if x.get('type') == 'note_off' else 1))
-        except Exception:
-            pass
-        # 启动播放（与 start_auto_play_midi_events 结尾保持一致逻辑）
-        if not events:
+        # 去重 → 多键窗口规范化 → 同键延长音并集 + tap（本链路不做第二轮去重/规范化）
+        timeline = pipeline.run(events, renormalize=False)
+        self.last_pipeline_stats = dict(pipeline.stage_ms)
+        if self.debug:
+            self.logger.log(f"[DEBUG] 后处理阶段耗时: {pipeline.summary()}", "DEBUG")
+        if timeline is None:
             self.logger.log("展开后的回放事件为空", "ERROR")
+        return timeline
+
+    def start_auto_play_timeline(self, timeline: PlaybackTimeline, tempo: float = 1.0,
+                                 start_at: float = 0.0, at_perf: Optional[float] = None,
+                                 sync_unix: Optional[float] = None) -> bool:
+        """直接播放已编译的按键时间轴（不再经过事件展开与预处理）
+        at_perf: 曲目 start_at 对应的 perf_counter 时刻，None 表示立即开始（由 arm 使用）。
+        sync_unix: 约定开始的时钟提供者时刻；开启 drift_correction 时作为漂移校正的参考点。
+        """
+        if self.is_playing:
+            self.logger.log("自动演奏已在进行中", "WARNING")
+            return False
+        if timeline is None or len(timeline) == 0:
+            self.logger.log("时间轴为空", "ERROR")
             return False
-
-        # 设置状态并启动线程
         self.current_tempo = tempo
         self.is_playing = True
         self.is_paused = False
-        # 标记使用 pretty_midi 事件，避免二次 tempo 处理
-        self._using_pretty_midi_events = True
-        self.play_thread = threading.Thread(target=self._auto_play_mapped_events_thread, args=(events,))
-        self.play_thread.daemon = True
-        self.play_thread.start()
+        self.current_timeline = timeline
+        self._launch_timeline(start_at, at_perf, sync_unix)
 
-        # 启动回调与日志
         cb = self.playback_callbacks.get('on_start')
         if callable(cb):
             cb()
-        try:
-            src = 'NTP' if getattr(self._clock_provider, 'last_sync_ok', False) else 'Local'
-            self.logger.log(f"开始自动演奏（外部解析事件-角色混合映射） clock={src}", "INFO")
-        except Exception:
-            self.logger.log("开始自动演奏（外部解析事件-角色混合映射）", "INFO")
-        if self.debug:
-            self.logger.log(f"[DEBUG] 外部事件数: {len(events)}, 速度: {self.current_tempo}, pretty_midi模式(mixed)", "DEBUG")
+        self.logger.log("开始自动演奏（编译时间轴）", "INFO")
         return True
 
+    def _clock_now_unix(self) -> Tuple[float, float]:
+        """读取时钟提供者的 Unix 时间，返回 (unix, 对应的 perf_counter)。
+        网络时钟已同步时使用其 now()，否则回退系统时间（与 NetworkClockProvider.schedule_at 一致）；
+        取前后两次 perf_counter 的中点以减小读数误差。
+        """
+        from time import perf_counter
+        prov = self._clock_provider
+        use_provider = prov is not None and bool(getattr(prov, 'last_sync_ok', False))
+        p0 = perf_counter()
+        unix = float(prov.now()) if use_provider else time.time()
+        p1 = perf_counter()
+        return unix, (p0 + p1) / 2.0
+
+    def arm(self, timeline: PlaybackTimeline, start_at_unix: float, tempo: float = 1.0,
+            start_at: float = 0.0) -> bool:
+        """预约在绝对时刻 start_at_unix（时钟提供者的 Unix 秒）开始播放已编译的时间轴。
+        校准、按键预解析等准备工作立即完成，播放线程停在首片之前，按时钟换算的 perf_counter 时刻放行；
+        若预约时刻已过，则从当前应处的曲目位置加入。
+        """
+        unix_now, perf_now = self._clock_now_unix()
+        at_perf = perf_now + (float(start_at_unix) - unix_now)
+        if not self.start_auto_play_timeline(timeline, tempo=tempo, start_at=start_at, at_perf=at_perf,
+                                             sync_unix=float(start_at_unix)):
+            return False
+        lead = float(start_at_unix) - unix_now
+        if lead < 0:
+            self.logger.log(f"预约时刻已过 {-lead * 1000.0:.1f}ms，将从当前位置加入", "WARNING")
+        else:
+            self.logger.log(f"自动演奏已就绪，{lead:.3f}s 后开始 (at={float(start_at_unix):.3f})", "INFO")
+        return True
+
+    def _launch_timeline(self, start_at: float = 0.0, at_perf: Optional[float] = None,
+                         sync_unix: Optional[float] = None) -> None:
+        """启动 current_timeline 的播放：默认本进程线程；isolated_playback 时交给子进程，失败回退线程
+        （子进程不持有时钟提供者，漂移校正仅在线程模式下进行）
+        """
+        if bool(self.options.get('isolated_playback', False)):
+            try:
+                iso = IsolatedPlayback(lambda kind, payload: self._on_isolated_message(kind, payload, iso))
+                # 先登记为当前句柄：监听线程随 start() 启动，可能立即发来 'error'/'done'
+                self._isolated = iso
+                iso.start(self.current_timeline, tempo=self.current_tempo, start_at=start_at,
+                          at_perf=at_perf, options=self.options, debug=self.debug)
+                self.play_thread = None
+                return
+            except Exception as e:
+                self._isolated = None
+                self.logger.log(f"隔离播放进程启动失败，改为线程播放: {str(e)}", "WARNING")
+        self._transport = PlaybackTransport()
+        self._progress = ProgressPublisher()
+        self.play_thread = threading.Thread(target=self._auto_play_mapped_events_thread, args=(self.current_timeline, start_at, at_perf, sync_unix))
+        self.play_thread.daemon = True
+        self.play_thread.start()
+
+    def _on_isolated_message(self, kind: str, payload: Any, source: Optional[IsolatedPlayback] = None) -> None:
+        """处理隔离播放子进程发回的进度/完成/错误/时序报告（在监听线程中调用）。
+        stop 不等待子进程退出：已停止的旧子进程（source 不是当前句柄）在新一次播放开始后发来的消息直接忽略，
+        未开始新播放时仍接收其时序报告。
+        """
+        if source is not None and source is not self._isolated and (self._isolated is not None or self.is_playing):
+            return
+        if kind == 'progress':
+            cb = self.playback_callbacks.get('on_progress')
+            if callable(cb):
+                cb(payload)
+        elif kind == 'complete':
+            if self.is_playing:
+                cb = self.playback_callbacks.get('on_complete')
+                if callable(cb):
+                    cb()
+                self.logger.log("外部事件回放完成（隔离进程）", "SUCCESS")
+        elif kind == 'error':
+            self._handle_error(str(payload))
+        elif kind == 'report':
+            _, rows = payload
+            self.telemetry.reset()
+            for song_t, sched, actual, _ in rows:
+                self.telemetry.record(song_t, sched, actual)
+            self._finish_timing_report()
+        elif kind == 'done':
+            self._isolated = None
+            self.is_playing = False
+            self.is_paused = False
+
     def stop_auto_play(self):
         """停止自动演奏"""
         if not self.is_playing:
@@ -465,6 +616,10 @@ class AutoPlayer:
         
         self.is_playing = False
         self.is_paused = False
+        self._transport.stop()
+        iso, self._isolated = self._isolated, None
+        if iso is not None:
+            iso.stop()
         
         # 清除pretty_midi标记
         self._using_pretty_midi_events = False
@@ -475,7 +630,7 @@ class AutoPlayer:
         
         # 释放所有按键
         try:
-            key_sender = KeySender()
+            key_sender = KeySender(self.get_key_backend())
             key_sender.release_all()
         except Exception as e:
             self.logger.log(f"释放按键失败: {str(e)}", "WARNING")
@@ -492,6 +647,9 @@ class AutoPlayer:
             return
         
         self.is_paused = True
+        self._transport.pause()
+        if self._isolated is not None:
+            self._isolated.send('pause')
         
         # 调用暂停回调
         if self.playback_callbacks['on_pause']:
@@ -505,6 +663,9 @@ class AutoPlayer:
             return
         
         self.is_paused = False
+        self._transport.resume()
+        if self._isolated is not None:
+            self._isolated.send('resume')
         
         # 调用恢复回调
         if self.playback_callbacks['on_resume']:
@@ -512,203 +673,196 @@ class AutoPlayer:
         
         self.logger.log("自动演奏已恢复", "INFO")
     
-    def _auto_play_thread(self):
-        """自动演奏线程 - LRCp模式"""
-        try:
-            if not self.current_events:
-                self._handle_error("没有可演奏的事件")
-                return
-            
-            # 开始自动演奏
-            start_time = time.time()
-            
-            # 创建按键发送器
-            key_sender = KeySender()
-            
-            # 构造动作表 (time, type, keys)
-            actions: List[tuple] = []
-            for event in self.current_events:
-                actions.append((event.start, 'press', event.keys))
-                actions.append((event.end, 'release', event.keys))
-            
-            # 按时间排序
-            actions.sort(key=lambda x: x[0])
-            
-            # 开始执行（合并同一时间戳批处理）
-            idx = 0
-            jitter = 0.003
-            
-            while idx < len(actions) and self.is_playing:
-                # 若处于暂停，等待恢复
-                while self.is_paused and self.is_playing:
-                    time.sleep(0.05)
-                
-                # 目标时间（按速度缩放）
-                group_time = actions[idx][0] / max(0.01, self.current_tempo)
-                
-                # 等待到该批次时间点
-                while True:
-                    # 暂停时让等待循环让出CPU
-                    if self.is_paused:
-                        time.sleep(0.05)
-                        continue
-                    
-                    now = time.time()
-                    target = start_time + group_time
-                    wait = target - now
-                    
-                    if wait > 0:
-                        time.sleep(min(wait, 0.001))
-                    else:
-                        break
-                
-                # 收集同一时间片的所有动作
-                j = idx
-                press_keys: List[str] = []
-                release_keys: List[str] = []
-                
-                while (j < len(actions) and 
-                       abs(actions[j][0] / max(0.01, self.current_tempo) - group_time) <= jitter):
-                    _, typ, keys = actions[j]
-                    if typ == 'release':
-                        release_keys.extend(keys)
-                    else:
-                        press_keys.extend(keys)
-                    j += 1
-                
-                # 先释放再按下，减少重叠干扰
-                if release_keys:
-                    key_sender.release(release_keys)
-                if press_keys:
-                    key_sender.press(press_keys)
-                
-                # 更新进度
-                if self.playback_callbacks['on_progress']:
-                    progress = min(100, (idx / len(actions)) * 100)
-                    self.playback_callbacks['on_progress'](progress)
-                
-                idx = j
-            
-            # 释放所有按键
-            key_sender.release_all()
-            
-            # 演奏完成
-            if self.is_playing:  # 只有在正常完成时才调用完成回调
-                if self.playback_callbacks['on_complete']:
-                    self.playback_callbacks['on_complete']()
-                self.logger.log("自动演奏完成", "SUCCESS")
-            
-        except Exception as e:
-            error_msg = f"自动演奏失败: {str(e)}"
-            self._handle_error(error_msg)
-        finally:
-            self.is_playing = False
+    def set_tempo_live(self, factor: float) -> bool:
+        """播放中实时调整倍速（>1 更快）：在当前位置重新锚定时钟，不重建事件、位置不跳变。
+        未在播放时仅记录倍速，下次播放生效。
+        """
+        factor = max(0.01, float(factor))
+        self.current_tempo = factor
+        if not self.is_playing:
+            return False
+        self._transport.set_tempo(factor)
+        if self._isolated is not None:
+            self._isolated.send('tempo', factor)
+        if self.debug:
+            self.logger.log(f"[DEBUG] 实时倍速: {factor:.3f}", "DEBUG")
+        return True
 
-    def _auto_play_mapped_events_thread(self, events: List[Dict[str, Any]]):
-        """自动演奏线程 - 直接使用已映射的按键事件
-        事件结构需包含: 'start_time', 'type' in ('note_on','note_off'), 'key', 可选 'note','channel'
+    def seek(self, seconds: float) -> bool:
+        """播放中跳转到曲目第 seconds 秒。
+        在时间轴上二分定位，补按/松开该时刻应保持的键并重新锚定时钟，不重新解析。
         """
+        if not self.is_playing or self.current_timeline is None:
+            return False
+        target = max(0.0, min(float(seconds), self.current_timeline.duration))
+        if self._isolated is not None:
+            if not self._isolated.send('seek', target):
+                return False
+        elif not self._transport.seek(target):
+            return False
+        self.logger.log(f"跳转到位置: {target:.2f}秒", "INFO")
+        return True
+    
+    def _auto_play_mapped_events_thread(self, timeline: PlaybackTimeline, start_at: float = 0.0,
+                                        at_perf: Optional[float] = None, sync_unix: Optional[float] = None):
+        """自动演奏线程 - 直接使用编译后的按键时间轴
+        时间轴由已映射事件（'start_time', 'type' in ('note_on','note_off'), 'key'）或 LRCp 乐谱事件一次性编译而成，
+        循环内只做数组下标运算。start_at>0 或播放中 seek 时，二分定位并补按应保持的键。
+        at_perf: 曲目 start_at 对应的 perf_counter 时刻（arm 预约开始）；None 表示立即开始。
+        sync_unix: 约定开始的时钟时刻；开启 drift_correction 时按网络时钟持续校正漂移。
+        本线程只使用启动时的 transport/progress；stop 后若已开始新一次播放（self._transport 已更换），
+        本线程尽快退出且不再改动播放器状态。
+        """
+        transport = self._transport
+        progress = self._progress
+        is_current = lambda: self._transport is transport
         try:
-            if not events:
+            n = len(timeline)
+            if n == 0:
                 self._handle_error("没有可演奏的事件")
                 return
 
-            # 排序并计算总时长（同一时间戳优先释放再按下，避免抑制快速重按）
-            try:
-                events.sort(key=lambda x: (x['start_time'], 0 if x.get('type') == 'note_off' else 1))
-            except Exception:
-                events.sort(key=lambda x: x['start_time'])
-            total_time = events[-1]['start_time'] if events else 0.0
+            times = timeline.times
+            actions = timeline.actions
+            key_ids = timeline.key_ids
+            key_names = timeline.key_names
+            total_time = timeline.duration
 
             if self.debug:
-                self.logger.log(f"[DEBUG] 开始播放 {len(events)} 个事件，速度倍率: {self.current_tempo}", "DEBUG")
-                if events:
-                    first_time = events[0]['start_time']
-                    last_time = events[-1]['start_time'] if len(events) > 1 else first_time
-                    self.logger.log(f"[DEBUG] 事件时间范围: {first_time:.3f}s - {last_time:.3f}s", "DEBUG")
+                self.logger.log(f"[DEBUG] 开始播放 {n} 个事件（{timeline.key_count} 个键），速度倍率: {self.current_tempo}", "DEBUG")
+                self.logger.log(f"[DEBUG] 事件时间范围: {times[0]:.3f}s - {times[-1]:.3f}s", "DEBUG")
 
             from time import perf_counter
-            start_perf = perf_counter()
-            key_sender = KeySender()
+            scheduler = self.scheduler if bool(self.options.get('adaptive_wait', True)) else None
+            if scheduler is not None and not scheduler.calibrated:
+                params = scheduler.calibrate()
+                if self.debug:
+                    self.logger.log(f"[DEBUG] sleep 超时校准: {params}", "DEBUG")
+            should_continue = lambda: transport.playing and not transport.paused
+            recorder = self.telemetry
+            recorder.reset()
+            self.last_timing_report = None
+            key_sender = KeySender(self.get_key_backend())
+            self._prepare_key_output(key_sender, key_names)
+            start_at = max(0.0, min(float(start_at or 0.0), total_time))
+            transport.start(start_at, self.current_tempo, at_perf=at_perf)
+            if self.is_paused:
+                transport.pause()
+            drift = self._make_drift_corrector(transport, sync_unix, start_at)
+            if at_perf is not None:
+                # 预约时刻已过（迟到加入合奏）：从当前应处的位置开始，而不是补发之前的事件
+                start_at = min(total_time, max(start_at, transport.position()))
 
             send_ahead = float(self.options.get('send_ahead_ms', 2)) / 1000.0
             spin_threshold = max(0.0, float(self.options.get('spin_threshold_ms', 1)) / 1000.0)
             post_action_sleep = max(0.0, float(self.options.get('post_action_sleep_ms', 0)) / 1000.0)
 
-            # 引用计数，避免重叠音过早释放
-            active_counts: Dict[str, int] = {}
-
-            idx = 0
-            while idx < len(events) and self.is_playing:
-                # 暂停处理
-                while self.is_paused and self.is_playing:
-                    time.sleep(0.01)
-
-                ev = events[idx]
-                # 对于pretty_midi解析的事件，start_time已经是考虑了原始MIDI tempo的准确秒数
-                # 只需要应用用户的倍速设置：tempo > 1.0播放更快，tempo < 1.0播放更慢
-                if hasattr(self, '_using_pretty_midi_events') and self._using_pretty_midi_events:
-                    # pretty_midi事件：时间已经是准确的秒数，严格按时间播放
-                    # 当tempo=1.0时，直接使用原始时间；当tempo!=1.0时，按倍速调整
-                    group_time = ev['start_time'] / max(0.01, self.current_tempo)
-                    if self.debug and idx < 3:
-                        self.logger.log(f"[DEBUG] pretty_midi事件 {idx}: 原始时间={ev['start_time']:.4f}s, 调整后={group_time:.4f}s, tempo={self.current_tempo}", "DEBUG")
+            # 预分组时间片：窗口内的动作合并为一次“先释放后按下”的批量发送
+            eps = max(0.0, float(self.options.get('epsilon_ms', 6)) / 1000.0)
+            slice_starts = timeline.build_slices(eps)
+            slice_count = len(slice_starts) - 1
+
+            # 引用计数（按键号索引），避免重叠音过早释放
+            active_counts = [0] * timeline.key_count
+
+            def reposition(position: float) -> int:
+                """定位到曲目时间 position 所在时间片，按目标时刻的保持状态补按/松开，返回片序号"""
+                s_idx = timeline.slice_at(slice_starts, timeline.index_at(position))
+                held = timeline.held_counts(slice_starts[s_idx])
+                rel = [key_names[k] for k, c in enumerate(active_counts) if c > 0 and held[k] == 0]
+                prs = [key_names[k] for k, c in enumerate(held) if c > 0 and active_counts[k] == 0]
+                active_counts[:] = held
+                if rel or prs:
+                    key_sender.send(rel, prs)
+                return s_idx
+
+            seek_serial = transport.seek_serial
+            si = reposition(start_at) if start_at > 0 else 0
+            self._start_progress(transport, progress, total_time)
+            while si < slice_count and self.is_playing and is_current():
+                # 暂停处理：阻塞在 Condition 上，恢复/停止时立即唤醒
+                if not transport.wait_if_paused():
+                    break
+                # 跳转：时钟已由 transport 重新锚定，这里只重定位下标与按键状态
+                if transport.seek_serial != seek_serial:
+                    seek_serial = transport.seek_serial
+                    si = reposition(transport.position())
+                    continue
+
+                if drift is not None:
+                    drift.check(perf_counter())
+
+                lo = slice_starts[si]
+                hi = slice_starts[si + 1]
+                # 时间轴中的时间为曲目秒；传输锚点已包含用户倍速与暂停平移
+                target = transport.song_to_perf(times[lo]) - send_ahead
+
+                # 等待到目标时间（考虑提前量）；暂停/停止会打断睡眠，本片不发送并重新判定
+                version = transport.version
+                if scheduler is not None:
+                    scheduler.wait_until(target, should_continue, sleep=transport.sleep)
                 else:
-                    # 传统事件：使用原有的tempo处理逻辑
-                    group_time = ev['start_time'] / max(0.01, self.current_tempo)
-
-                # 分级等待到目标时间（考虑提前量）
-                target = max(0.0, group_time - send_ahead)
-                while self.is_playing and not self.is_paused:
-                    now = perf_counter() - start_perf
-                    remain = target - now
-                    
-                    if remain <= 0:
-                        break
-                    if remain > 0.02:
-                        time.sleep(remain - 0.01)
-                    elif remain > spin_threshold:
-                        time.sleep(0.0005)
-                    else:
-                        # 忙等阶段
-                        while (perf_counter() - start_perf) < target and self.is_playing and not self.is_paused:
-                            pass
-                        break
+                    # 固定阈值分级等待
+                    while transport.version == version:
+                        remain = target - perf_counter()
+                        if remain <= 0:
+                            break
+                        if remain > 0.02:
+                            transport.sleep(remain - 0.01)
+                        elif remain > spin_threshold:
+                            transport.sleep(0.0005)
+                        else:
+                            # 忙等阶段
+                            while perf_counter() < target and transport.version == version:
+                                pass
+                            break
+                if transport.version != version:
+                    continue
 
-                # 执行单个事件（严格按顺序）
-                if ev['type'] == 'note_off':
-                    k = ev['key']
-                    c = active_counts.get(k, 0)
-                    if c > 0:
-                        c -= 1
-                        active_counts[k] = c
+                # 按顺序结算片内引用计数，只收集真正需要发出的按键
+                release_keys: List[str] = []
+                press_keys: List[str] = []
+                for idx in range(lo, hi):
+                    kid = key_ids[idx]
+                    c = active_counts[kid]
+                    if actions[idx] == ACTION_RELEASE:
+                        if c > 0:
+                            c -= 1
+                            active_counts[kid] = c
+                            if c == 0:
+                                release_keys.append(key_names[kid])
+                    else:
                         if c == 0:
-                            key_sender.release([k])
-                            if post_action_sleep > 0:
-                                time.sleep(post_action_sleep)
-                else:  # note_on
-                    k = ev['key']
-                    c = active_counts.get(k, 0)
-                    if c == 0:
-                        key_sender.press([k])
-                        if post_action_sleep > 0:
-                            time.sleep(post_action_sleep)
-                    active_counts[k] = c + 1
-
-                # 进度：按时间推进
-                if self.playback_callbacks['on_progress'] and total_time > 0:
-                    now = perf_counter() - start_perf
-                    progress = max(0.0, min(100.0, (now / (total_time / max(0.01, self.current_tempo))) * 100))
-                    try:
-                        self.playback_callbacks['on_progress'](progress)
-                    except Exception:
-                        pass
+                            press_keys.append(key_names[kid])
+                        active_counts[kid] = c + 1
+
+                # 先释放再按下，整片一次发送
+                if release_keys or press_keys:
+                    recorder.record(times[lo], target, perf_counter())
+                    key_sender.send(release_keys, press_keys)
+                if post_action_sleep > 0 and (release_keys or press_keys):
+                    time.sleep(post_action_sleep)
 
-                idx += 1
+                si += 1
 
-            remaining_pressed = [k for k, c in active_counts.items() if c > 0]
+            remaining_pressed = [key_names[kid] for kid, c in enumerate(active_counts) if c > 0]
             if remaining_pressed:
                 key_sender.release(remaining_pressed)
+            failures = getattr(key_sender.backend, 'failures', 0)
+            if failures:
+                self.logger.log(f"本曲按键发送失败 {failures} 次", "WARNING")
+            if not is_current():
+                return
+            if self.debug and scheduler is not None:
+                self.logger.log(f"[DEBUG] 调度器参数: {scheduler.get_params()}", "DEBUG")
+            self._finish_timing_report()
+            if drift is not None:
+                ds = drift.summary()
+                self.logger.log(
+                    f"[TIMING] 漂移校正: 检查 {ds['checks']} 次, 最大偏差 {ds['max_error_ms']:.2f}ms, 末次偏差 {ds['last_error_ms']:.2f}ms",
+                    "INFO",
+                )
+            progress.stop(final=100.0 if self.is_playing else None)
 
             if self.is_playing:
                 if self.playback_callbacks['on_complete']:
@@ -719,7 +873,52 @@ class AutoPlayer:
             error_msg = f"MIDI自动演奏失败: {str(e)}"
             self._handle_error(error_msg)
         finally:
-            self.is_playing = False
+            transport.stop()
+            progress.stop(flush=False)
+            if is_current():
+                self.is_playing = False
+
+    def _make_drift_corrector(self, transport: PlaybackTransport, sync_unix: Optional[float],
+                              song_at: float) -> Optional[DriftCorrector]:
+        """drift_correction 开启且为预约开始、网络时钟已同步时，创建以约定时刻为参考点的漂移校正器"""
+        if sync_unix is None or not bool(self.options.get('drift_correction', False)):
+            return None
+        if not getattr(self._clock_provider, 'last_sync_ok', False):
+            self.logger.log("网络时钟未同步，本次不进行漂移校正", "WARNING")
+            return None
+        try:
+            drift = DriftCorrector(
+                transport, lambda: self._clock_now_unix()[0],
+                interval_ms=float(self.options.get('drift_check_interval_ms', 250)),
+                max_slew=float(self.options.get('drift_max_slew', 0.005)),
+                deadband_ms=float(self.options.get('drift_deadband_ms', 1)),
+            )
+        except Exception:
+            return None
+        drift.begin(sync_unix, song_at)
+        return drift
+
+    def _prepare_key_output(self, key_sender: KeySender, keys) -> None:
+        """播放前预解析全部内置映射键与本曲用键；本曲存在无法输出的键时提前报告"""
+        used = set(keys)
+        unmapped = key_sender.prepare(all_mapping_keys() + sorted(used))
+        missing = [k for k in unmapped if k in used]
+        if missing:
+            self.logger.log(f"以下按键无法解析为扫描码，播放中将被跳过: {', '.join(missing)}", "ERROR")
+        elif unmapped and self.debug:
+            self.logger.log(f"[DEBUG] 映射中无法解析的按键（本曲未使用）: {', '.join(unmapped)}", "DEBUG")
+
+    def _start_progress(self, transport: PlaybackTransport, progress: ProgressPublisher, total_time: float) -> None:
+        """启动限频进度发布：按 progress_rate_hz 采样传输位置，换算为 0~100"""
+        total = float(total_time)
+        if total <= 0:
+            return
+        try:
+            rate = float(self.options.get('progress_rate_hz', 20))
+        except Exception:
+            rate = 20.0
+        progress.start(lambda: transport.position() / total * 100.0,
+                             self.playback_callbacks.get('on_progress'), rate_hz=rate)
 
     def _parse_midi_file(self, midi_file: str, key_mapping: Dict[str, str] = None, strategy_name: Optional[str] = None) -> List[Dict[str, Any]]:
         """解析MIDI文件为演奏事件（策略映射，禁用和弦事件）"""
@@ -745,16 +944,15 @@ class AutoPlayer:
             if not key_mapping:
                 key_mapping = self._get_default_key_mapping()
             
-            # 解析策略
+            # 解析策略（查找表按映射缓存）
             strategy = get_strategy(strategy_name or "strategy_21key")
+            lut = strategy.lut(key_mapping)
 
             # 使用mido原生时间转换收集所有音符事件
             all_messages = []
             
             # 采用之前版本2的有效MIDI解析方案
-            default_tempo = 500000  # 默认120 BPM (微秒/拍)
             ticks_per_beat = midi.ticks_per_beat
-            current_tempo = default_tempo
             
             # 收集所有轨道消息及其轨内时间
             all_messages = []
@@ -772,41 +970,12 @@ class AutoPlayer:
             # 按时间排序所有消息
             all_messages.sort(key=lambda x: x['track_time'])
 
-            # 构建全局 tempo 变化表 (tick -> tempo)
-            tempo_changes: List[Dict[str, Any]] = []
-            # 保证从 tick 0 开始有一个 tempo
-            tempo_changes.append({'tick': 0, 'tempo': default_tempo, 'acc_seconds': 0.0})
-            last_tempo = default_tempo
-            for mi in all_messages:
-                msg = mi['msg']
-                if msg.type == 'set_tempo':
-                    t = mi['track_time']
-                    # 仅当与上一次不同才记录，避免重复
-                    if not tempo_changes or t != tempo_changes[-1]['tick'] or msg.tempo != last_tempo:
-                        tempo_changes.append({'tick': t, 'tempo': msg.tempo, 'acc_seconds': 0.0})
-                        last_tempo = msg.tempo
-
-            # 根据变化的 tick 计算每个变化点的累积秒数 acc_seconds
-            # acc_seconds 为到该变化点开始位置为止的累计秒数
-            for i in range(1, len(tempo_changes)):
-                prev = tempo_changes[i-1]
-                cur = tempo_changes[i]
-                delta_ticks = max(0, cur['tick'] - prev['tick'])
-                seconds_per_tick = (prev['tempo'] / 1_000_000.0) / max(1, ticks_per_beat)
-                cur['acc_seconds'] = prev['acc_seconds'] + delta_ticks * seconds_per_tick
-
-            def tick_to_seconds(tick_pos: int) -> float:
-                """将绝对 tick 位置转换为秒，按 tempo 分段积分"""
-                # 找到最后一个变化点，其 tick <= tick_pos
-                idx = 0
-                for i in range(len(tempo_changes)):
-                    if tempo_changes[i]['tick'] <= tick_pos:
-                        idx = i
-                    else:
-                        break
-                base = tempo_changes[idx]
-                seconds_per_tick = (base['tempo'] / 1_000_000.0) / max(1, ticks_per_beat)
-                return base['acc_seconds'] + (tick_pos - base['tick']) * seconds_per_tick
+            # 全局 tempo 表（PPQ/SMPTE），并一次性换算所有消息的绝对秒数（有序输入线性归并）
+            tempo_map = TempoMap(ticks_per_beat, ((mi['track_time'], mi['msg'].tempo)
+                                                  for mi in all_messages if mi['msg'].type == 'set_tempo'))
+            is_smpte = tempo_map.is_smpte
+            smpte_seconds_per_tick = tempo_map.smpte_seconds_per_tick
+            msg_seconds = tempo_map.ticks_to_seconds([mi['track_time'] for mi in all_messages])
             
             # 处理所有消息
             active_notes = {}
@@ -816,19 +985,14 @@ class AutoPlayer:
             total_pairs = 0
             total_unfinished = 0
             
-            for msg_info in all_messages:
+            for msg_info, now_s in zip(all_messages, msg_seconds):
                 msg = msg_info['msg']
-                track_time = msg_info['track_time']
-                
-                # 处理速度变化（仅记录当前，实际换算使用 tempo 表）
-                if msg.type == 'set_tempo':
-                    current_tempo = msg.tempo
                     
                 if msg.type == 'note_on' and msg.velocity > 0:
                     # 音符开始
                     note_key = (msg.channel, msg.note)
                     active_notes[note_key] = {
-                        'start_time': track_time,
+                        'start_time': now_s,
                         'velocity': msg.velocity,
                         'channel': getattr(msg, 'channel', 0)
                     }
@@ -839,9 +1003,9 @@ class AutoPlayer:
                     if note_key in active_notes:
                         start_info = active_notes.pop(note_key)
                         
-                        # 转换为绝对时间（秒），使用 tempo 表精确换算
-                        start_time = tick_to_seconds(start_info['start_time'])
-                        end_time = tick_to_seconds(track_time)
+                        # 绝对时间（秒）已由 tempo 表预先换算
+                        start_time = start_info['start_time']
+                        end_time = now_s
                         duration = max(0.0, end_time - start_time)
                         total_pairs += 1
                         
@@ -855,14 +1019,8 @@ class AutoPlayer:
                                 pass
 
                         # 应用键位映射
-                        mapped_keys = strategy.map_note_to_keys({
-                            'start_time': start_time,
-                            'end_time': end_time,
-                            'duration': duration,
-                            'note': note_for_map,
-                            'velocity': start_info['velocity'],
-                            'channel': start_info['channel']
-                        }, key_mapping)
+                        mapped = lut[note_index(int(note_for_map))]
+                        mapped_keys = [mapped] if mapped else []
                         
                         if mapped_keys:
                             for key in mapped_keys:
@@ -888,7 +1046,7 @@ class AutoPlayer:
             
             # 处理未结束的音符（设置合理的持续时间）
             for note_key, info in active_notes.items():
-                start_time = tick_to_seconds(info['start_time'])
+                start_time = info['start_time']
                 # 根据音符长度设置合理的持续时间
                 duration = 0.5  # 默认0.5秒
                 note = note_key[1]
@@ -909,14 +1067,8 @@ class AutoPlayer:
                     except Exception:
                         pass
 
-                mapped_keys = strategy.map_note_to_keys({
-                    'start_time': start_time,
-                    'end_time': end_time,
-                    'duration': duration,
-                    'note': note_for_map,
-                    'velocity': info['velocity'],
-                    'channel': info['channel']
-                }, key_mapping)
+                mapped = lut[note_index(int(note_for_map))]
+                mapped_keys = [mapped] if mapped else []
                 
                 if mapped_keys:
                     for key in mapped_keys:
@@ -986,17 +1138,12 @@ class AutoPlayer:
                 events.sort(key=lambda x: x['start_time'])
             if self.debug and events:
                 try:
-                    tempos = []
-                    if not is_smpte:
-                        try:
-                            tempos = [tc.get('tempo') for tc in tempo_changes]  # type: ignore
-                        except Exception:
-                            tempos = []
+                    tempos = [] if is_smpte else [int(t) for _, t in tempo_map.changes]
                     first_ev = events[0]
                     last_ev = events[-1]
                     span = max(0.0, float(last_ev.get('start_time', 0.0)) - float(first_ev.get('start_time', 0.0)))
                     self.logger.log(
-                        f"[DEBUG] ticks_per_beat={ticks_per_beat}, timebase={'SMPTE' if is_smpte else 'PPQ'}, tempo_changes={0 if is_smpte else len(tempo_changes)}, tempos(sample)={tempos[:4] if tempos else '[]'}, smpte_spt={smpte_seconds_per_tick if is_smpte else 'n/a'}",
+                        f"[DEBUG] ticks_per_beat={ticks_per_beat}, timebase={'SMPTE' if is_smpte else 'PPQ'}, tempo_changes={0 if is_smpte else len(tempo_map)}, tempos(sample)={tempos[:4] if tempos else '[]'}, smpte_spt={smpte_seconds_per_tick if is_smpte else 'n/a'}",
                         "DEBUG",
                     )
                     self.logger.log(
@@ -1017,43 +1164,15 @@ class AutoPlayer:
                         my_total = float(events[-1].get('start_time', 0.0))
                     mf_len = 0.0
                     try:
-                        mf = mido.MidiFile(midi_file)
-                        mf_len = float(getattr(mf, 'length', 0.0) or 0.0)
+                        mf_len = float(getattr(midi, 'length', 0.0) or 0.0)
                     except Exception:
                         mf_len = 0.0
-                    # 若 mido.length 不可用，退化为用 tempo_changes/PPQ 或 SMPTE 常量积分求长度
+                    # 若 mido.length 不可用，退化为用 tempo 表（PPQ 分段积分 / SMPTE 常量）求到最大 tick 的长度
                     if mf_len <= 0.0:
                         try:
-                            if not is_smpte:
-                                # PPQ：用 tempo_changes 积分到最大 tick
-                                max_tick = 0
-                                try:
-                                    # all_messages 已排序
-                                    max_tick = max(int(mi['track_time']) for mi in all_messages) if all_messages else 0
-                                except Exception:
-                                    max_tick = 0
-                                if tempo_changes:
-                                    acc = 0.0
-                                    for i in range(1, len(tempo_changes)):
-                                        prev = tempo_changes[i-1]
-                                        cur = tempo_changes[i]
-                                        dt = max(0, int(cur['tick']) - int(prev['tick']))
-                                        spt = (prev['tempo'] / 1_000_000.0) / max(1, ticks_per_beat)
-                                        acc += dt * spt
-                                    if tempo_changes:
-                                        last = tempo_changes[-1]
-                                        tail = max(0, max_tick - int(last['tick']))
-                                        spt = (last['tempo'] / 1_000_000.0) / max(1, ticks_per_beat)
-                                        acc += tail * spt
-                                    mf_len = acc
-                            else:
-                                # SMPTE：常量秒/每tick 乘以最大 tick
-                                max_tick = 0
-                                try:
-                                    max_tick = max(int(mi['track_time']) for mi in all_messages) if all_messages else 0
-                                except Exception:
-                                    max_tick = 0
-                                mf_len = float(max_tick) * float(smpte_seconds_per_tick)
+                            # all_messages 已排序
+                            max_tick = int(all_messages[-1]['track_time']) if all_messages else 0
+                            mf_len = tempo_map.length(max_tick)
                         except Exception:
                             pass
                     if my_total > 0.0 and mf_len > 0.0:
@@ -1123,6 +1242,9 @@ class AutoPlayer:
         - tap_gap_ms: 0 代表零间隔（同刻 off→on，依赖排序保证顺序）。
         - retrigger_min_gap_ms: 限制最小重触发间隔，避免极限抖动。
         - 仅当 allow_retrigger=True 时插入 tap。
+        每个 key 排序后单次扫描，所在并集段与“是否等于段起点”均用二分查找，整体 O(n log n)；
+        并集/tap 由 event_pipeline.union_and_tap 实现（与 KeyEventPipeline 共用），
+        输出与旧版逐段线性查找完全一致（对照脚本见 tools/union_tap_parity.py）。
         传入/返回: 事件列表，元素包含 'start_time','type' in ('note_on','note_off'),'key'。
         """
         if not events:
@@ -1143,7 +1265,7 @@ class AutoPlayer:
             evs = list(events)
 
         per_key_intervals: Dict[str, List[Tuple[float, float]]] = {}
-        stacks: Dict[str, List[float]] = {}
+        stacks: Dict[str, deque] = {}
         for ev in evs:
             k = ev.get('key')
             if not k:
@@ -1151,74 +1273,28 @@ class AutoPlayer:
             t = float(ev.get('start_time', 0.0))
             typ = ev.get('type')
             if typ == 'note_on':
-                stacks.setdefault(k, []).append(t)
+                stacks.setdefault(k, deque()).append(t)
             elif typ == 'note_off':
                 st_list = stacks.get(k)
                 if st_list:
-                    st = st_list.pop(0)
+                    st = st_list.popleft()
                     if t < st:
                         t = st
                     per_key_intervals.setdefault(k, []).append((st, t))
 
-        # 2) 对每个 key 的区间做并集
-        def merge_union(intervals: List[Tuple[float, float]]) -> List[Tuple[float, float]]:
-            if not intervals:
-                return []
-            arr = sorted([(min(a, b), max(a, b)) for a, b in intervals], key=lambda x: x[0])
-            merged: List[Tuple[float, float]] = []
-            cs, ce = arr[0]
-            for s, e in arr[1:]:
-                if s <= ce + eps:
-                    ce = max(ce, e)
-                else:
-                    merged.append((cs, ce))
-                    cs, ce = s, e
-            merged.append((cs, ce))
-            return merged
-
-        per_key_union: Dict[str, List[Tuple[float, float]]] = {k: merge_union(iv) for k, iv in per_key_intervals.items()}
-
-        # 3) 生成“并集段”的主 on/off 事件
+        # 2) 每个 key 的区间做并集，并对每个原始区间的起点（不等于并集段起点时）插入 tap（off→on）
         out: List[Dict[str, Any]] = []
-        for k, unions in per_key_union.items():
+        taps_out: List[Dict[str, Any]] = []
+        for k, intervals in per_key_intervals.items():
+            unions, taps = union_and_tap(sorted(intervals, key=lambda x: x[0]), eps=eps, allow_retrigger=allow_rt,
+                                         tap_gap=tap_gap, retrigger_gap=retrig_gap)
             for s, e in unions:
                 out.append({'start_time': s, 'type': 'note_on', 'key': k, 'velocity': 64})
                 out.append({'start_time': e, 'type': 'note_off', 'key': k, 'velocity': 0})
-
-        # 4) 段内插入 tap：对每个原始区间的起点，若不等于并集段起点，则插入 off→on
-        if allow_rt:
-            for k, intervals in per_key_intervals.items():
-                unions = per_key_union.get(k, [])
-                if not unions:
-                    continue
-                # 为快速判断“是否等于段起点”，做列表
-                union_starts = [s for s, _ in unions]
-                union_ends = [e for _, e in unions]
-                last_tap_time = -1e9
-                for st, en in sorted(intervals, key=lambda x: x[0]):
-                    # 找到 st 所在并集段（st ∈ [us, ue]）
-                    seg_idx = -1
-                    for i, (us, ue) in enumerate(unions):
-                        if st >= us - eps and st <= ue + eps:
-                            seg_idx = i
-                            break
-                    if seg_idx < 0:
-                        continue
-                    us, ue = unions[seg_idx]
-                    # 若与段起点“相等”，不需要 tap（主 on 已存在）
-                    if any(abs(st - us0) <= eps for us0 in union_starts):
-                        continue
-                    # 最小重触发间隔
-                    if (st - last_tap_time) < retrig_gap:
-                        continue
-                    # 若 tap_on 超过段末，跳过（避免制造孤立按下）
-                    tap_on_time = st + tap_gap
-                    if tap_on_time > ue - 1e-6:
-                        continue
-                    # 插入即时 tap：off at st, on at st+gap（gap=0 时同刻，通过排序保证 off→on）
-                    out.append({'start_time': st, 'type': 'note_off', 'key': k, 'velocity': 0})
-                    out.append({'start_time': tap_on_time, 'type': 'note_on', 'key': k, 'velocity': 64})
-                    last_tap_time = st
+            for off_t, on_t in taps:
+                taps_out.append({'start_time': off_t, 'type': 'note_off', 'key': k, 'velocity': 0})
+                taps_out.append({'start_time': on_t, 'type': 'note_on', 'key': k, 'velocity': 64})
+        out.extend(taps_out)
 
         # 对于原本不包含在 per_key_intervals 的“非按键类事件”，保持（本模块中均是按键事件，可忽略）
         # 最终返回组合后的事件
@@ -1590,6 +1666,31 @@ class AutoPlayer:
         except Exception:
             return None
     
+    def _finish_timing_report(self):
+        """汇总本曲逐片迟到量，写入 last_timing_report 并输出一行摘要日志"""
+        try:
+            rep = self.telemetry.summary(late_threshold_ms=float(self.options.get('late_threshold_ms', 5)))
+            self.last_timing_report = rep
+            if rep.get('slices'):
+                worst = ", ".join(f"{p['song_time']:.2f}s({p['lateness_ms']:.1f}ms)" for p in rep.get('worst_passages', []))
+                self.logger.log(
+                    f"[TIMING] 迟到量 p50={rep['p50_ms']:.2f}ms p95={rep['p95_ms']:.2f}ms p99={rep['p99_ms']:.2f}ms "
+                    f"max={rep['max_ms']:.2f}ms >{rep['late_threshold_ms']:g}ms: {rep['late_count']}/{rep['slices']} 最差段落: {worst}",
+                    "INFO",
+                )
+        except Exception:
+            pass
+
+    def export_timing_report(self, path: Optional[str] = None) -> Optional[str]:
+        """导出最近一次播放的逐片时序 CSV（默认 output/timing_report.csv），返回文件路径"""
+        try:
+            if len(self.telemetry) == 0:
+                return None
+            return self.telemetry.export_csv(path)
+        except Exception as e:
+            self.logger.log(f"导出时序报告失败: {str(e)}", "WARNING")
+            return None
+
     def _handle_error(self, error_msg: str):
         """处理错误"""
         self.logger.log(error_msg, "ERROR")
@@ -1602,5 +1703,9 @@ class AutoPlayer:
             'is_playing': self.is_playing,
             'is_paused': self.is_paused,
             'current_tempo': self.current_tempo,
-            'event_count': len(self.current_events) if self.current_events else 0
+            'event_count': len(self.current_events) if self.current_events else 0,
+            'timeline_actions': len(self.current_timeline) if self.current_timeline is not None else 0,
+            'scheduler': self.scheduler.get_params(),
+            'timing_report': self.last_timing_report,
+            'isolated': self._isolated is not None,
         } 
\ No newline at end of file
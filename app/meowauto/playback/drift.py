@@ -0,0 +1,99 @@
+"""
+网络时钟漂移校正
+合奏时各机器开头对齐后，仍各自按本机 perf_counter 推进整首曲子；长曲目中本机时钟与网络时钟
+（NetworkClockProvider 周期对时后的 now()）之间的偏差会累积，机器间逐渐错位。
+本模块在播放线程中按固定间隔比较：
+    期望位置 = ref_song + (clock.now() - ref_unix) * tempo
+    误差     = transport.position() - 期望位置（换算为墙钟秒）
+超出死区时施加有界 slew（transport.trim），不跳变、不重排事件。slew 为比例项（约 horizon 秒内消除误差）
+加积分项（估计本机与网络时钟的恒定频差，消除纯比例校正的稳态误差），总和限制在 ±max_slew 内。
+暂停/跳转/改倍速后以当前位置重新建立参考点（此后只保持稳定，不再追赶原约定时刻）。
+"""
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, Optional
+
+from meowauto.playback.transport import PlaybackTransport
+
+
+class DriftCorrector:
+    """按网络时钟对播放位置做连续、有界的速率微调。"""
+
+    def __init__(self, transport: PlaybackTransport, now: Callable[[], float], *,
+                 interval_ms: float = 250, max_slew: float = 0.005,
+                 deadband_ms: float = 1.0, horizon_s: float = 1.0):
+        self.transport = transport
+        self._now = now
+        self.interval = max(0.01, float(interval_ms) / 1000.0)
+        self.max_slew = max(0.0, float(max_slew))
+        self.deadband = max(0.0, float(deadband_ms) / 1000.0)
+        self.horizon = max(0.1, float(horizon_s))
+        self._ref_unix = 0.0
+        self._ref_song = 0.0
+        self._state = None
+        self._next_check = 0.0
+        self._freq = 0.0  # 积分项：频差估计
+        self.checks = 0
+        self.max_error_ms = 0.0
+        self.last_error_ms = 0.0
+
+    def begin(self, ref_unix: float, ref_song: float) -> None:
+        """设置约定参考点：网络时刻 ref_unix 对应曲目位置 ref_song。"""
+        self._ref_unix = float(ref_unix)
+        self._ref_song = float(ref_song)
+        self._state = self._transport_state()
+        self._next_check = 0.0
+        self._freq = 0.0
+        self.checks = 0
+        self.max_error_ms = 0.0
+        self.last_error_ms = 0.0
+
+    def _transport_state(self):
+        t = self.transport
+        return (t.seek_serial, t.paused_total, t.tempo)
+
+    def check(self, perf_now: float) -> Optional[float]:
+        """到检查间隔时比较一次并调整 trim；返回本次误差（毫秒），未检查返回 None。"""
+        if perf_now < self._next_check:
+            return None
+        self._next_check = perf_now + self.interval
+        t = self.transport
+        if not t.playing or t.paused:
+            return None
+        try:
+            net_now = float(self._now())
+        except Exception:
+            return None
+        position = t.position()
+        state = self._transport_state()
+        if state != self._state:
+            # 暂停/跳转/改倍速：以当前位置重新建立参考点
+            self._state = state
+            self._ref_unix = net_now
+            self._ref_song = position
+            t.set_trim(1.0)
+            return None
+        if net_now < self._ref_unix:
+            return None  # 尚未到约定开始时刻
+        expected = self._ref_song + (net_now - self._ref_unix) * t.tempo
+        error = (position - expected) / t.tempo  # 正值：本机领先
+        self.checks += 1
+        self.last_error_ms = error * 1000.0
+        self.max_error_ms = max(self.max_error_ms, abs(self.last_error_ms))
+        # 积分增益取 1/(4·horizon²)，接近临界阻尼
+        lim = self.max_slew
+        self._freq = max(-lim, min(lim, self._freq - error * self.interval / (4.0 * self.horizon * self.horizon)))
+        proportional = 0.0 if abs(error) <= self.deadband else -error / self.horizon
+        t.set_trim(1.0 + max(-lim, min(lim, self._freq + proportional)))
+        return self.last_error_ms
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'checks': self.checks,
+            'last_error_ms': self.last_error_ms,
+            'max_error_ms': self.max_error_ms,
+            'trim': self.transport.trim,
+        }
+
+
+__all__ = ['DriftCorrector']
@@ -0,0 +1,276 @@
+"""
+按键事件后处理流水线
+将 AutoPlayer 原先串行的 去重 → 多键窗口规范化 → 同键并集+tap → 排序 → 再去重 → 再规范化 → 排序
+融合为一条分阶段流水线，直接产出 PlaybackTimeline：
+- 入口把事件转为 (time, key_id) 行，按 note_on / note_off 分成两列，各自只排序一次；
+- 阶段之间保持“两列均按时间有序”的不变式：merge 对齐是单调映射不破坏顺序，arpeggio 只在簇内按键名重排，
+  按键分流、FIFO 配对、并集/tap、去重与两列归并（同刻先 off 后 on）均为线性扫描；
+- 并集/tap 的结果按键成段有序，其归并交给 timsort 的有序段合并（O(n log k)，k 为键数）；
+- 每个阶段累计耗时（stage_ms，毫秒），可以直接看出各选项的代价。
+结果与旧的逐阶段实现逐时刻等价（仅同一时刻同类动作之间的键序可能不同，不影响播放）。
+"""
+from __future__ import annotations
+
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from meowauto.playback.timeline import ACTION_PRESS, ACTION_RELEASE, PlaybackTimeline
+
+Row = Tuple[float, int]  # (曲目秒, 键号)
+
+
+def union_and_tap(intervals: List[Tuple[float, float]], *, eps: float, allow_retrigger: bool,
+                  tap_gap: float, retrigger_gap: float) -> Tuple[List[Tuple[float, float]], List[Tuple[float, float]]]:
+    """单个键：区间并集 + 段内 tap。intervals 需按起点有序。
+    返回 (并集段 [(on, off)], tap [(off 时刻, on 时刻)])，两者均按时间有序。
+    """
+    if not intervals:
+        return [], []
+    unions: List[Tuple[float, float]] = []
+    cs, ce = intervals[0]
+    for s, e in intervals[1:]:
+        if s <= ce + eps:
+            ce = max(ce, e)
+        else:
+            unions.append((cs, ce))
+            cs, ce = s, e
+    unions.append((cs, ce))
+    taps: List[Tuple[float, float]] = []
+    if not allow_retrigger:
+        return unions, taps
+    # 段起点与（段末 + eps）均单调递增，可二分
+    union_starts = [s for s, _ in unions]
+    union_ends_eps = [e + eps for _, e in unions]
+    n_unions = len(unions)
+    last_tap_time = -1e9
+    for st, _ in intervals:
+        # st 所在并集段：首个 ue + eps >= st 的段，再校验段起点
+        seg_idx = bisect_left(union_ends_eps, st)
+        if seg_idx >= n_unions:
+            continue
+        us, ue = unions[seg_idx]
+        if st < us - eps:
+            continue
+        # 与段起点“相等”时不需要 tap（主 on 已存在）：只需比较 st 两侧最近的段起点
+        j = bisect_left(union_starts, st)
+        if (j < n_unions and abs(st - union_starts[j]) <= eps) or (j > 0 and abs(st - union_starts[j - 1]) <= eps):
+            continue
+        # 最小重触发间隔
+        if (st - last_tap_time) < retrigger_gap:
+            continue
+        # tap_on 超过段末则跳过（避免制造孤立按下）
+        tap_on_time = st + tap_gap
+        if tap_on_time > ue - 1e-6:
+            continue
+        taps.append((st, tap_on_time))
+        last_tap_time = st
+    return unions, taps
+
+
+class KeyEventPipeline:
+    """一次编译用的后处理流水线（按 AutoPlayer.options 配置）。"""
+
+    def __init__(self, options: Dict[str, Any]):
+        opt = options or {}
+        self.allow_retrigger = bool(opt.get('allow_retrigger', True))
+        self.tap_gap = max(0.0, float(opt.get('tap_gap_ms', 0))) / 1000.0
+        self.retrigger_gap = max(0.0, float(opt.get('retrigger_min_gap_ms', 40))) / 1000.0
+        self.eps = max(0.0, float(opt.get('epsilon_ms', 6))) / 1000.0
+        mode = str(opt.get('multi_key_cluster_mode', 'merge')).lower()
+        try:
+            win = max(0.0, float(opt.get('multi_key_cluster_window_ms', 50))) / 1000.0
+        except Exception:
+            win = 0.05
+        self.cluster_mode = mode if (mode in ('merge', 'arpeggio') and win > 0) else 'original'
+        self.cluster_window = win
+        self.stage_ms: Dict[str, float] = {}
+        self.key_names: List[str] = []
+        self._key_index: Dict[str, int] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        """累计某阶段耗时（也可用于流水线之外的阶段，如映射、和弦伴奏）。"""
+        t0 = perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_ms[name] = self.stage_ms.get(name, 0.0) + (perf_counter() - t0) * 1000.0
+
+    def summary(self) -> str:
+        return ", ".join(f"{k}={v:.1f}ms" for k, v in self.stage_ms.items())
+
+    # ---- 入口 ----
+    def run(self, events: Iterable[Dict[str, Any]], *, union: bool = True,
+            renormalize: bool = True) -> Optional[PlaybackTimeline]:
+        """去重 → 规范化 →（并集/tap → 去重 → 规范化）→ 编译；无有效按键事件时返回 None。
+        union=False 用于鼓等不做延长音合并的链路；renormalize=False 时并集后不再做第二轮去重/规范化。
+        """
+        with self.stage('dedup'):
+            ons, offs = self._intake(events)
+        with self.stage('sort'):
+            ons.sort()
+            offs.sort()
+        with self.stage('cluster'):
+            ons = self._cluster(ons)
+        if union:
+            with self.stage('union_tap'):
+                u_ons, u_offs = self._union_and_tap(ons, offs)
+            if u_ons or u_offs:
+                ons, offs = u_ons, u_offs
+            if renormalize:
+                with self.stage('dedup'):
+                    ons = self._dedup_sorted(ons)
+                    offs = self._dedup_sorted(offs)
+                with self.stage('cluster'):
+                    ons = self._cluster(ons)
+        if not ons and not offs:
+            return None
+        with self.stage('compile'):
+            return self._compile(ons, offs)
+
+    # ---- 阶段实现 ----
+    def _kid(self, key: str) -> int:
+        kid = self._key_index.get(key)
+        if kid is None:
+            kid = len(self.key_names)
+            self._key_index[key] = kid
+            self.key_names.append(key)
+        return kid
+
+    def _intake(self, events: Iterable[Dict[str, Any]]) -> Tuple[List[Row], List[Row]]:
+        """转为两列行，同时做首轮去重：同一时刻桶（1e-6 秒）、同键、同类型只保留首个。"""
+        ons: List[Row] = []
+        offs: List[Row] = []
+        seen = set()
+        key_index = self._key_index
+        for ev in events:
+            try:
+                k = ev.get('key')
+                typ = ev.get('type')
+                t = ev.get('start_time')
+                if not k or t is None:
+                    continue
+                if typ == 'note_on':
+                    on = True
+                elif typ == 'note_off':
+                    on = False
+                else:
+                    continue
+                t = float(t)
+                kid = key_index.get(k)
+                if kid is None:
+                    kid = self._kid(str(k))
+                sig = (round(t / 1e-6), kid, on)
+                if sig in seen:
+                    continue
+                seen.add(sig)
+                (ons if on else offs).append((t, kid))
+            except Exception:
+                continue
+        return ons, offs
+
+    @staticmethod
+    def _dedup_sorted(rows: List[Row]) -> List[Row]:
+        seen = set()
+        out: List[Row] = []
+        for t, kid in rows:
+            sig = (round(t / 1e-6), kid)
+            if sig in seen:
+                continue
+            seen.add(sig)
+            out.append((t, kid))
+        return out
+
+    def _cluster(self, ons: List[Row]) -> List[Row]:
+        """多键窗口规范化（输入按时间有序，输出仍按时间有序）。
+        以簇首时间为基准、窗口内的 note_on 为一簇：merge 对齐到簇首；arpeggio 按键名在窗口内均匀铺开。
+        """
+        mode = self.cluster_mode
+        if mode == 'original' or not ons:
+            return ons
+        win = self.cluster_window
+        out: List[Row] = []
+        n = len(ons)
+        i = 0
+        if mode == 'merge':
+            while i < n:
+                t0 = ons[i][0]
+                while i < n and ons[i][0] - t0 <= win:
+                    out.append((t0, ons[i][1]))
+                    i += 1
+            return out
+        names = self.key_names
+        span = max(win, 1e-6)
+        while i < n:
+            t0 = ons[i][0]
+            j = i
+            while j < n and ons[j][0] - t0 <= win:
+                j += 1
+            if j - i == 1:
+                out.append(ons[i])
+            else:
+                cluster = sorted(ons[i:j], key=lambda r: names[r[1]])
+                m = len(cluster)
+                out.extend((t0 + (span * c / m), kid) for c, (_, kid) in enumerate(cluster))
+            i = j
+        return out
+
+    def _union_and_tap(self, ons: List[Row], offs: List[Row]) -> Tuple[List[Row], List[Row]]:
+        """按键分流（保持时间序，同刻先 off）→ FIFO 配对成区间 → 并集段 + tap。"""
+        pending: Dict[int, deque] = {}
+        per_key: Dict[int, List[Tuple[float, float]]] = {}
+        for t, on, kid in self._merged(ons, offs):
+            if on:
+                q = pending.get(kid)
+                if q is None:
+                    q = pending[kid] = deque()
+                q.append(t)
+            else:
+                q = pending.get(kid)
+                if q:
+                    st = q.popleft()
+                    lst = per_key.get(kid)
+                    if lst is None:
+                        lst = per_key[kid] = []
+                    lst.append((st, t if t >= st else st))
+        out_ons: List[Row] = []
+        out_offs: List[Row] = []
+        for kid, intervals in per_key.items():
+            unions, taps = union_and_tap(intervals, eps=self.eps, allow_retrigger=self.allow_retrigger,
+                                         tap_gap=self.tap_gap, retrigger_gap=self.retrigger_gap)
+            for s, e in unions:
+                out_ons.append((s, kid))
+                out_offs.append((e, kid))
+            for off_t, on_t in taps:
+                out_offs.append((off_t, kid))
+                out_ons.append((on_t, kid))
+        # 每个键的输出各自有序：此处只是 k 路有序段的合并
+        out_ons.sort()
+        out_offs.sort()
+        return out_ons, out_offs
+
+    @staticmethod
+    def _merged(ons: List[Row], offs: List[Row]):
+        """两列归并为 (time, is_on, kid)，同刻 off 在前。"""
+        i = j = 0
+        n_on, n_off = len(ons), len(offs)
+        while i < n_on or j < n_off:
+            if j < n_off and (i >= n_on or offs[j][0] <= ons[i][0]):
+                t, kid = offs[j]
+                j += 1
+                yield t, False, kid
+            else:
+                t, kid = ons[i]
+                i += 1
+                yield t, True, kid
+
+    def _compile(self, ons: List[Row], offs: List[Row]) -> PlaybackTimeline:
+        names = self.key_names
+        rows = [(t, ACTION_PRESS if on else ACTION_RELEASE, names[kid]) for t, on, kid in self._merged(ons, offs)]
+        return PlaybackTimeline._from_rows(rows)
+
+
+__all__ = ['KeyEventPipeline', 'union_and_tap']
@@ -0,0 +1,235 @@
+"""
+隔离播放（独立子进程）
+将编译后的时间轴放入共享内存交给子进程，由子进程持有按键后端与调度器独立计时，
+与主进程的 Tk/解析负载（GIL 争用）隔离。子进程以 spawn 方式启动，打包为 exe 时入口须先调用
+multiprocessing.freeze_support()（见 start.py），否则子进程会重新启动整个程序。控制命令与进度/时序遥测经 Pipe 传递：
+- 父 → 子: ('pause',) ('resume',) ('seek', 秒) ('tempo', 倍速) ('stop',)
+- 子 → 父: ('progress', 百分比) ('complete', None) ('error', 文本) ('report', (摘要, 明细行)) ('done', None)
+"""
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from meowauto.playback.timeline import PlaybackTimeline
+
+# 共享内存中的并行数组：(属性名, typecode, 每项字节数)
+_SHARED_ARRAYS = (('times', 'd', 8), ('actions', 'b', 1), ('key_ids', 'H', 2))
+
+
+def _picklable_options(options: Dict[str, Any]) -> Dict[str, Any]:
+    """只保留可跨进程传递的简单选项；KeyBackend 实例按名称传递。"""
+    out: Dict[str, Any] = {}
+    for k, v in (options or {}).items():
+        if k == 'key_backend' and v is not None and not isinstance(v, str):
+            v = getattr(v, 'name', None)
+        if v is None or isinstance(v, (bool, int, float, str)):
+            out[k] = v
+    return out
+
+
+class IsolatedPlayback:
+    """父进程侧句柄：创建共享内存、启动子进程、转发控制命令并分发子进程消息。"""
+
+    def __init__(self, on_message: Callable[[str, Any], None]):
+        self._on_message = on_message
+        self._proc = None
+        self._conn = None
+        self._shms: List[Any] = []
+        self._listener: Optional[threading.Thread] = None
+        self._send_lock = threading.Lock()
+        self._stop_deadline: Optional[float] = None  # stop() 后子进程须在此 monotonic 时刻前退出
+
+    @property
+    def alive(self) -> bool:
+        return self._proc is not None and self._proc.is_alive()
+
+    def start(self, timeline: PlaybackTimeline, *, tempo: float = 1.0, start_at: float = 0.0,
+              at_perf: Optional[float] = None, options: Optional[Dict[str, Any]] = None, debug: bool = False) -> None:
+        """启动子进程播放；失败时抛出异常并清理已分配的共享内存。
+        at_perf 为 perf_counter 时刻（系统级单调时钟，父子进程一致），用于预约开始。
+        """
+        import multiprocessing as mp
+        from multiprocessing import shared_memory
+
+        n = len(timeline)
+        if n == 0:
+            raise ValueError("时间轴为空")
+        try:
+            for attr, _, size in _SHARED_ARRAYS:
+                src = getattr(timeline, attr)
+                shm = shared_memory.SharedMemory(create=True, size=n * size)
+                self._shms.append(shm)
+                shm.buf[:n * size] = src.tobytes()
+            # spawn：避免在带 Tk/多线程的进程中 fork
+            ctx = mp.get_context('spawn')
+            parent_conn, child_conn = ctx.Pipe()
+            self._proc = ctx.Process(
+                target=_child_main,
+                args=(child_conn, [s.name for s in self._shms], n, list(timeline.key_names),
+                      float(tempo), float(start_at), at_perf, _picklable_options(options or {}), bool(debug)),
+                name="AutoPlayerIsolated",
+            )
+            self._proc.daemon = True
+            self._proc.start()
+            child_conn.close()
+            self._conn = parent_conn
+        except Exception:
+            self._cleanup()
+            raise
+        self._listener = threading.Thread(target=self._listen, name="IsolatedPlaybackListener")
+        self._listener.daemon = True
+        self._listener.start()
+
+    def send(self, *cmd: Any) -> bool:
+        conn = self._conn
+        if conn is None:
+            return False
+        try:
+            with self._send_lock:
+                conn.send(cmd)
+            return True
+        except Exception:
+            return False
+
+    def stop(self, timeout: float = 1.0) -> None:
+        """请求子进程停止后立即返回（不阻塞调用方/Tk 线程）；
+        由监听线程等待子进程退出，超过 timeout 仍未退出则强制结束，随后清理资源并发出 'done'。
+        """
+        if self._stop_deadline is None:
+            self._stop_deadline = time.monotonic() + max(0.0, float(timeout))
+        self.send('stop')
+
+    def _listen(self) -> None:
+        conn = self._conn
+        try:
+            while True:
+                try:
+                    if not conn.poll(0.1):
+                        deadline = self._stop_deadline
+                        if deadline is not None and time.monotonic() >= deadline:
+                            break  # 已请求停止但子进程无响应
+                        continue
+                    kind, payload = conn.recv()
+                except (EOFError, OSError):
+                    break
+                if kind == 'done':
+                    break
+                try:
+                    self._on_message(kind, payload)
+                except Exception:
+                    pass
+        finally:
+            proc = self._proc
+            if proc is not None:
+                deadline = self._stop_deadline
+                proc.join(1.0 if deadline is None else max(0.0, deadline - time.monotonic()))
+                if proc.is_alive():
+                    try:
+                        proc.terminate()
+                        proc.join(1.0)
+                        if proc.is_alive():
+                            proc.kill()
+                            proc.join(1.0)
+                    except Exception:
+                        pass
+            self._cleanup()
+            try:
+                self._on_message('done', None)
+            except Exception:
+                pass
+
+    def _cleanup(self) -> None:
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        for shm in self._shms:
+            try:
+                shm.close()
+                shm.unlink()
+            except Exception:
+                pass
+        self._shms = []
+
+
+def _child_main(conn, shm_names: List[str], n: int, key_names: List[str], tempo: float,
+                start_at: float, at_perf: Optional[float], options: Dict[str, Any], debug: bool) -> None:
+    """子进程入口：挂载共享内存时间轴，以线程模式运行 AutoPlayer，主线程处理控制命令。"""
+    from multiprocessing import shared_memory
+    from meowauto.core import Logger
+    from meowauto.playback.auto_player import AutoPlayer
+
+    send_lock = threading.Lock()
+
+    def send(kind: str, payload: Any = None) -> None:
+        try:
+            with send_lock:
+                conn.send((kind, payload))
+        except Exception:
+            pass
+
+    timeline = None
+    shms = [shared_memory.SharedMemory(name=name) for name in shm_names]
+    views = [shm.buf[:n * size].cast(code) for shm, (_, code, size) in zip(shms, _SHARED_ARRAYS)]
+    try:
+        timeline = PlaybackTimeline(views[0], views[1], views[2], key_names)
+        ap = AutoPlayer(Logger())
+        ap.debug = debug
+        options = dict(options)
+        options['isolated_playback'] = False
+        ap.set_options(**options)
+        ap.set_callbacks(
+            on_progress=lambda p: send('progress', p),
+            on_complete=lambda: send('complete'),
+            on_error=lambda msg: send('error', msg),
+        )
+        if not ap.start_auto_play_timeline(timeline, tempo=tempo, start_at=start_at, at_perf=at_perf):
+            send('error', "隔离播放启动失败")
+            return
+
+        def control() -> None:
+            while True:
+                try:
+                    cmd = conn.recv()
+                except (EOFError, OSError):
+                    ap.stop_auto_play()
+                    return
+                op = cmd[0] if cmd else None
+                try:
+                    if op == 'pause':
+                        ap.pause_auto_play()
+                    elif op == 'resume':
+                        ap.resume_auto_play()
+                    elif op == 'seek':
+                        ap.seek(cmd[1])
+                    elif op == 'tempo':
+                        ap.set_tempo_live(cmd[1])
+                    elif op == 'stop':
+                        ap.stop_auto_play()
+                        return
+                except Exception:
+                    pass
+
+        ctl = threading.Thread(target=control, name="IsolatedControl")
+        ctl.daemon = True
+        ctl.start()
+        if ap.play_thread is not None:
+            ap.play_thread.join()
+        send('report', (ap.last_timing_report, ap.telemetry.rows()))
+    finally:
+        timeline = None
+        for v in views:
+            v.release()
+        for shm in shms:
+            try:
+                shm.close()
+            except Exception:
+                pass
+        send('done')
+
+
+__all__ = ['IsolatedPlayback']
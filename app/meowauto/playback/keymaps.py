@@ -15,7 +15,7 @@
 
 from __future__ import annotations
 
-from typing import Dict
+from typing import Dict, List
 
 
 def get_default_mapping() -> Dict[str, str]:
@@ -99,3 +99,23 @@ def get_strategy_for_game(game_name: str | None) -> str:
     return get_game_profile(game_name).strategy
 
 
+def all_mapping_keys() -> List[str]:
+    """汇总所有内置映射会用到的键（21键/原神/各游戏/鼓/贝斯/吉他/和弦键），供按键后端预解析。"""
+    keys = set()
+    maps = [get_default_mapping(), get_genshin_mapping()]
+    maps.extend(p.mapping for p in GAME_REGISTRY.values())
+    try:
+        from meowauto.playback.keymaps_ext import DRUMS_KEYMAP, BASS_KEYMAP, GUITAR_KEYMAP
+        maps.extend([DRUMS_KEYMAP, BASS_KEYMAP, GUITAR_KEYMAP])
+    except Exception:
+        pass
+    try:
+        from meowauto.music.chord_engine import ChordEngine
+        maps.append(ChordEngine().chord_key_map)
+    except Exception:
+        pass
+    for m in maps:
+        for v in m.values():
+            if isinstance(v, str) and v:
+                keys.add(v)
+    return sorted(keys)
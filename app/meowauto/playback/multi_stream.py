@@ -0,0 +1,306 @@
+"""
+多时间轴合并调度
+同一进程、同一计时线程内并行演奏多条已编译时间轴（如 钢琴 + 贝斯 + 鼓）：
+- 以最小堆做惰性 k 路归并，堆内每条流只有一个待发时间片，出堆后再推入该流下一片；
+- 每条流独立的倍速锚点：master = anchor_master + (t - anchor_song) / tempo，改倍速时在当前位置重新锚定；
+- 支持 mute / solo：静音时立即松开该流按住的键，此后只结算释放不再按下；
+- 所有流共享一个 KeySender（按键名引用计数），重叠的流不会互相提前松开对方的键。
+master 时间由 PlaybackTransport 维护（含全局倍速与暂停平移），等待使用 AdaptiveScheduler。
+"""
+from __future__ import annotations
+
+import heapq
+import threading
+from time import perf_counter
+from typing import Any, Dict, List, Optional
+
+from meowauto.core import KeySender
+from meowauto.playback.scheduler import AdaptiveScheduler
+from meowauto.playback.telemetry import LatenessRecorder
+from meowauto.playback.timeline import ACTION_RELEASE, PlaybackTimeline
+from meowauto.playback.transport import PlaybackTransport
+
+
+class _Stream:
+    """单条流的播放状态（仅由计时线程读写，控制参数经 MultiTimelineScheduler 加锁修改）。"""
+
+    __slots__ = ('name', 'timeline', 'slices', 'cursor', 'tempo', 'anchor_master', 'anchor_song',
+                 'muted', 'solo', 'held')
+
+    def __init__(self, name: str, timeline: PlaybackTimeline, tempo: float = 1.0):
+        self.name = name
+        self.timeline = timeline
+        self.slices = None
+        self.cursor = 0
+        self.tempo = max(0.01, float(tempo))
+        self.anchor_master = 0.0
+        self.anchor_song = 0.0
+        self.muted = False
+        self.solo = False
+        self.held = [0] * timeline.key_count  # 本流已发出的按下计数（按键号）
+
+    def master_time(self, song_time: float) -> float:
+        return self.anchor_master + (song_time - self.anchor_song) / self.tempo
+
+    def song_time(self, master: float) -> float:
+        return self.anchor_song + (master - self.anchor_master) * self.tempo
+
+    def next_entry(self, order: int):
+        """当前游标对应的堆条目 (master 时刻, 流序号, 片序号)；已播完返回 None。"""
+        if self.cursor >= len(self.slices) - 1:
+            return None
+        return (self.master_time(self.timeline.times[self.slices[self.cursor]]), order, self.cursor)
+
+
+class MultiTimelineScheduler:
+    """多条时间轴共用一个计时线程与按键状态的合并播放器。"""
+
+    def __init__(self, logger: Any = None, key_backend: Any = None, *,
+                 epsilon_ms: float = 6, send_ahead_ms: float = 0):
+        self.logger = logger
+        self.key_backend = key_backend
+        self.epsilon = max(0.0, float(epsilon_ms) / 1000.0)
+        self.send_ahead = float(send_ahead_ms) / 1000.0
+        self.transport = PlaybackTransport()
+        self.scheduler = AdaptiveScheduler()
+        self.telemetry = LatenessRecorder()
+        self._streams: List[_Stream] = []
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._cancel = False
+        self._thread: Optional[threading.Thread] = None
+        self.on_complete = None
+
+    # ---- 流管理与控制 ----
+    def add_stream(self, name: str, timeline: PlaybackTimeline, tempo: float = 1.0) -> bool:
+        """添加一条流（播放开始前调用）；空时间轴或重名返回 False。"""
+        if timeline is None or len(timeline) == 0 or self.is_playing:
+            return False
+        if any(s.name == name for s in self._streams):
+            return False
+        self._streams.append(_Stream(name, timeline, tempo))
+        return True
+
+    def stream_names(self) -> List[str]:
+        return [s.name for s in self._streams]
+
+    def _find(self, name: str) -> Optional[_Stream]:
+        for s in self._streams:
+            if s.name == name:
+                return s
+        return None
+
+    def _changed(self) -> None:
+        self._dirty = True
+        self.transport.notify()
+
+    def set_mute(self, name: str, muted: bool) -> bool:
+        st = self._find(name)
+        if st is None:
+            return False
+        with self._lock:
+            st.muted = bool(muted)
+            self._changed()
+        return True
+
+    def set_solo(self, name: str, solo: bool) -> bool:
+        st = self._find(name)
+        if st is None:
+            return False
+        with self._lock:
+            st.solo = bool(solo)
+            self._changed()
+        return True
+
+    def set_stream_tempo(self, name: str, factor: float) -> bool:
+        """调整单条流倍速：在当前位置重新锚定，不跳变。"""
+        st = self._find(name)
+        if st is None:
+            return False
+        with self._lock:
+            if self.transport.playing:
+                now = self.transport.position()
+                st.anchor_song = st.song_time(now)
+                st.anchor_master = now
+            st.tempo = max(0.01, float(factor))
+            self._changed()
+        return True
+
+    def set_tempo(self, factor: float) -> None:
+        """全局倍速（作用于所有流）。"""
+        self.transport.set_tempo(factor)
+
+    @property
+    def is_playing(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, start_at: float = 0.0, tempo: float = 1.0) -> bool:
+        if self.is_playing or not self._streams:
+            return False
+        start_at = max(0.0, float(start_at))
+        for st in self._streams:
+            st.slices = st.timeline.build_slices(self.epsilon)
+            st.anchor_master = start_at
+            st.anchor_song = start_at
+            st.held = [0] * st.timeline.key_count
+        self._cancel = False
+        self._thread = threading.Thread(target=self._run, args=(start_at, tempo), name="MultiTimelineScheduler")
+        self._thread.daemon = True
+        self._thread.start()
+        return True
+
+    def pause(self) -> bool:
+        return self.transport.pause()
+
+    def resume(self) -> bool:
+        return self.transport.resume()
+
+    def stop(self, timeout: float = 1.0) -> None:
+        self._cancel = True
+        self.transport.stop()
+        t = self._thread
+        if t is not None and t.is_alive() and t is not threading.current_thread():
+            t.join(timeout)
+
+    # ---- 计时线程 ----
+    def _audible(self, st: _Stream, any_solo: bool) -> bool:
+        return st.solo if any_solo else not st.muted
+
+    def _silence(self, st: _Stream, releases: List[str]) -> None:
+        names = st.timeline.key_names
+        for kid, c in enumerate(st.held):
+            if c > 0:
+                releases.extend([names[kid]] * c)
+                st.held[kid] = 0
+
+    def _rebuild_heap(self) -> List[tuple]:
+        heap = []
+        for order, st in enumerate(self._streams):
+            entry = st.next_entry(order)
+            if entry is not None:
+                heap.append(entry)
+        heapq.heapify(heap)
+        return heap
+
+    def _run(self, start_at: float, tempo: float) -> None:
+        transport = self.transport
+        scheduler = self.scheduler
+        if not scheduler.calibrated:
+            scheduler.calibrate()
+        recorder = self.telemetry
+        recorder.reset()
+        key_sender = KeySender(self.key_backend)
+        streams = self._streams
+        key_sender.prepare({k for st in streams for k in st.timeline.key_names})
+        should_continue = lambda: transport.playing and not transport.paused
+        transport.start(start_at, tempo)
+        if self._cancel:
+            transport.stop()
+        try:
+            # 起点定位：按各流在 start_at 时应保持的键补按
+            presses: List[str] = []
+            any_solo = any(st.solo for st in streams)
+            for st in streams:
+                tl = st.timeline
+                st.cursor = tl.slice_at(st.slices, tl.index_at(start_at)) if start_at > 0 else 0
+                if start_at > 0 and self._audible(st, any_solo):
+                    st.held = tl.held_counts(st.slices[st.cursor])
+                    for kid, c in enumerate(st.held):
+                        presses.extend([tl.key_names[kid]] * c)
+            if presses:
+                key_sender.send([], presses)
+            heap = self._rebuild_heap()
+
+            while heap and transport.playing:
+                if not transport.wait_if_paused():
+                    break
+                if self._dirty:
+                    # 控制参数变化：静音流立即松键，按新锚点重建堆（k 条目，代价可忽略）
+                    with self._lock:
+                        self._dirty = False
+                        any_solo = any(st.solo for st in streams)
+                        releases: List[str] = []
+                        for st in streams:
+                            if not self._audible(st, any_solo):
+                                self._silence(st, releases)
+                        heap = self._rebuild_heap()
+                    if releases:
+                        key_sender.send(releases, [])
+                    continue
+
+                master = heap[0][0]
+                target = transport.song_to_perf(master) - self.send_ahead
+                version = transport.version
+                scheduler.wait_until(target, should_continue, sleep=transport.sleep)
+                if transport.version != version:
+                    continue
+
+                # 出堆 epsilon 窗口内各流的时间片（每流每批至多一片，保证同流片间先后顺序）
+                releases = []
+                presses = []
+                deferred = []
+                limit = master + self.epsilon
+                while heap and heap[0][0] <= limit:
+                    _, order, slice_no = heapq.heappop(heap)
+                    st = streams[order]
+                    self._dispatch(st, slice_no, self._audible(st, any_solo), releases, presses)
+                    st.cursor = slice_no + 1
+                    entry = st.next_entry(order)
+                    if entry is not None:
+                        deferred.append(entry)
+                for entry in deferred:
+                    heapq.heappush(heap, entry)
+                if releases or presses:
+                    recorder.record(master, target, perf_counter())
+                    key_sender.send(releases, presses)
+
+            if not heap and transport.playing and callable(self.on_complete):
+                try:
+                    self.on_complete()
+                except Exception:
+                    pass
+        except Exception as e:
+            if self.logger:
+                self.logger.log(f"多轨合并演奏失败: {str(e)}", "ERROR")
+        finally:
+            releases = []
+            for st in streams:
+                self._silence(st, releases)
+            try:
+                key_sender.send(releases, [])
+                key_sender.release_all()
+            except Exception:
+                pass
+            transport.stop()
+
+    def _dispatch(self, st: _Stream, slice_no: int, audible: bool,
+                  releases: List[str], presses: List[str]) -> None:
+        """结算一片动作：释放只针对本流已按下的键；不可听时跳过按下。"""
+        tl = st.timeline
+        actions = tl.actions
+        key_ids = tl.key_ids
+        names = tl.key_names
+        held = st.held
+        for idx in range(st.slices[slice_no], st.slices[slice_no + 1]):
+            kid = key_ids[idx]
+            if actions[idx] == ACTION_RELEASE:
+                if held[kid] > 0:
+                    held[kid] -= 1
+                    releases.append(names[kid])
+            elif audible:
+                held[kid] += 1
+                presses.append(names[kid])
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            'is_playing': self.is_playing,
+            'position': self.transport.position(),
+            'streams': [
+                {'name': st.name, 'tempo': st.tempo, 'muted': st.muted, 'solo': st.solo,
+                 'actions': len(st.timeline)}
+                for st in self._streams
+            ],
+        }
+
+
+__all__ = ['MultiTimelineScheduler']
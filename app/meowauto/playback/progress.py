@@ -0,0 +1,77 @@
+"""
+限频进度发布
+播放线程不再逐片回调 on_progress；由独立的轻量定时线程按固定频率（默认 20 Hz）采样播放位置，
+写入单个合并槽位（只保留最新值），值变化时才回调一次。UI 端也可直接 poll() 读取槽位。
+"""
+from __future__ import annotations
+
+import threading
+from typing import Callable, Optional
+
+
+class ProgressPublisher:
+    """按固定频率采样进度并合并发布（每次播放 start/stop 一次）。"""
+
+    def __init__(self, rate_hz: float = 20.0):
+        self.rate_hz = float(rate_hz)
+        self._slot: Optional[float] = None  # 合并槽位：最近一次发布的进度（0~100）
+        self._sample: Optional[Callable[[], float]] = None
+        self._callback: Optional[Callable[[float], None]] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, sample: Callable[[], float], callback: Optional[Callable[[float], None]],
+              rate_hz: Optional[float] = None) -> None:
+        """开始采样；sample 返回 0~100 的进度，callback 在发布线程中调用。"""
+        self.stop(flush=False)
+        if rate_hz is not None:
+            self.rate_hz = float(rate_hz)
+        self._sample = sample
+        self._callback = callback
+        self._slot = None
+        if not callable(callback) or self.rate_hz <= 0:
+            return
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(self._stop,), name="ProgressPublisher")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, flush: bool = True, final: Optional[float] = None) -> None:
+        """停止采样；flush 时补发一次最终进度（给定 final 时以其为准，如正常结束时的 100）。"""
+        self._stop.set()
+        t = self._thread
+        self._thread = None
+        if t is not None and t.is_alive() and t is not threading.current_thread():
+            t.join(timeout=1.0)
+        if flush and final is not None:
+            self._sample = lambda: final
+        if flush and self._sample is not None:
+            self._publish()
+        self._sample = None
+
+    def poll(self) -> Optional[float]:
+        """读取合并槽位中的最新进度（未发布过时为 None）。"""
+        return self._slot
+
+    def _publish(self) -> None:
+        try:
+            value = max(0.0, min(100.0, float(self._sample())))
+        except Exception:
+            return
+        if self._slot is not None and abs(value - self._slot) < 1e-6:
+            return
+        self._slot = value
+        cb = self._callback
+        if callable(cb):
+            try:
+                cb(value)
+            except Exception:
+                pass
+
+    def _run(self, stop_event: threading.Event) -> None:
+        interval = 1.0 / max(0.1, self.rate_hz)
+        while not stop_event.wait(interval):
+            self._publish()
+
+
+__all__ = ['ProgressPublisher']
@@ -0,0 +1,108 @@
+"""
+自适应等待调度器
+测量 time.sleep 的实际超时（overshoot），并在播放中持续以 EWMA 更新；
+每次等待按学习到的超时估计划分“睡眠段 + 忙等段”：
+- 距目标较远时睡眠到 (目标 - 忙等窗口)；
+- 忙等窗口 = 超时均值 + k × 超时偏差，夹紧到 [min_spin, max_spin]。
+定时器分辨率高的机器上忙等窗口很小（CPU 占用低），分辨率差的机器上自动加宽（不丢准点）。
+"""
+from __future__ import annotations
+
+import time
+from time import perf_counter
+from typing import Any, Callable, Dict, Optional
+
+
+class AdaptiveScheduler:
+    """基于 sleep 超时估计的睡眠/忙等混合等待器（单线程使用）。"""
+
+    def __init__(self, *, alpha: float = 0.125, deviation_gain: float = 4.0,
+                 min_spin: float = 0.0002, max_spin: float = 0.02, max_sleep_chunk: float = 0.1):
+        self.alpha = float(alpha)
+        self.deviation_gain = float(deviation_gain)
+        self.min_spin = float(min_spin)
+        self.max_spin = float(max_spin)
+        self.max_sleep_chunk = float(max_sleep_chunk)
+        # 学习参数（秒）：保守初值，校准后会被覆盖
+        self.overshoot = 0.001
+        self.deviation = 0.0005
+        self.samples = 0
+        self.calibrated = False
+        # 统计：累计睡眠/忙等时长，用于估计 CPU 占用
+        self.sleep_time = 0.0
+        self.spin_time = 0.0
+
+    @property
+    def spin_window(self) -> float:
+        w = self.overshoot + self.deviation_gain * self.deviation
+        return min(self.max_spin, max(self.min_spin, w))
+
+    def observe(self, overshoot: float) -> None:
+        """记录一次 sleep 超时（实际 - 请求，秒），EWMA 更新均值与平均偏差。"""
+        o = max(0.0, float(overshoot))
+        if self.samples == 0:
+            self.overshoot = o
+            self.deviation = o / 2.0
+        else:
+            err = o - self.overshoot
+            self.overshoot += self.alpha * err
+            self.deviation += self.alpha * (abs(err) - self.deviation)
+        self.samples += 1
+
+    def calibrate(self, rounds: int = 16, request: float = 0.001) -> Dict[str, Any]:
+        """启动时测量 sleep 超时（约 rounds × (request + 超时) 秒）。"""
+        for _ in range(max(1, int(rounds))):
+            t0 = perf_counter()
+            time.sleep(request)
+            self.observe(perf_counter() - t0 - request)
+        self.calibrated = True
+        return self.get_params()
+
+    def wait_until(self, target: float, should_continue: Optional[Callable[[], bool]] = None,
+                   sleep: Optional[Callable[[float], Any]] = None) -> float:
+        """等待到 perf_counter() 时刻 target；返回迟到量（秒，可为负表示未到即被中止）。
+        should_continue 返回 False 时立即结束等待（暂停/停止）。
+        sleep 可替换为可打断的睡眠（返回真值表示被打断，此时立即返回且不计入超时统计）。
+        """
+        do_sleep = sleep or time.sleep
+        while True:
+            now = perf_counter()
+            remain = target - now
+            if remain <= 0:
+                return now - target
+            if should_continue is not None and not should_continue():
+                return now - target
+            spin = self.spin_window
+            if remain > spin:
+                req = min(remain - spin, self.max_sleep_chunk)
+                interrupted = do_sleep(req)
+                actual = perf_counter() - now
+                self.sleep_time += actual
+                if interrupted:
+                    return perf_counter() - target
+                self.observe(actual - req)
+                continue
+            # 忙等阶段
+            while True:
+                t = perf_counter()
+                if t >= target:
+                    break
+                if should_continue is not None and not should_continue():
+                    break
+            self.spin_time += t - now
+            return t - target
+
+    def get_params(self) -> Dict[str, Any]:
+        """导出学习到的参数（毫秒）与睡眠/忙等占比。"""
+        busy = self.sleep_time + self.spin_time
+        return {
+            'calibrated': self.calibrated,
+            'samples': self.samples,
+            'overshoot_ms': self.overshoot * 1000.0,
+            'deviation_ms': self.deviation * 1000.0,
+            'spin_window_ms': self.spin_window * 1000.0,
+            'spin_ratio': (self.spin_time / busy) if busy > 0 else 0.0,
+        }
+
+
+__all__ = ['AdaptiveScheduler']
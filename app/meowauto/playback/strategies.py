@@ -1,18 +1,59 @@
 """
 Key mapping strategies for different game layouts.
+
+Each strategy compiles a 128-entry note -> key lookup table per (strategy, mapping,
+relevant options); tables are cached, so mapping a note is a single index.
 """
 from __future__ import annotations
 
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Iterable, Optional, List, Tuple
+
+# (strategy name, mapping items, relevant option values) -> 128-entry LUT
+_LUT_CACHE: Dict[tuple, Tuple[Optional[str], ...]] = {}
+_LUT_CACHE_MAX = 64
+
+
+def note_index(midi_note: int) -> int:
+    """LUT index for a MIDI note; notes outside 0..127 are clamped (built-in strategies clamp anyway)."""
+    return 0 if midi_note < 0 else (127 if midi_note > 127 else midi_note)
 
 
 class KeyMappingStrategy:
     """Strategy interface for mapping MIDI note to keyboard key."""
     name: str = "base"
+    # Options that affect map_note; part of the LUT cache key
+    option_keys: Tuple[str, ...] = ()
 
     def map_note(self, midi_note: int, mapping: Dict[str, str], options: Dict[str, Any]) -> Optional[str]:
         raise NotImplementedError
 
+    def compile_lut(self, mapping: Dict[str, str], options: Dict[str, Any]) -> Tuple[Optional[str], ...]:
+        """Evaluate map_note for every MIDI note 0..127 (uncached)."""
+        return tuple(self.map_note(n, mapping, options) for n in range(128))
+
+    def lut(self, mapping: Dict[str, str], options: Optional[Dict[str, Any]] = None) -> Tuple[Optional[str], ...]:
+        """Cached 128-entry LUT for this mapping; index with note_index(note)."""
+        opt = options or {}
+        try:
+            cache_key = (self.name, tuple(sorted((mapping or {}).items())),
+                         tuple(opt.get(k) for k in self.option_keys))
+            hash(cache_key)
+        except TypeError:
+            return self.compile_lut(mapping, opt)
+        table = _LUT_CACHE.get(cache_key)
+        if table is None:
+            table = self.compile_lut(mapping, opt)
+            if len(_LUT_CACHE) >= _LUT_CACHE_MAX:
+                _LUT_CACHE.clear()
+            _LUT_CACHE[cache_key] = table
+        return table
+
+    def map_notes(self, notes: Iterable[int], mapping: Dict[str, str],
+                  options: Optional[Dict[str, Any]] = None) -> List[Optional[str]]:
+        """Map a whole note column through the cached LUT."""
+        table = self.lut(mapping, options)
+        return [table[n if 0 <= n < 128 else note_index(n)] for n in notes]
+
     # 兼容层：AutoPlayer 期望的批量键映射接口
     # note_event: { 'note': int, 'start_time': float, 'end_time': float, 'duration': float, ... }
     # 返回：键位字符串列表；默认策略仅返回单个键（若可映射）。
@@ -28,6 +69,7 @@ class KeyMappingStrategy:
 
 class Strategy21Key(KeyMappingStrategy):
     name = "strategy_21key"
+    option_keys = ('enable_key_fallback',)
 
     def __init__(self):
         # Precompute degree names for 21-key: L1..L7, M1..M7, H1..H7
@@ -122,8 +164,14 @@ class Strategy3x5(KeyMappingStrategy):
         return None
 
 
+_STRATEGIES: Dict[str, KeyMappingStrategy] = {}
+
+
 def get_strategy(name: str) -> KeyMappingStrategy:
-    if name == Strategy3x5.name:
-        return Strategy3x5()
-    # default
-    return Strategy21Key()
+    """Shared strategy instance (strategies are stateless; LUTs are cached per mapping)."""
+    name = Strategy3x5.name if name == Strategy3x5.name else Strategy21Key.name
+    strategy = _STRATEGIES.get(name)
+    if strategy is None:
+        strategy = Strategy3x5() if name == Strategy3x5.name else Strategy21Key()
+        _STRATEGIES[name] = strategy
+    return strategy
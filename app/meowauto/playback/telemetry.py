@@ -0,0 +1,100 @@
+"""
+回放时序遥测
+每个发送的时间片记录 (曲目时间, 计划时刻, 实际 perf_counter) 到预分配环形缓冲区，
+曲终汇总 p50/p95/p99/max 迟到量、超阈值片数与最差段落，可导出 CSV。
+"""
+from __future__ import annotations
+
+import csv
+import os
+from array import array
+from typing import Any, Dict, List, Optional
+
+DEFAULT_REPORT_PATH = os.path.join('output', 'timing_report.csv')
+
+
+def _percentile(sorted_vals: List[float], q: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    pos = (len(sorted_vals) - 1) * q
+    lo = int(pos)
+    hi = min(lo + 1, len(sorted_vals) - 1)
+    return sorted_vals[lo] + (sorted_vals[hi] - sorted_vals[lo]) * (pos - lo)
+
+
+class LatenessRecorder:
+    """固定容量环形缓冲：record() 只做数组写入，不分配对象。"""
+
+    def __init__(self, capacity: int = 65536):
+        self.capacity = max(1, int(capacity))
+        self._song = array('d', bytes(8 * self.capacity))
+        self._sched = array('d', bytes(8 * self.capacity))
+        self._actual = array('d', bytes(8 * self.capacity))
+        self.total = 0  # 累计记录数（可能超过容量，超出部分覆盖最旧记录）
+
+    def reset(self) -> None:
+        self.total = 0
+
+    def record(self, song_time: float, scheduled: float, actual: float) -> None:
+        i = self.total % self.capacity
+        self._song[i] = song_time
+        self._sched[i] = scheduled
+        self._actual[i] = actual
+        self.total += 1
+
+    def __len__(self) -> int:
+        return min(self.total, self.capacity)
+
+    def rows(self) -> List[tuple]:
+        """按记录顺序返回 (song_time, scheduled, actual, lateness) 列表（仅保留窗口内）。"""
+        n = len(self)
+        start = self.total - n
+        out = []
+        for j in range(start, self.total):
+            i = j % self.capacity
+            out.append((self._song[i], self._sched[i], self._actual[i], self._actual[i] - self._sched[i]))
+        return out
+
+    def summary(self, late_threshold_ms: float = 5.0, worst: int = 5, passage_window: float = 1.0) -> Dict[str, Any]:
+        """汇总迟到量（毫秒）。worst: 最差段落个数；passage_window: 段落合并窗口（曲目秒）。"""
+        rows = self.rows()
+        if not rows:
+            return {'slices': 0}
+        late_ms = sorted(r[3] * 1000.0 for r in rows)
+        thr = float(late_threshold_ms)
+        # 最差段落：按迟到量降序挑选，曲目时间相距 passage_window 内的视为同一段落
+        passages: List[Dict[str, Any]] = []
+        for song_t, _, _, late in sorted(rows, key=lambda r: r[3], reverse=True):
+            if len(passages) >= max(0, int(worst)):
+                break
+            if any(abs(song_t - p['song_time']) <= passage_window for p in passages):
+                continue
+            passages.append({'song_time': song_t, 'lateness_ms': late * 1000.0})
+        return {
+            'slices': len(rows),
+            'dropped': self.total - len(rows),
+            'p50_ms': _percentile(late_ms, 0.50),
+            'p95_ms': _percentile(late_ms, 0.95),
+            'p99_ms': _percentile(late_ms, 0.99),
+            'max_ms': late_ms[-1],
+            'mean_ms': sum(late_ms) / len(late_ms),
+            'late_threshold_ms': thr,
+            'late_count': sum(1 for v in late_ms if v > thr),
+            'worst_passages': passages,
+        }
+
+    def export_csv(self, path: Optional[str] = None) -> str:
+        """导出逐片明细 CSV（默认 output/timing_report.csv，与 timing_compare.csv 同目录）。"""
+        out = path or DEFAULT_REPORT_PATH
+        d = os.path.dirname(out)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        with open(out, 'w', newline='', encoding='utf-8') as f:
+            w = csv.writer(f)
+            w.writerow(['idx', 'song_time', 'scheduled', 'actual', 'lateness_ms'])
+            for i, (song_t, sched, actual, late) in enumerate(self.rows()):
+                w.writerow([i, f"{song_t:.6f}", f"{sched:.6f}", f"{actual:.6f}", f"{late * 1000.0:.3f}"])
+        return out
+
+
+__all__ = ['LatenessRecorder', 'DEFAULT_REPORT_PATH']
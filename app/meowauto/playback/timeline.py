@@ -0,0 +1,176 @@
+"""
+编译后的回放时间轴
+将已映射的按键事件（dict 列表）一次性编译为并行数组：
+- times:   float64 秒（原始曲目时间，不含倍速）
+- actions: 0=release / 1=press
+- key_ids: 驻留后的键号，配合 key_names 还原键名
+播放热循环只做下标运算，不再逐事件查字典。
+"""
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, Iterable, List
+
+ACTION_RELEASE = 0
+ACTION_PRESS = 1
+
+
+class PlaybackTimeline:
+    """按时间排序的紧凑按键时间轴（同刻先 release 后 press）。"""
+
+    __slots__ = ('times', 'actions', 'key_ids', 'key_names', '_key_index')
+
+    def __init__(self, times: array, actions: array, key_ids: array, key_names: List[str]):
+        self.times = times
+        self.actions = actions
+        self.key_ids = key_ids
+        self.key_names = key_names
+        self._key_index = None  # 按键索引（惰性构建，仅 seek 使用）
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    @property
+    def duration(self) -> float:
+        """最后一个动作的曲目时间（秒）。"""
+        return self.times[-1] if len(self.times) else 0.0
+
+    @property
+    def key_count(self) -> int:
+        return len(self.key_names)
+
+    @classmethod
+    def from_events(cls, events: Iterable[Dict[str, Any]]) -> 'PlaybackTimeline':
+        """从 {'start_time','type','key'} 事件编译时间轴；无 key 或未知类型的事件被忽略。"""
+        rows = []
+        for ev in events:
+            try:
+                k = ev.get('key')
+                typ = ev.get('type')
+                if not k or typ not in ('note_on', 'note_off'):
+                    continue
+                rows.append((float(ev.get('start_time', 0.0)), ACTION_PRESS if typ == 'note_on' else ACTION_RELEASE, str(k)))
+            except Exception:
+                continue
+        # 同一时间戳优先释放再按下，避免抑制快速重按（与旧循环排序规则一致）
+        rows.sort(key=lambda r: (r[0], r[1]))
+        return cls._from_rows(rows)
+
+    @classmethod
+    def from_score_events(cls, events: Iterable[Any]) -> 'PlaybackTimeline':
+        """从 LRCp 乐谱 Event（start/end/keys）编译时间轴。
+        同刻先释放上一音再按下新音；start == end 的 tap 的释放排在自身按下之后。
+        """
+        rows = []
+        for ev in events:
+            try:
+                st = float(ev.start)
+                et = max(st, float(ev.end))
+                keys = [str(k) for k in (ev.keys or []) if k]
+            except Exception:
+                continue
+            tap = 2 if et == st else 0
+            for k in keys:
+                rows.append((st, 1, ACTION_PRESS, k))
+                rows.append((et, tap, ACTION_RELEASE, k))
+        rows.sort(key=lambda r: (r[0], r[1]))
+        return cls._from_rows([(t, act, k) for t, _, act, k in rows])
+
+    @classmethod
+    def _from_rows(cls, rows: List[tuple]) -> 'PlaybackTimeline':
+        """由已排序的 (time, action, key) 行驻留键名并构建并行数组。"""
+        key_index: Dict[str, int] = {}
+        key_names: List[str] = []
+        times = array('d')
+        actions = array('b')
+        key_ids = array('H')
+        for t, act, k in rows:
+            kid = key_index.get(k)
+            if kid is None:
+                kid = len(key_names)
+                key_index[k] = kid
+                key_names.append(k)
+            times.append(t)
+            actions.append(act)
+            key_ids.append(kid)
+        return cls(times, actions, key_ids, key_names)
+
+    def build_slices(self, epsilon: float) -> array:
+        """按 epsilon（秒）窗口预分组时间片，返回各片起始下标（末尾附哨兵 len(self)）。
+        - 片内动作相对片首时间不超过 epsilon，按“先释放后按下”一次性发送；
+        - 若片内某键已按下后又出现其释放（极短音），在该释放前切片，避免被吞成常按。
+        """
+        eps = max(0.0, float(epsilon))
+        times = self.times
+        actions = self.actions
+        key_ids = self.key_ids
+        n = len(times)
+        starts = array('i')
+        i = 0
+        while i < n:
+            starts.append(i)
+            t0 = times[i]
+            pressed = set()
+            j = i
+            while j < n and times[j] - t0 <= eps:
+                kid = key_ids[j]
+                if actions[j] == ACTION_PRESS:
+                    pressed.add(kid)
+                elif kid in pressed:
+                    break
+                j += 1
+            i = j if j > i else i + 1
+        starts.append(n)
+        return starts
+
+    def index_at(self, song_time: float) -> int:
+        """曲目时间对应的首个动作下标（二分，O(log n)）。"""
+        return bisect_left(self.times, float(song_time))
+
+    def _build_key_index(self) -> List[tuple]:
+        """每个键：(动作下标数组, 该动作后的引用计数数组)。计数规则与播放循环一致（释放不低于 0）。"""
+        per_key = [(array('i'), array('i')) for _ in self.key_names]
+        counts = [0] * len(self.key_names)
+        for i, (act, kid) in enumerate(zip(self.actions, self.key_ids)):
+            c = counts[kid]
+            if act == ACTION_PRESS:
+                c += 1
+            elif c > 0:
+                c -= 1
+            counts[kid] = c
+            idx, cnt = per_key[kid]
+            idx.append(i)
+            cnt.append(c)
+        self._key_index = per_key
+        return per_key
+
+    def held_counts(self, index: int) -> List[int]:
+        """执行到下标 index（不含）时各键的引用计数，>0 表示应处于按下状态。
+        每键一次二分，O(K log n)；按键索引首次调用时构建一次。
+        """
+        per_key = self._key_index or self._build_key_index()
+        out = [0] * len(per_key)
+        for kid, (idx, cnt) in enumerate(per_key):
+            j = bisect_left(idx, index)
+            if j > 0:
+                out[kid] = cnt[j - 1]
+        return out
+
+    def slice_at(self, slices: array, index: int) -> int:
+        """动作下标所在的时间片序号（slices 为 build_slices 的返回值）。"""
+        last = len(slices) - 1
+        if index >= slices[last]:
+            return last
+        return max(0, bisect_right(slices, index, 0, last) - 1)
+
+    def to_events(self) -> List[Dict[str, Any]]:
+        """还原为事件字典列表（用于调试/导出，不在热路径使用）。"""
+        names = self.key_names
+        return [
+            {'start_time': t, 'type': 'note_on' if a == ACTION_PRESS else 'note_off', 'key': names[kid]}
+            for t, a, kid in zip(self.times, self.actions, self.key_ids)
+        ]
+
+
+__all__ = ['PlaybackTimeline', 'ACTION_PRESS', 'ACTION_RELEASE']
@@ -0,0 +1,289 @@
+"""
+编译时间轴缓存
+同一首歌再次播放时，解析 → 分部过滤 → 短音过滤/移调 → 映射 → 和弦 → 并集/tap 整条链路的结果完全相同。
+本模块按“所有输入”的摘要缓存最终的 PlaybackTimeline：
+- 输入：来源内容摘要（文件字节或已解析音符列）、解析引擎、分部选择、analysis_settings、
+  AutoPlayer.options（去掉只影响播放调度/输出、不影响编译结果的选项，见 compile_options）、
+  策略名、键位映射，以及 CACHE_VERSION（编译规则变化时递增）；
+  任一输入变化即得到新的键，旧条目自然失效；另提供按来源/全部的显式失效。
+- 两层：内存 LRU（OrderedDict）+ 磁盘（temp/timeline_cache，每条一个紧凑二进制文件，按总字节数淘汰最旧）。
+- 条目可附带少量元数据（如移调统计），命中时一并返回。
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import struct
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from meowauto.playback.timeline import PlaybackTimeline
+
+CACHE_VERSION = 1
+DEFAULT_CACHE_DIR = os.path.join('temp', 'timeline_cache')
+
+# 只在播放时读取、不影响编译结果的 AutoPlayer 选项：不参与缓存键，调整它们不会导致未命中
+RUNTIME_ONLY_OPTIONS = frozenset({
+    'key_backend', 'isolated_playback', 'adaptive_wait', 'send_ahead_ms', 'spin_threshold_ms',
+    'post_action_sleep_ms', 'progress_rate_hz', 'late_threshold_ms',
+    'drift_correction', 'drift_check_interval_ms', 'drift_max_slew', 'drift_deadband_ms',
+})
+
+_MAGIC = b'MATL'
+# magic, 格式版本, 动作数, 键名 JSON 字节数, 元数据 JSON 字节数
+_HEADER = struct.Struct('<4sHIII')
+
+
+def _canonical(obj: Any) -> Any:
+    """转为可稳定 JSON 序列化的结构；非简单对象（如 KeyBackend 实例）以其 name 或类型名代替。"""
+    if obj is None or isinstance(obj, (bool, int, float, str)):
+        return obj
+    if isinstance(obj, dict):
+        return {str(k): _canonical(v) for k, v in sorted(obj.items(), key=lambda kv: str(kv[0]))}
+    if isinstance(obj, (set, frozenset)):
+        return sorted((_canonical(v) for v in obj), key=repr)
+    if isinstance(obj, (list, tuple)):
+        return [_canonical(v) for v in obj]
+    name = getattr(obj, 'name', None)
+    return f"<{type(obj).__name__}:{name}>" if isinstance(name, str) else f"<{type(obj).__name__}>"
+
+
+def compile_options(options: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """参与缓存键的选项：去掉 RUNTIME_ONLY_OPTIONS（未列出的选项一律视为影响编译）。"""
+    return {k: v for k, v in (options or {}).items() if k not in RUNTIME_ONLY_OPTIONS}
+
+
+def notes_digest(notes: Any) -> str:
+    """已解析音符的内容摘要（取过滤/移调/编译会读到的字段）。"""
+    h = hashlib.blake2b(digest_size=16)
+    if hasattr(notes, 'row_ids'):
+        # NoteTable：直接摘要列字节
+        for attr, code in (('start', 'd'), ('end', 'd'), ('pitch', 'h'), ('velocity', 'h'), ('channel', 'h'),
+                           ('track', 'i'), ('program', 'h'), ('is_drum', 'b')):
+            col = notes.column(attr)
+            h.update((col if isinstance(col, array) else array(code, col)).tobytes())
+        return h.hexdigest()
+    for n in notes or []:
+        try:
+            h.update(repr((n.get('start_time'), n.get('end_time'), n.get('duration'), n.get('note'),
+                           n.get('velocity'), n.get('channel'), n.get('track'), n.get('program'),
+                           n.get('is_drum'))).encode('utf-8'))
+        except Exception:
+            continue
+    return h.hexdigest()
+
+
+class TimelineCache:
+    """编译时间轴的两级缓存（线程安全）。cache_dir=None 时只用内存层。"""
+
+    def __init__(self, max_entries: int = 16, cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+                 max_disk_bytes: int = 64 * 1024 * 1024, max_digests: int = 256):
+        self.max_entries = max(1, int(max_entries))
+        self.max_digests = max(1, int(max_digests))
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max(0, int(max_disk_bytes))
+        self._mem: 'OrderedDict[str, Tuple[PlaybackTimeline, Dict[str, Any]]]' = OrderedDict()
+        self._by_source: Dict[str, set] = {}  # 来源（路径）-> 键集合，用于按来源失效
+        self._file_digests: 'OrderedDict[Tuple[str, int, int], str]' = OrderedDict()  # 文件摘要记忆（LRU）
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    # ---- 键 ----
+    def file_digest(self, path: str) -> Optional[str]:
+        """文件内容摘要；按 (路径, 大小, mtime_ns) 记忆，文件未变时不重复读取。
+        记忆表与内存层一样按最近使用淘汰（至多 max_digests 条），同一路径只保留最新版本。
+        """
+        try:
+            ap = os.path.abspath(path)
+            st = os.stat(ap)
+        except Exception:
+            return None
+        memo_key = (ap, st.st_size, st.st_mtime_ns)
+        with self._lock:
+            digest = self._file_digests.get(memo_key)
+            if digest is not None:
+                self._file_digests.move_to_end(memo_key)
+                return digest
+        h = hashlib.blake2b(digest_size=16)
+        try:
+            with open(ap, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    h.update(chunk)
+        except Exception:
+            return None
+        digest = h.hexdigest()
+        with self._lock:
+            for k in [k for k in self._file_digests if k[0] == ap and k != memo_key]:
+                del self._file_digests[k]
+            self._file_digests[memo_key] = digest
+            while len(self._file_digests) > self.max_digests:
+                self._file_digests.popitem(last=False)
+        return digest
+
+    @staticmethod
+    def make_key(source_digest: str, **inputs: Any) -> str:
+        """由来源摘要与其余输入（engine/parts/analysis_settings/options/strategy/key_mapping…）生成缓存键。"""
+        payload = json.dumps({'v': CACHE_VERSION, 'src': source_digest, 'in': _canonical(inputs)},
+                             sort_keys=True, ensure_ascii=True, separators=(',', ':'))
+        return hashlib.blake2b(payload.encode('utf-8'), digest_size=20).hexdigest()
+
+    # ---- 读写 ----
+    def get(self, key: str) -> Optional[Tuple[PlaybackTimeline, Dict[str, Any]]]:
+        """返回 (时间轴, 元数据)；未命中返回 None。磁盘命中会提升到内存层。"""
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None:
+                self._mem.move_to_end(key)
+                self.hits += 1
+                return entry
+        entry = self._load(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+            self._remember(key, entry)
+        return entry
+
+    def put(self, key: str, timeline: PlaybackTimeline, meta: Optional[Dict[str, Any]] = None,
+            source: Optional[str] = None) -> None:
+        if timeline is None or len(timeline) == 0:
+            return
+        entry = (timeline, dict(meta or {}))
+        with self._lock:
+            self._remember(key, entry)
+            if source:
+                self._by_source.setdefault(os.path.abspath(source), set()).add(key)
+        self._store(key, entry)
+
+    def _remember(self, key: str, entry: Tuple[PlaybackTimeline, Dict[str, Any]]) -> None:
+        self._mem[key] = entry
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+
+    # ---- 失效 ----
+    def invalidate(self, keys: Iterable[str]) -> None:
+        for key in list(keys):
+            with self._lock:
+                self._mem.pop(key, None)
+            path = self._path(key)
+            if path:
+                try:
+                    os.remove(path)
+                except Exception:
+                    pass
+
+    def invalidate_source(self, source: str) -> None:
+        """丢弃某个文件的全部已缓存时间轴（如文件被外部修改/重新转换后）。"""
+        with self._lock:
+            keys = self._by_source.pop(os.path.abspath(source), set())
+        self.invalidate(keys)
+
+    def clear(self, disk: bool = True) -> None:
+        with self._lock:
+            self._mem.clear()
+            self._by_source.clear()
+            self._file_digests.clear()
+        if disk and self.cache_dir and os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.tl'):
+                    try:
+                        os.remove(os.path.join(self.cache_dir, name))
+                    except Exception:
+                        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {'entries': len(self._mem), 'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses}
+
+    # ---- 磁盘层 ----
+    def _path(self, key: str) -> Optional[str]:
+        return os.path.join(self.cache_dir, f"{key}.tl") if self.cache_dir else None
+
+    def _store(self, key: str, entry: Tuple[PlaybackTimeline, Dict[str, Any]]) -> None:
+        path = self._path(key)
+        if not path:
+            return
+        timeline, meta = entry
+        try:
+            names = json.dumps(list(timeline.key_names), ensure_ascii=False).encode('utf-8')
+            meta_b = json.dumps(_canonical(meta), ensure_ascii=False).encode('utf-8')
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, 'wb') as f:
+                f.write(_HEADER.pack(_MAGIC, CACHE_VERSION, len(timeline), len(names), len(meta_b)))
+                f.write(names)
+                f.write(meta_b)
+                for col, code in ((timeline.times, 'd'), (timeline.actions, 'b'), (timeline.key_ids, 'H')):
+                    f.write((col if isinstance(col, array) else array(code, col)).tobytes())
+            os.replace(tmp, path)
+            self._prune_disk()
+        except Exception:
+            pass
+
+    def _load(self, key: str) -> Optional[Tuple[PlaybackTimeline, Dict[str, Any]]]:
+        path = self._path(key)
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            magic, version, n, names_len, meta_len = _HEADER.unpack_from(data, 0)
+            if magic != _MAGIC or version != CACHE_VERSION:
+                raise ValueError("cache format mismatch")
+            off = _HEADER.size
+            key_names = json.loads(data[off:off + names_len].decode('utf-8'))
+            off += names_len
+            meta = json.loads(data[off:off + meta_len].decode('utf-8'))
+            off += meta_len
+            cols = []
+            for code, size in (('d', 8), ('b', 1), ('H', 2)):
+                col = array(code)
+                col.frombytes(data[off:off + n * size])
+                if len(col) != n:
+                    raise ValueError("truncated cache file")
+                cols.append(col)
+                off += n * size
+            try:
+                os.utime(path)  # 磁盘层按最近使用淘汰
+            except Exception:
+                pass
+            return PlaybackTimeline(cols[0], cols[1], cols[2], [str(k) for k in key_names]), meta
+        except Exception:
+            try:
+                os.remove(path)
+            except Exception:
+                pass
+            return None
+
+    def _prune_disk(self) -> None:
+        if not self.cache_dir or self.max_disk_bytes <= 0:
+            return
+        try:
+            files = []
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.tl'):
+                    p = os.path.join(self.cache_dir, name)
+                    st = os.stat(p)
+                    files.append((st.st_mtime, st.st_size, p))
+            total = sum(size for _, size, _ in files)
+            for _, size, p in sorted(files):
+                if total <= self.max_disk_bytes:
+                    break
+                try:
+                    os.remove(p)
+                    total -= size
+                except Exception:
+                    pass
+        except Exception:
+            pass
+
+
+__all__ = ['TimelineCache', 'notes_digest', 'compile_options', 'RUNTIME_ONLY_OPTIONS', 'CACHE_VERSION',
+           'DEFAULT_CACHE_DIR']
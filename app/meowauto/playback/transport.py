@@ -0,0 +1,149 @@
+"""
+播放传输控制（Transport）
+用 threading.Condition 驱动暂停/恢复/停止，并维护“曲目时间 ↔ perf_counter 时刻”的锚点映射：
+    perf = anchor_perf + (song - anchor_song) / (tempo * trim)
+恢复时按暂停时的曲目位置重新锚定，等价于把暂停时长整体平移到剩余事件上。
+trim 为漂移校正用的微调系数（默认 1.0），与用户倍速 tempo 分开保存。
+任何状态变化都会递增 version 并唤醒 sleep()，播放线程据此在一个调度量子内响应。
+"""
+from __future__ import annotations
+
+import threading
+from time import perf_counter
+from typing import Optional
+
+
+class PlaybackTransport:
+    """播放线程与控制方（UI/服务层）之间的共享状态。"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self.version = 0
+        self.playing = False
+        self.paused = False
+        self.tempo = 1.0
+        self.trim = 1.0
+        self._anchor_perf = 0.0
+        self._anchor_song = 0.0
+        self._paused_song = 0.0
+        self._paused_at = 0.0
+        self.paused_total = 0.0  # 累计暂停时长（秒，墙钟）
+        self.seek_serial = 0  # 每次 seek 递增，播放线程据此重新定位
+
+    def _bump(self) -> None:
+        self.version += 1
+        self._cond.notify_all()
+
+    def start(self, position: float = 0.0, tempo: float = 1.0, at_perf: Optional[float] = None) -> None:
+        """以 position（曲目秒）在 at_perf（默认现在）开始播放。"""
+        with self._cond:
+            self.tempo = max(0.01, float(tempo))
+            self.trim = 1.0
+            self._anchor_perf = perf_counter() if at_perf is None else float(at_perf)
+            self._anchor_song = float(position)
+            self.paused_total = 0.0
+            self.playing = True
+            self.paused = False
+            self._bump()
+
+    def stop(self) -> None:
+        with self._cond:
+            self.playing = False
+            self.paused = False
+            self._bump()
+
+    def pause(self) -> bool:
+        with self._cond:
+            if not self.playing or self.paused:
+                return False
+            now = perf_counter()
+            self._paused_song = self._song_at(now)
+            self._paused_at = now
+            self.paused = True
+            self._bump()
+            return True
+
+    def resume(self) -> bool:
+        with self._cond:
+            if not self.playing or not self.paused:
+                return False
+            now = perf_counter()
+            self.paused_total += now - self._paused_at
+            self._anchor_perf = now
+            self._anchor_song = self._paused_song
+            self.paused = False
+            self._bump()
+            return True
+
+    def seek(self, position: float) -> bool:
+        """跳转到曲目位置（秒）并重新锚定；暂停中跳转则停在新位置。"""
+        with self._cond:
+            if not self.playing:
+                return False
+            position = max(0.0, float(position))
+            if self.paused:
+                self._paused_song = position
+            else:
+                self._anchor_perf = perf_counter()
+                self._anchor_song = position
+            self.seek_serial += 1
+            self._bump()
+            return True
+
+    def set_tempo(self, tempo: float) -> None:
+        """在当前曲目位置重新锚定并切换倍速：位置连续，后续事件按新倍速换算。"""
+        with self._cond:
+            tempo = max(0.01, float(tempo))
+            if self.playing and not self.paused:
+                now = perf_counter()
+                self._anchor_song = self._song_at(now)
+                self._anchor_perf = now
+            self.tempo = tempo
+            self._bump()
+
+    def set_trim(self, trim: float) -> None:
+        """设置速率微调系数（漂移校正的 slew），同样在当前位置重新锚定，位置连续。"""
+        with self._cond:
+            trim = float(trim)
+            if trim == self.trim:
+                return
+            if self.playing and not self.paused:
+                now = perf_counter()
+                self._anchor_song = self._song_at(now)
+                self._anchor_perf = now
+            self.trim = trim
+            self._bump()
+
+    def notify(self) -> None:
+        """唤醒播放线程（外部修改了调度参数，如分轨静音/倍速）。"""
+        with self._cond:
+            self._bump()
+
+    def _song_at(self, perf: float) -> float:
+        if self.paused:
+            return self._paused_song
+        return self._anchor_song + (perf - self._anchor_perf) * self.tempo * self.trim
+
+    def position(self) -> float:
+        """当前曲目位置（秒）；暂停期间停在暂停点。"""
+        return self._song_at(perf_counter())
+
+    def song_to_perf(self, song_time: float) -> float:
+        """曲目时间对应的 perf_counter 时刻（按当前锚点与倍速）。"""
+        return self._anchor_perf + (song_time - self._anchor_song) / (self.tempo * self.trim)
+
+    def sleep(self, timeout: float) -> bool:
+        """可被状态变化打断的睡眠；返回 True 表示被打断。"""
+        with self._cond:
+            v = self.version
+            return self._cond.wait_for(lambda: self.version != v, timeout)
+
+    def wait_if_paused(self) -> bool:
+        """暂停时阻塞直到恢复或停止；返回是否仍在播放。"""
+        with self._cond:
+            while self.playing and self.paused:
+                self._cond.wait()
+            return self.playing
+
+
+__all__ = ['PlaybackTransport']
@@ -338,7 +338,7 @@ def create_playback_controls(controller, parent_left, include_ensemble: bool = T
                     processed = ps._apply_pre_filters_and_transpose(notes)  # 计算并更新 last_analysis_stats
                     # 将预处理后的事件缓存到控制器，供“使用已解析结果播放”直接命中
                     try:
-                        controller.analysis_notes = list(processed)
+                        controller.analysis_notes = processed if hasattr(processed, 'row_ids') else list(processed)
                         controller.analysis_file = midi_path
                         controller._log_message(f"[DEBUG] 已缓存解析事件: {len(controller.analysis_notes)} 条", "DEBUG")
                     except Exception:
@@ -377,10 +377,10 @@ def create_playback_controls(controller, parent_left, include_ensemble: bool = T
             except Exception:
                 pass
 
-        # 解析引擎选择（自动/pretty_midi/miditoolkit）
+        # 解析引擎选择（自动/pretty_midi/miditoolkit/内置）
         try:
             ttk.Label(parse_settings, text="解析引擎:").grid(row=3, column=0, sticky=tk.W, pady=(8,0))
-            controller._engine_label_to_value = {'自动': 'auto', 'pretty_midi': 'pretty_midi', 'miditoolkit': 'miditoolkit'}
+            controller._engine_label_to_value = {'自动': 'auto', 'pretty_midi': 'pretty_midi', 'miditoolkit': 'miditoolkit', '内置(快速)': 'native'}
             controller._engine_value_to_label = {v: k for k, v in controller._engine_label_to_value.items()}
             controller.parser_engine_var = tk.StringVar(value='pretty_midi')
             engine_combo = ttk.Combobox(parse_settings, textvariable=controller.parser_engine_var, state='readonly', width=14,
@@ -9,6 +9,7 @@ import sys
 import os
 import traceback
 import ctypes
+import multiprocessing
 from pathlib import Path
 
 
@@ -198,6 +199,8 @@ def main():
 
 
 if __name__ == "__main__":
+    # 打包为 exe 时，隔离播放（isolated_playback，spawn 子进程）需要它让子进程进入 _child_main 而不是再启动一份程序
+    multiprocessing.freeze_support()
     try:
         main()
     except KeyboardInterrupt:
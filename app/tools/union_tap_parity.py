@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Parity check for AutoPlayer._apply_union_and_tap (sweep/bisect rewrite)
+against the previous linear-scan implementation, which is kept verbatim below.
+
+For each MIDI file the notes are parsed with meowauto.midi.analyzer, mapped with
+the 21-key strategy and passed through the same dedup/cluster stages as
+build_timeline_midi_events; both implementations then run under several option
+sets and their outputs must be identical (same events, same order).
+Synthetic sustain-heavy inputs are checked as well, so the script is useful
+even without a MIDI corpus or MIDI parser installed.
+
+Usage:
+  python app/tools/union_tap_parity.py app/music --synthetic 200
+
+Requires (for MIDI files):
+  - pretty_midi or miditoolkit
+"""
+from __future__ import annotations
+import argparse
+import glob
+import os
+import random
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+OPTION_SETS: List[Dict[str, Any]] = [
+    {},
+    {'epsilon_ms': 0},
+    {'epsilon_ms': 20, 'retrigger_min_gap_ms': 0},
+    {'tap_gap_ms': 15, 'retrigger_min_gap_ms': 10},
+    {'allow_retrigger': False},
+]
+
+
+def legacy_apply_union_and_tap(options: Dict[str, Any], events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Previous implementation (linear segment scan), copied unchanged."""
+    if not events:
+        return events
+    allow_rt = bool(options.get('allow_retrigger', True))
+    tap_gap_ms = float(options.get('tap_gap_ms', 0))
+    retrig_gap_ms = float(options.get('retrigger_min_gap_ms', 40))
+    eps_ms = float(options.get('epsilon_ms', 6))
+    tap_gap = max(0.0, tap_gap_ms) / 1000.0
+    retrig_gap = max(0.0, retrig_gap_ms) / 1000.0
+    eps = max(0.0, eps_ms) / 1000.0
+
+    try:
+        evs = sorted(events, key=lambda x: (float(x.get('start_time', 0.0)), 0 if x.get('type') == 'note_off' else 1))
+    except Exception:
+        evs = list(events)
+
+    per_key_intervals: Dict[str, List[Tuple[float, float]]] = {}
+    stacks: Dict[str, List[float]] = {}
+    for ev in evs:
+        k = ev.get('key')
+        if not k:
+            continue
+        t = float(ev.get('start_time', 0.0))
+        typ = ev.get('type')
+        if typ == 'note_on':
+            stacks.setdefault(k, []).append(t)
+        elif typ == 'note_off':
+            st_list = stacks.get(k)
+            if st_list:
+                st = st_list.pop(0)
+                if t < st:
+                    t = st
+                per_key_intervals.setdefault(k, []).append((st, t))
+
+    def merge_union(intervals: List[Tuple[float, float]]) -> List[Tuple[float, float]]:
+        if not intervals:
+            return []
+        arr = sorted([(min(a, b), max(a, b)) for a, b in intervals], key=lambda x: x[0])
+        merged: List[Tuple[float, float]] = []
+        cs, ce = arr[0]
+        for s, e in arr[1:]:
+            if s <= ce + eps:
+                ce = max(ce, e)
+            else:
+                merged.append((cs, ce))
+                cs, ce = s, e
+        merged.append((cs, ce))
+        return merged
+
+    per_key_union: Dict[str, List[Tuple[float, float]]] = {k: merge_union(iv) for k, iv in per_key_intervals.items()}
+
+    out: List[Dict[str, Any]] = []
+    for k, unions in per_key_union.items():
+        for s, e in unions:
+            out.append({'start_time': s, 'type': 'note_on', 'key': k, 'velocity': 64})
+            out.append({'start_time': e, 'type': 'note_off', 'key': k, 'velocity': 0})
+
+    if allow_rt:
+        for k, intervals in per_key_intervals.items():
+            unions = per_key_union.get(k, [])
+            if not unions:
+                continue
+            union_starts = [s for s, _ in unions]
+            last_tap_time = -1e9
+            for st, en in sorted(intervals, key=lambda x: x[0]):
+                seg_idx = -1
+                for i, (us, ue) in enumerate(unions):
+                    if st >= us - eps and st <= ue + eps:
+                        seg_idx = i
+                        break
+                if seg_idx < 0:
+                    continue
+                us, ue = unions[seg_idx]
+                if any(abs(st - us0) <= eps for us0 in union_starts):
+                    continue
+                if (st - last_tap_time) < retrig_gap:
+                    continue
+                tap_on_time = st + tap_gap
+                if tap_on_time > ue - 1e-6:
+                    continue
+                out.append({'start_time': st, 'type': 'note_off', 'key': k, 'velocity': 0})
+                out.append({'start_time': tap_on_time, 'type': 'note_on', 'key': k, 'velocity': 64})
+                last_tap_time = st
+
+    return out if out else events
+
+
+def synthetic_events(rng: random.Random, n_notes: int) -> List[Dict[str, Any]]:
+    """Sustain-heavy input: few keys, long overlapping notes, many exact/near repeats."""
+    keys = ['a', 's', 'd', 'f', 'g', 'h', 'j']
+    events: List[Dict[str, Any]] = []
+    t = 0.0
+    for _ in range(n_notes):
+        t += rng.choice([0.0, 0.0, 0.001, 0.005, 0.006, 0.03, 0.12])
+        st = round(t, rng.choice([3, 6]))
+        dur = rng.choice([0.0, 0.01, 0.05, 0.4, 1.5, 3.0])
+        k = rng.choice(keys)
+        events.append({'start_time': st, 'type': 'note_on', 'key': k})
+        events.append({'start_time': st + dur, 'type': 'note_off', 'key': k})
+    rng.shuffle(events)
+    return events
+
+
+def midi_events(player, path: str) -> List[Dict[str, Any]]:
+    from meowauto.midi import analyzer
+    from meowauto.playback.strategies import get_strategy
+    res = analyzer.parse_midi(path)
+    if not isinstance(res, dict) or not res.get('ok'):
+        raise RuntimeError(res.get('error') if isinstance(res, dict) else 'parse failed')
+    mapping = player._get_default_key_mapping()
+    strategy = get_strategy('strategy_21key')
+    events: List[Dict[str, Any]] = []
+    for n in res.get('notes') or []:
+        st = float(n.get('start_time', 0.0))
+        et = float(n.get('end_time', st))
+        key = strategy.map_note(int(n.get('note', 0)), mapping, player.options)
+        if not key:
+            continue
+        events.append({'start_time': st, 'type': 'note_on', 'key': key})
+        events.append({'start_time': max(et, st), 'type': 'note_off', 'key': key})
+    events = player._dedup_same_time_same_key(events)
+    return player._normalize_multi_key_clusters(events)
+
+
+def check(player, name: str, events: List[Dict[str, Any]], totals: Dict[str, float]) -> bool:
+    base = dict(player.options)
+    ok = True
+    for opts in OPTION_SETS:
+        player.options = dict(base, **opts)
+        t0 = time.perf_counter()
+        expected = legacy_apply_union_and_tap(player.options, events)
+        t1 = time.perf_counter()
+        actual = player._apply_union_and_tap(events)
+        t2 = time.perf_counter()
+        totals['legacy'] += t1 - t0
+        totals['new'] += t2 - t1
+        if actual != expected:
+            ok = False
+            print(f"[FAIL] {name} options={opts}: {len(expected)} vs {len(actual)} events")
+    player.options = base
+    return ok
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('paths', nargs='*', help='MIDI files or directories')
+    ap.add_argument('--synthetic', type=int, default=100, help='Number of synthetic cases')
+    ap.add_argument('--seed', type=int, default=1)
+    args = ap.parse_args()
+
+    from meowauto.core import Logger
+    from meowauto.playback.auto_player import AutoPlayer
+    player = AutoPlayer(Logger())
+
+    files: List[str] = []
+    for p in args.paths:
+        if os.path.isdir(p):
+            files.extend(sorted(glob.glob(os.path.join(p, '**', '*.mid*'), recursive=True)))
+        elif os.path.exists(p):
+            files.append(p)
+
+    totals = {'legacy': 0.0, 'new': 0.0}
+    cases = failed = 0
+    rng = random.Random(args.seed)
+    for i in range(max(0, args.synthetic)):
+        cases += 1
+        if not check(player, f"synthetic#{i}", synthetic_events(rng, rng.choice([5, 50, 500, 3000])), totals):
+            failed += 1
+    for path in files:
+        try:
+            events = midi_events(player, path)
+        except Exception as e:
+            print(f"[WARN] skip {path}: {e}")
+            continue
+        cases += 1
+        if not check(player, os.path.basename(path), events, totals):
+            failed += 1
+
+    print(f"[INFO] cases={cases} failed={failed} legacy={totals['legacy']:.3f}s new={totals['new']:.3f}s")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()